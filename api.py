@@ -1,37 +1,166 @@
 # api.py
 from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-import uvicorn
-import google.generativeai as genai
+from fastapi.responses import JSONResponse, PlainTextResponse
+from fastapi.concurrency import run_in_threadpool
 import os
+import json
 from PIL import Image
 import io
 from dotenv import load_dotenv
-from langchain_pinecone import PineconeVectorStore
-from pinecone import Pinecone
-from collections import defaultdict
+from pydantic import BaseModel
+from typing import List, Optional
+from collections import OrderedDict
 import time
+import hashlib
+import secrets
+import threading
+import numpy as np
 from contextlib import asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor
 
-from services import sync_collaborative_playlist, get_song_count, init_indexed_songs, GoogleNativeEmbeddings
+from services import (
+    get_song_count, init_indexed_songs, GoogleNativeEmbeddings,
+    get_index, generative_model, embed_content, key_id, INDEX_NAME,
+    DEFAULT_PLAYLIST_ID, load_playlists, get_playlist, get_namespace, register_playlist, get_namespace_counts
+)
+import services
+import telemetry
+import resilience
+import local_index
+import catalog
+import shared_cache
+import neighbors
+import checkpoint
+from scheduler import SyncScheduler
+from coalesce import SingleFlight
+from rerank import mmr
 
 
 load_dotenv()
 
 
+def sniff_image_format(head: bytes):
+    """Returns the image format from a file's first bytes, or None if it isn't a supported image."""
+    for signature, image_format in IMAGE_SIGNATURES.items():
+        if head.startswith(signature):
+            return image_format
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "WEBP"
+    return None
+
+
+async def read_upload(file: UploadFile):
+    """
+    Reads an uploaded image in chunks, rejecting non-images after the first
+    chunk and anything over MAX_UPLOAD_BYTES as soon as the cap is passed.
+    Returns (content, sha256 hex digest).
+    """
+    if file.size is not None and file.size > MAX_UPLOAD_BYTES:
+        raise HTTPException(status_code=413, detail=f"Image too large (max {MAX_UPLOAD_BYTES // (1024 * 1024)} MB).")
+
+    content = bytearray()
+    digest = hashlib.sha256()
+    while True:
+        chunk = await file.read(UPLOAD_CHUNK_SIZE)
+        if not chunk:
+            break
+        if not content and sniff_image_format(chunk) is None:
+            raise HTTPException(status_code=415, detail="Unsupported image type. Please upload a JPEG, PNG, GIF or WebP.")
+        if len(content) + len(chunk) > MAX_UPLOAD_BYTES:
+            raise HTTPException(status_code=413, detail=f"Image too large (max {MAX_UPLOAD_BYTES // (1024 * 1024)} MB).")
+        content.extend(chunk)
+        digest.update(chunk)
+
+    if not content:
+        raise HTTPException(status_code=400, detail="Uploaded image is empty.")
+    return bytes(content), digest.hexdigest()
+
+
+def load_image(content: bytes) -> Image.Image:
+    """
+    Decodes an upload no larger than VISION_MAX_SIDE. JPEGs are decoded
+    directly at reduced scale with draft(), so a 12 MP photo never exists
+    in memory at full size.
+    """
+    image = Image.open(io.BytesIO(content))
+    if image.width * image.height > MAX_IMAGE_PIXELS:
+        raise HTTPException(status_code=413, detail="Image dimensions too large.")
+    # draft() keeps both sides at least the requested size, so ask for the fitted size
+    scale = min(1.0, VISION_MAX_SIDE / max(image.width, image.height))
+    target = (max(1, round(image.width * scale)), max(1, round(image.height * scale)))
+    if image.format == "JPEG":
+        image.draft("RGB", target)
+    image.thumbnail(target)
+    return image
+
+
 def describe_image_google(image: Image.Image, api_key: str) -> str:
     """Use Google Gemini for image description."""
-    genai.configure(api_key=api_key)
-    model = genai.GenerativeModel("gemini-2.5-flash")
-    response = model.generate_content([
-        "Describe the vibe, mood, and atmosphere of this image in detail for a music playlist.",
-        image
-    ])
+    model = generative_model("gemini-2.5-flash", api_key)
+    with telemetry.external_call("gemini", "vision"):
+        response = resilience.call("gemini", model.generate_content, [
+            "Describe the vibe, mood, and atmosphere of this image in detail for a music playlist.",
+            image
+        ], sdk_timeout=True)
     return response.text
 
 
-# Collaborative playlist ID
-PLAYLIST_ID = "5DYHhVIXo6PhfXqjIlu6rt"
+def describe_upload(content: bytes, api_key: str) -> str:
+    """Decodes an uploaded image at reduced size and describes it."""
+    return describe_image_google(load_image(content), api_key)
+
+
+# Collaborative playlist ID (the default for /sync, /search and /stats)
+PLAYLIST_ID = DEFAULT_PLAYLIST_ID
+
+# Max playlists synced at once by /playlists/sync-all
+MAX_PARALLEL_SYNCS = 4
+
+# Identical concurrent work (key checks, image descriptions, searches) runs only once
+_key_check_flight = SingleFlight("key_check")
+_vision_flight = SingleFlight("vision")
+_search_flight = SingleFlight("vector_search")
+
+# Search paging: each new search over-fetches candidates that later pages reuse
+DEFAULT_PAGE_SIZE = 5
+MAX_PAGE_SIZE = 25
+SEARCH_CANDIDATES = 50
+CURSOR_TTL_SECONDS = 600
+MAX_SAVED_SEARCHES = 1000
+SAVED_SEARCHES_BUDGET_MB = int(os.getenv("SAVED_SEARCHES_BUDGET_MB", "32"))  # per worker process
+_searches = OrderedDict()  # cursor token -> saved search, oldest first
+_searches_bytes = 0
+_searches_lock = threading.Lock()
+
+# Saved searches are also shared so a cursor works on whichever worker serves it
+_shared_searches = shared_cache.SharedTable("searches", MAX_SAVED_SEARCHES, CURSOR_TTL_SECONDS)
+
+# End-to-end budget for a new search (image description, embed, vector query)
+SEARCH_DEADLINE_SECONDS = float(os.getenv("SEARCH_DEADLINE_SECONDS", "15"))
+
+# Max queries in one /search/batch call
+MAX_BATCH_QUERIES = 50
+
+# Image uploads: read in chunks up to a hard cap, then decode no larger than
+# the vision model needs (big JPEGs are decoded at reduced scale)
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_MB", "10")) * 1024 * 1024
+UPLOAD_CHUNK_SIZE = 64 * 1024
+MAX_IMAGE_PIXELS = 50_000_000
+VISION_MAX_SIDE = 1024
+IMAGE_SIGNATURES = {
+    b"\xff\xd8\xff": "JPEG",
+    b"\x89PNG\r\n\x1a\n": "PNG",
+    b"GIF87a": "GIF",
+    b"GIF89a": "GIF",
+}
+
+
+class BatchSearchRequest(BaseModel):
+    queries: List[str]
+    k: int = DEFAULT_PAGE_SIZE
+    playlist_id: Optional[str] = None
+    user_api_key: Optional[str] = None
 
 # Admin secret for dangerous endpoints
 ADMIN_SECRET = os.getenv("ADMIN_SECRET", "change-this-secret")
@@ -39,14 +168,23 @@ ADMIN_SECRET = os.getenv("ADMIN_SECRET", "change-this-secret")
 # Rate limiting config
 RATE_LIMIT_REQUESTS = 10  # requests per window
 RATE_LIMIT_WINDOW = 60    # seconds
-request_counts = defaultdict(list)
+# Counted in the shared cache, so the limit holds for a client across all worker processes
+_rate_limit = shared_cache.SharedRateLimit("rate_limit", RATE_LIMIT_WINDOW)
+
+
+# Background worker that syncs playlists when their Spotify snapshot changes
+sync_scheduler = SyncScheduler()
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Startup and shutdown events."""
+    # Load the SDKs in the background so startup doesn't wait for them
+    threading.Thread(target=services.warm_up, name="warm-up", daemon=True).start()
+    sync_scheduler.start()
     print("ChromaTune API ready")
     yield
+    sync_scheduler.stop()
     print("ChromaTune API shutting down")
 
 
@@ -55,15 +193,19 @@ app = FastAPI(lifespan=lifespan)
 
 def check_rate_limit(client_ip: str) -> bool:
     """Returns True if request is allowed, False if rate limited."""
-    now = time.time()
-    # Clean old requests outside window
-    request_counts[client_ip] = [t for t in request_counts[client_ip] if now - t < RATE_LIMIT_WINDOW]
-
-    if len(request_counts[client_ip]) >= RATE_LIMIT_REQUESTS:
-        return False
-
-    request_counts[client_ip].append(now)
-    return True
+    return _rate_limit.allow(client_ip, RATE_LIMIT_REQUESTS)
+
+
+def check_server_key(server_key: str):
+    """Makes a tiny test call with the server key; raises if it fails."""
+    model = generative_model("gemini-2.5-flash", server_key)
+    with telemetry.external_call("gemini", "key_check"):
+        # Bounded by the request deadline but kept out of the breaker: its 1-token call
+        # succeeds even while embeddings brown out, which would keep resetting the failure count
+        resilience.call(
+            "gemini", model.generate_content, "test", generation_config={"max_output_tokens": 1},
+            hedge=True, breaker=False, sdk_timeout=True,
+        )
 
 
 def get_api_key(user_key: str = None) -> tuple[str, bool]:
@@ -73,13 +215,12 @@ def get_api_key(user_key: str = None) -> tuple[str, bool]:
     # Try server key first
     if server_key:
         try:
-            genai.configure(api_key=server_key)
-            # Quick test
-            model = genai.GenerativeModel("gemini-2.5-flash")
-            model.generate_content("test", generation_config={"max_output_tokens": 1})
+            _key_check_flight.do(server_key, check_server_key, server_key)
             return server_key, False
+        except resilience.DeadlineExceeded:
+            raise
         except Exception as e:
-            if "quota" in str(e).lower() or "limit" in str(e).lower() or "exhausted" in str(e).lower():
+            if telemetry.is_quota_error(e):
                 print("Server API quota exhausted, checking user key...")
             else:
                 # Other error, still try server key
@@ -97,8 +238,55 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing", "X-Response-Time"],
 )
 
+
+@app.middleware("http")
+async def trace_requests(request: Request, call_next):
+    """Times every request and stamps the per-stage breakdown on the response."""
+    trace = telemetry.start_trace()
+    start = time.perf_counter()
+    response = await call_next(request)
+    elapsed = time.perf_counter() - start
+
+    # Use the route template (not the raw path) to keep label cardinality low
+    route = request.scope.get("route")
+    path = route.path if route else "unmatched"
+    telemetry.REQUEST_LATENCY.observe(elapsed, method=request.method, path=path)
+
+    response.headers["Server-Timing"] = telemetry.format_server_timing(trace, elapsed)
+    response.headers["X-Response-Time"] = f"{elapsed * 1000:.1f}ms"
+    return response
+
+
+@app.middleware("http")
+async def limit_upload_size(request: Request, call_next):
+    """Rejects bodies declared larger than the upload cap before the form is parsed."""
+    content_length = request.headers.get("content-length")
+    # Allow some room for the multipart framing and text fields around the image
+    if content_length and content_length.isdigit() and int(content_length) > MAX_UPLOAD_BYTES + 64 * 1024:
+        return JSONResponse(
+            status_code=413,
+            content={"detail": f"Image too large (max {MAX_UPLOAD_BYTES // (1024 * 1024)} MB)."},
+        )
+    return await call_next(request)
+
+@app.exception_handler(resilience.CircuitOpenError)
+async def provider_unavailable(request: Request, exc: resilience.CircuitOpenError):
+    """A provider's breaker is open: fail fast and tell the client when to retry."""
+    return JSONResponse(
+        status_code=503,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(int(exc.retry_after + 0.999))},
+    )
+
+
+@app.exception_handler(resilience.DeadlineExceeded)
+async def deadline_exceeded(request: Request, exc: resilience.DeadlineExceeded):
+    return JSONResponse(status_code=504, content={"detail": f"Search timed out: {exc}"})
+
+
 @app.get("/")
 def read_root():
     return {"status": "ChromaTune API", "playlist_id": PLAYLIST_ID}
@@ -120,41 +308,34 @@ def inspect_pinecone(limit: int = 20, secret: str = None):
     if secret != ADMIN_SECRET:
         raise HTTPException(status_code=403, detail="Unauthorized")
     try:
-        pc = Pinecone(api_key=os.getenv("PINECONE_API_KEY"))
-        index = pc.Index("chroma-tune")
+        index = get_index()
 
         # Get index stats
         stats = index.describe_index_stats()
 
-        # List vectors directly from Pinecone (no embedding needed)
-        # Use list to get vector IDs, then fetch their metadata
-        songs = []
-        seen_names = set()
-        duplicates = []
-
-        # Fetch vectors by listing IDs
-        for ids in index.list(limit=limit):
-            if ids:
-                fetched = index.fetch(ids=ids)
-                for vid, vec in fetched.vectors.items():
-                    meta = vec.metadata or {}
-                    song_name = meta.get("Song_Name", "Unknown")
-                    artist = meta.get("Artist", "Unknown")
-
-                    song_info = {
-                        "id": vid,
-                        "name": song_name,
-                        "artist": artist,
-                        "url": meta.get("Song_URL", ""),
-                        "vibe": meta.get("text", "")[:100] if meta.get("text") else ""
-                    }
-                    songs.append(song_info)
-
-                    # Check for duplicates
-                    key = f"{song_name}|{artist}"
-                    if key in seen_names:
-                        duplicates.append(song_info)
-                    seen_names.add(key)
+        # List vector IDs from Pinecone (no embedding needed), then read
+        # their metadata from the local catalog
+        ids = []
+        for page in index.list(limit=limit):
+            ids.extend(page or [])
+        columns = catalog.hydrate(index, "", ids, names=catalog.TEXT_COLUMNS)
+
+        names = np.where(columns["Song_Name"] == "", "Unknown", columns["Song_Name"])
+        artists = np.where(columns["Artist"] == "", "Unknown", columns["Artist"])
+        vibes = columns["text"].astype("U100")
+        songs = [
+            {"id": vid, "name": name, "artist": artist, "url": url, "vibe": vibe}
+            for vid, name, artist, url, vibe in zip(
+                ids, names.tolist(), artists.tolist(), columns["Song_URL"].tolist(), vibes.tolist()
+            )
+        ]
+
+        # Every repeat of a name|artist pair after its first occurrence is a duplicate
+        keys = np.char.add(np.char.add(names.astype(str), "|"), artists.astype(str))
+        _, first = np.unique(keys, return_index=True)
+        is_duplicate = np.ones(len(ids), dtype=bool)
+        is_duplicate[first] = False
+        duplicates = [song for song, duplicate in zip(songs, is_duplicate) if duplicate]
 
         return {
             "total_vectors": stats.total_vector_count,
@@ -168,6 +349,12 @@ def inspect_pinecone(limit: int = 20, secret: str = None):
         return {"error": str(e), "trace": traceback.format_exc()}
 
 
+@app.get("/metrics")
+def metrics():
+    """Prometheus-style latency histograms and external API call counters."""
+    return PlainTextResponse(telemetry.render_metrics(), media_type="text/plain; version=0.0.4")
+
+
 @app.get("/api-status")
 def api_status():
     """Check if server API keys are configured."""
@@ -176,11 +363,20 @@ def api_status():
     return {"status": "available" if server_key else "unavailable", "needs_user_key": not server_key}
 
 
+@app.get("/providers")
+def provider_status():
+    """Circuit breaker state and hedging counts for each external provider."""
+    return {
+        "providers": resilience.status(),
+        "hedge_after_ms": resilience.HEDGE_AFTER_SECONDS * 1000,
+        "search_deadline_seconds": SEARCH_DEADLINE_SECONDS,
+    }
+
+
 @app.get("/test-embedding")
 def test_embedding():
     """Test which embedding model works."""
     server_key = os.getenv("GOOGLE_API_KEY")
-    genai.configure(api_key=server_key)
     results = {}
 
     # Test the available embedding models
@@ -191,7 +387,8 @@ def test_embedding():
 
     for model_name in models_to_test:
         try:
-            response = genai.embed_content(
+            response = embed_content(
+                server_key,
                 model=model_name,
                 content="test"
             )
@@ -207,16 +404,18 @@ def clear_pinecone(secret: str = None):
     if secret != ADMIN_SECRET:
         raise HTTPException(status_code=403, detail="Unauthorized")
     try:
-        pc = Pinecone(api_key=os.getenv("PINECONE_API_KEY"))
-        index = pc.Index("chroma-tune")
+        index = get_index()
 
-        # Delete all vectors
-        index.delete(delete_all=True)
+        # Delete all vectors, in every playlist's namespace
+        for namespace in get_namespace_counts() or [""]:
+            index.delete(delete_all=True, namespace=namespace)
+        local_index.clear()
+        catalog.clear()
+        neighbors.clear()
+        checkpoint.clear()
 
         # Clear local tracking file
-        import json
-        with open("indexed_songs.json", "w") as f:
-            json.dump([], f)
+        services.save_indexed_song_ids(set())
 
         return {"status": "cleared", "message": "All vectors deleted. Run /sync to re-index."}
     except Exception as e:
@@ -229,28 +428,30 @@ def recreate_index(secret: str = None):
     if secret != ADMIN_SECRET:
         raise HTTPException(status_code=403, detail="Unauthorized")
     try:
-        pc = Pinecone(api_key=os.getenv("PINECONE_API_KEY"))
+        pc = services.get_pinecone()
 
         # Delete existing index
         try:
-            pc.delete_index("chroma-tune")
+            pc.delete_index(INDEX_NAME)
             import time
             time.sleep(5)  # Wait for deletion
         except Exception as e:
             print(f"Delete index error (may not exist): {e}")
 
         # Create new index with 3072 dimensions
+        local_index.clear()
+        catalog.clear()
+        neighbors.clear()
+        checkpoint.clear()
         pc.create_index(
-            name="chroma-tune",
+            name=INDEX_NAME,
             dimension=3072,
             metric="cosine",
             spec={"serverless": {"cloud": "aws", "region": "us-east-1"}}
         )
 
         # Clear local tracking
-        import json
-        with open("indexed_songs.json", "w") as f:
-            json.dump([], f)
+        services.save_indexed_song_ids(set())
 
         return {"status": "success", "message": "Index recreated with 3072 dimensions. Run /sync to index songs."}
     except Exception as e:
@@ -258,54 +459,463 @@ def recreate_index(secret: str = None):
         return {"error": str(e), "trace": traceback.format_exc()}
 
 
-@app.post("/sync")
-def sync_playlist():
-    """Syncs the collaborative playlist - generates embeddings for any new songs."""
-    try:
-        result = sync_collaborative_playlist(PLAYLIST_ID)
-
-        if result.get("error"):
-            return {
-                "status": "error",
-                "song_count": result.get("song_count", 0),
-                "new_songs": result.get("new_songs", 0),
-                "error": result["error"]
-            }
-
-        if not result["success"]:
-            return {
-                "status": "error",
-                "song_count": result.get("song_count", 0),
-                "new_songs": 0,
-                "error": "Failed to sync playlist - check server logs"
-            }
+def format_sync_result(result):
+    """Turns a services sync result into the API response."""
+    if result.get("error"):
+        return {
+            "status": "error",
+            "song_count": result.get("song_count", 0),
+            "new_songs": result.get("new_songs", 0),
+            "skipped": result.get("skipped", 0),
+            "error": result["error"]
+        }
 
+    if not result["success"]:
         return {
-            "status": "success",
-            "song_count": result["song_count"],
-            "new_songs": result["new_songs"]
+            "status": "error",
+            "song_count": result.get("song_count", 0),
+            "new_songs": 0,
+            "error": "Failed to sync playlist - check server logs"
         }
+
+    return {
+        "status": "success",
+        "song_count": result["song_count"],
+        "new_songs": result["new_songs"]
+    }
+
+
+def run_sync(playlist_id: str):
+    """Syncs one playlist and formats the result, never raising."""
+    try:
+        return format_sync_result(services.sync_playlist(playlist_id))
     except Exception as e:
         print(f"Sync Error: {e}")
         import traceback
         traceback.print_exc()
         return {"status": "error", "error": str(e)}
 
+
+def require_playlist(playlist_id: str) -> dict:
+    """Returns the registered playlist or raises 404."""
+    playlist = get_playlist(playlist_id)
+    if playlist is None:
+        raise HTTPException(status_code=404, detail="Playlist is not registered. Register it with POST /playlists first.")
+    return playlist
+
+
+@app.post("/sync")
+def sync_playlist():
+    """Syncs the collaborative playlist - generates embeddings for any new songs."""
+    return run_sync(PLAYLIST_ID)
+
+
+@app.get("/sync/schedule")
+def sync_schedule():
+    """Shows the background sync worker's state."""
+    return sync_scheduler.status()
+
+
+@app.get("/playlists")
+def list_playlists():
+    """Lists registered playlists with their song counts."""
+    counts = get_namespace_counts()
+    return {
+        "playlists": [
+            {
+                "playlist_id": playlist_id,
+                "name": info.get("name"),
+                "namespace": info.get("namespace", playlist_id),
+                "song_count": counts.get(info.get("namespace", playlist_id), 0),
+                "synced_at": info.get("synced_at"),
+            }
+            for playlist_id, info in load_playlists().items()
+        ]
+    }
+
+
+@app.post("/playlists")
+def add_playlist(playlist_id: str, secret: str = None):
+    """Registers a Spotify playlist so it can be synced and searched on its own."""
+    if secret != ADMIN_SECRET:
+        raise HTTPException(status_code=403, detail="Unauthorized")
+    playlist = register_playlist(playlist_id.strip())
+    if playlist is None:
+        raise HTTPException(status_code=404, detail="Playlist not found on Spotify (or it is private).")
+    return {"status": "registered", "playlist_id": playlist_id, **playlist}
+
+
+@app.post("/playlists/sync-all")
+def sync_all_playlists():
+    """Syncs every registered playlist in parallel."""
+    playlist_ids = list(load_playlists())
+    with ThreadPoolExecutor(max_workers=min(len(playlist_ids), MAX_PARALLEL_SYNCS)) as executor:
+        results = dict(zip(playlist_ids, executor.map(run_sync, playlist_ids)))
+    return {"results": results}
+
+
+@app.post("/playlists/{playlist_id}/sync")
+def sync_registered_playlist(playlist_id: str):
+    """Syncs one registered playlist. Different playlists can sync at the same time."""
+    require_playlist(playlist_id)
+    return run_sync(playlist_id)
+
+
 @app.post("/search")
 async def search_vibe(
     request: Request,
     text: str = Form(None),
     file: UploadFile = File(None),
     user_api_key: str = Form(None),
-    provider: str = Form("google")  # kept for compatibility
+    provider: str = Form("google"),  # kept for compatibility
+    k: int = Form(DEFAULT_PAGE_SIZE),
+    cursor: str = Form(None),
+    diversity: float = Form(None),
 ):
+    """
+    Finds songs matching a text and/or image vibe. Pass the returned
+    next_cursor to get the following page without re-running the pipeline.
+    diversity (0-1) reranks with MMR so one artist can't crowd the results.
+    """
+    return await search_playlist(request, PLAYLIST_ID, text, file, user_api_key, k, cursor, diversity)
+
+
+@app.post("/search/batch")
+async def search_batch(request: Request, body: BatchSearchRequest):
+    """
+    Searches many text vibes in one call: all queries are embedded in a single
+    batched request and scored against the playlist's songs with one
+    matrix-matrix product. Returns results in the same order as the queries.
+    """
+    queries = [q.strip() for q in body.queries]
+    if not queries or not all(queries):
+        raise HTTPException(status_code=400, detail="Please provide one or more non-empty queries.")
+    if len(queries) > MAX_BATCH_QUERIES:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_QUERIES} queries per batch.")
+
+    playlist_id = body.playlist_id or PLAYLIST_ID
+    require_playlist(playlist_id)
+
+    client_ip = request.client.host
+    if not check_rate_limit(client_ip):
+        raise HTTPException(status_code=429, detail="Rate limit exceeded. Please wait a minute.")
+
+    api_key, using_user_key = await run_in_threadpool(get_api_key, body.user_api_key)
+    if not api_key:
+        raise HTTPException(status_code=503, detail="Google API key required. Please provide your API key.")
+
+    k = min(max(body.k, 1), MAX_PAGE_SIZE)
+    with resilience.deadline(SEARCH_DEADLINE_SECONDS):
+        results = await run_in_threadpool(batch_search_songs, queries, get_namespace(playlist_id), api_key, k)
+    return {"results": results, "used_user_key": using_user_key}
+
+
+def batch_search_songs(queries: list, namespace: str, api_key: str, k: int) -> list:
+    """Embeds all queries in one request and ranks songs for each with one matrix product."""
+    embeddings = GoogleNativeEmbeddings(model="models/gemini-embedding-001", api_key=api_key)
+    query_vectors = np.asarray(embeddings.embed_documents(queries), dtype=np.float32)
+
+    songs_index = local_index.get_local_index(get_index(), namespace)
+    with telemetry.span("vector_query"):
+        rows, scores = songs_index.search(query_vectors, k)
+
+    # Hydrate every query's results with one catalog lookup
+    track_ids = np.asarray(songs_index.ids, dtype=str)[rows.ravel()] if len(songs_index) else np.zeros(0, dtype=str)
+    columns = catalog.hydrate(get_index(), namespace, track_ids.tolist())
+    shape = rows.shape
+    ids = track_ids.reshape(shape).tolist()
+    names = columns["Song_Name"].reshape(shape).tolist()
+    artists = columns["Artist"].reshape(shape).tolist()
+    urls = columns["Song_URL"].reshape(shape).tolist()
+
+    results = []
+    for i, query in enumerate(queries):
+        songs = [
+            {"id": track_id, "name": name, "artist": artist, "url": url, "score": score}
+            for track_id, name, artist, url, score in zip(ids[i], names[i], artists[i], urls[i], scores[i].tolist())
+        ]
+        results.append({"query": query, "songs": songs})
+    return results
+
+
+@app.post("/playlists/{playlist_id}/search")
+async def search_registered_playlist(
+    request: Request,
+    playlist_id: str,
+    text: str = Form(None),
+    file: UploadFile = File(None),
+    user_api_key: str = Form(None),
+    k: int = Form(DEFAULT_PAGE_SIZE),
+    cursor: str = Form(None),
+    diversity: float = Form(None),
+):
+    """Searches only the songs of one registered playlist."""
+    require_playlist(playlist_id)
+    return await search_playlist(request, playlist_id, text, file, user_api_key, k, cursor, diversity)
+
+
+@app.get("/similar/{track_id}")
+def similar_songs(track_id: str, playlist_id: str = None, k: int = DEFAULT_PAGE_SIZE):
+    """
+    Songs most like one song ("more like this"), read from the playlist's
+    precomputed neighbor table. No LLM or embedding calls; Pinecone is only
+    asked for songs missing from the catalog, once.
+    """
+    playlist_id = playlist_id or PLAYLIST_ID
+    require_playlist(playlist_id)
+    namespace = get_namespace(playlist_id)
+    k = min(max(k, 1), neighbors.NEIGHBORS_PER_SONG)
+
+    found = neighbors.similar(namespace, track_id, k)
+    if found is None:
+        raise HTTPException(status_code=404, detail="Song not found in this playlist. Sync it to include new songs.")
+    ids, scores = found
+
+    columns = catalog.hydrate(get_index(), namespace, [track_id] + ids)
+    songs = [
+        {"id": vid, "name": name, "artist": artist, "url": url}
+        for vid, name, artist, url in zip(
+            [track_id] + ids, columns["Song_Name"].tolist(), columns["Artist"].tolist(), columns["Song_URL"].tolist()
+        )
+    ]
+    for song, score in zip(songs[1:], scores):
+        song["score"] = score
+    return {"song": songs[0], "songs": songs[1:]}
+
+
+def fetch_candidates(full_query: str, namespace: str, api_key: str) -> dict:
+    """
+    Embeds the query and over-fetches the top SEARCH_CANDIDATES matches in a
+    namespace. Every page of results is later served from these candidates.
+    """
+    embeddings = GoogleNativeEmbeddings(model="models/gemini-embedding-001", api_key=api_key)
+
+    # Embed and query separately so each stage is timed on its own
+    query_vector = np.asarray(embeddings.embed_query(full_query), dtype=np.float32)
+    index = get_index()
+    with telemetry.external_call("pinecone", "vector_query"):
+        results = resilience.call(
+            "pinecone", index.query, hedge=True, sdk_timeout=True,
+            vector=query_vector.tolist(),
+            top_k=SEARCH_CANDIDATES,
+            include_metadata=False,  # song details come from the local catalog
+            namespace=namespace,
+        )
+
+    matches = results["matches"]
+    ids = [m["id"] for m in matches]
+    return {
+        "query": full_query,
+        "namespace": namespace,
+        "query_vector": query_vector,
+        "ids": ids,
+        "scores": np.asarray([float(m["score"]) for m in matches], dtype=np.float32),
+        "songs": catalog.hydrate(index, namespace, ids),  # column name -> array, one entry per match
+    }
+
+
+def fetch_candidate_vectors(candidates: dict) -> np.ndarray:
+    """
+    Fetches the candidates' vectors for an MMR rerank. No embedding calls needed.
+    They aren't kept on the saved search: only the ranking computed from them is.
+    """
+    vectors = np.zeros((len(candidates["ids"]), len(candidates["query_vector"])), dtype=np.float32)
+    if not candidates["ids"]:
+        return vectors
+    with telemetry.external_call("pinecone", "vector_fetch"):
+        fetched = resilience.call(
+            "pinecone", get_index().fetch, hedge=True, sdk_timeout=True,
+            ids=candidates["ids"], namespace=candidates["namespace"],
+        )
+    for row, vid in enumerate(candidates["ids"]):
+        vec = fetched.vectors.get(vid)
+        if vec is not None:
+            vectors[row] = vec.values
+    return vectors
+
+
+def rank_candidates(entry: dict, diversity: float) -> list:
+    """Returns candidate indices in display order, caching each ranking on the entry."""
+    diversity = round(min(max(diversity or 0.0, 0.0), 1.0), 2)
+    if diversity not in entry["rankings"]:
+        candidates = entry["candidates"]
+        if diversity == 0.0:
+            ranking = list(range(len(candidates["ids"])))
+        else:
+            with telemetry.span("rerank"):
+                ranking = mmr(
+                    candidates["query_vector"],
+                    fetch_candidate_vectors(candidates),
+                    lambda_mult=1.0 - diversity,
+                    artists=candidates["songs"]["Artist"],
+                )
+        entry["rankings"][diversity] = ranking
+    return entry["rankings"][diversity]
+
+
+def estimate_search_bytes(entry: dict) -> int:
+    """Rough memory footprint of a saved search: its arrays, IDs and a ranking per diversity setting."""
+    candidates = entry["candidates"]
+    ids_bytes = sum(len(track_id) + 64 for track_id in candidates["ids"])  # str objects plus list slots
+    arrays = [candidates["query_vector"], candidates["scores"], *candidates["songs"].values()]
+    return ids_bytes + sum(a.nbytes for a in arrays) + 4 * 8 * len(candidates["ids"])
+
+
+def remember_search(token: str, entry: dict):
+    """Keeps a search in this worker, evicting expired and then oldest searches to stay within the budget."""
+    global _searches_bytes
+    entry["bytes"] = estimate_search_bytes(entry)
+    max_bytes = SAVED_SEARCHES_BUDGET_MB * 1024 * 1024
+    now = time.time()
+    with _searches_lock:
+        if token in _searches:
+            return
+        while _searches:
+            oldest = next(iter(_searches.values()))
+            if (_searches_bytes + entry["bytes"] <= max_bytes
+                    and now - oldest["created"] <= CURSOR_TTL_SECONDS):
+                break
+            _searches_bytes -= _searches.popitem(last=False)[1]["bytes"]
+        _searches[token] = entry
+        _searches_bytes += entry["bytes"]
+
+
+def save_search(entry: dict) -> str:
+    """Stores a search for cursor paging and returns its token, evicting old searches."""
+    token = secrets.token_urlsafe(8)
+    now = time.time()
+    entry["created"] = now
+    remember_search(token, entry)
+
+    candidates = entry["candidates"]
+    _shared_searches.put(token, json.dumps({
+        "query": candidates["query"],
+        "namespace": candidates["namespace"],
+        "query_vector": candidates["query_vector"].tolist(),
+        "ids": candidates["ids"],
+        "scores": candidates["scores"].tolist(),
+        "diversity": entry["diversity"],
+        "used_user_key": entry["used_user_key"],
+        "created": now,
+    }).encode())
+    return token
+
+
+def load_shared_search(token: str):
+    """Rebuilds a search saved by another worker, or returns None."""
+    saved = _shared_searches.get(token)
+    if saved is None:
+        return None
+    saved = json.loads(saved)
+    songs_catalog = catalog.get_catalog(saved["namespace"])
+    candidates = {
+        "query": saved["query"],
+        "namespace": saved["namespace"],
+        "query_vector": np.asarray(saved["query_vector"], dtype=np.float32),
+        "ids": saved["ids"],
+        "scores": np.asarray(saved["scores"], dtype=np.float32),
+        "songs": songs_catalog.columns(songs_catalog.lookup(saved["ids"])),
+    }
+    entry = {
+        "candidates": candidates,
+        "rankings": {},
+        "diversity": saved["diversity"],
+        "used_user_key": saved["used_user_key"],
+        "created": saved["created"],
+    }
+    remember_search(token, entry)
+    with _searches_lock:
+        return _searches.get(token, entry)
+
+
+def load_search(cursor: str):
+    """Returns (token, entry, offset) for a cursor, or raises 410 if it expired."""
+    try:
+        token, offset = cursor.rsplit(":", 1)
+        offset = int(offset)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor.")
+    if offset < 0:
+        raise HTTPException(status_code=400, detail="Invalid cursor.")
+    with _searches_lock:
+        entry = _searches.get(token)
+    if entry is None:
+        entry = load_shared_search(token)
+    if entry is None or time.time() - entry["created"] > CURSOR_TTL_SECONDS:
+        raise HTTPException(status_code=410, detail="Cursor expired. Please search again.")
+    return token, entry, offset
+
+
+def build_page(token: str, entry: dict, offset: int, k: int, diversity: float) -> dict:
+    """Formats one page of a saved search, with the cursor for the next page."""
+    ranking = rank_candidates(entry, diversity)
+    candidates = entry["candidates"]
+    page = np.asarray(ranking[offset:offset + k], dtype=np.int64)
+
+    columns = candidates["songs"]
+    songs = [
+        {"id": track_id, "name": name, "artist": artist, "url": url, "score": score}
+        for track_id, name, artist, url, score in zip(
+            np.asarray(candidates["ids"], dtype=str)[page].tolist(),
+            columns["Song_Name"][page].tolist(),
+            columns["Artist"][page].tolist(),
+            columns["Song_URL"][page].tolist(),
+            candidates["scores"][page].tolist(),
+        )
+    ]
+
+    next_offset = offset + k
+    return {
+        "vibe_analysis": candidates["query"],
+        "songs": songs,
+        "used_user_key": entry["used_user_key"],
+        "next_cursor": f"{token}:{next_offset}" if next_offset < len(ranking) else None,
+    }
+
+
+async def search_playlist(
+    request: Request,
+    playlist_id: str,
+    text: str,
+    file: UploadFile,
+    user_api_key: str,
+    k: int = DEFAULT_PAGE_SIZE,
+    cursor: str = None,
+    diversity: float = None,
+):
+    """Shared search pipeline: optional image description, embed, then query the playlist's namespace."""
+    k = min(max(k, 1), MAX_PAGE_SIZE)
+
+    # Follow-up pages come straight from the saved candidates: no LLM, embed or vector calls
+    if cursor:
+        token, entry, offset = await run_in_threadpool(load_search, cursor)
+        if diversity is None:
+            diversity = entry["diversity"]
+        return await run_in_threadpool(build_page, token, entry, offset, k, diversity)
+
+    # Every provider call below (in the threadpool too) gives up when the deadline passes
+    with resilience.deadline(SEARCH_DEADLINE_SECONDS):
+        return await start_search(request, playlist_id, text, file, user_api_key, k, diversity)
+
+
+async def start_search(
+    request: Request,
+    playlist_id: str,
+    text: str,
+    file: UploadFile,
+    user_api_key: str,
+    k: int,
+    diversity: float,
+):
+    """Runs a new search and returns its first page."""
     # Rate limiting
     client_ip = request.client.host
     if not check_rate_limit(client_ip):
         raise HTTPException(status_code=429, detail="Rate limit exceeded. Please wait a minute.")
 
-    # Get Google API key (server or user-provided)
-    api_key, using_user_key = get_api_key(user_api_key)
+    # Get Google API key (server or user-provided). Blocking SDK calls run in
+    # the threadpool so concurrent requests can overlap (and be coalesced).
+    api_key, using_user_key = await run_in_threadpool(get_api_key, user_api_key)
 
     if not api_key:
         raise HTTPException(status_code=503, detail="Google API key required. Please provide your API key.")
@@ -313,10 +923,14 @@ async def search_vibe(
     # 1. Handle image (if uploaded)
     image_description = ""
     if file:
+        content, content_hash = await read_upload(file)
         try:
-            content = await file.read()
-            image = Image.open(io.BytesIO(content))
-            image_description = describe_image_google(image, api_key)
+            # Identical concurrent uploads (with the same key) are decoded and described once
+            image_description = await run_in_threadpool(
+                _vision_flight.do, (content_hash, key_id(api_key)), describe_upload, content, api_key
+            )
+        except (HTTPException, resilience.CircuitOpenError, resilience.DeadlineExceeded):
+            raise
         except Exception as e:
             print(f"Vision Error: {e}")
             raise HTTPException(status_code=400, detail=f"Image processing failed: {str(e)}")
@@ -329,27 +943,24 @@ async def search_vibe(
 
     print(f"Searching for: {full_query}")
 
-    # 3. Search Pinecone
-    genai.configure(api_key=api_key)
-    embeddings = GoogleNativeEmbeddings(model="models/gemini-embedding-001")
-
-    vector_store = PineconeVectorStore.from_existing_index(
-        index_name="chroma-tune",
-        embedding=embeddings
+    # 3. Search Pinecone (identical concurrent searches with the same key share one embed + query)
+    namespace = get_namespace(playlist_id)
+    candidates = await run_in_threadpool(
+        _search_flight.do, (namespace, full_query, key_id(api_key)), fetch_candidates, full_query, namespace, api_key
     )
 
-    results = vector_store.similarity_search_with_score(full_query, k=5)
-
-    songs = []
-    for doc, score in results:
-        songs.append({
-            "name": doc.metadata.get("Song_Name"),
-            "artist": doc.metadata.get("Artist"),
-            "url": doc.metadata.get("Song_URL"),
-            "score": float(score)
-        })
+    entry = {"candidates": candidates, "rankings": {}, "diversity": diversity, "used_user_key": using_user_key}
+    token = await run_in_threadpool(save_search, entry)
+    return await run_in_threadpool(build_page, token, entry, 0, k, diversity)
 
-    return {"vibe_analysis": full_query, "songs": songs, "used_user_key": using_user_key}
+# Worker processes to serve with. Song vectors, the catalog, neighbor tables
+# and the query embedding cache are memory-mapped files shared by all of them.
+API_WORKERS = int(os.getenv("API_WORKERS", "1"))
 
 if __name__ == "__main__":
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    import uvicorn
+    if API_WORKERS > 1:
+        # Each worker imports the app itself, so it is passed as an import string
+        uvicorn.run("api:app", host="0.0.0.0", port=8000, workers=API_WORKERS)
+    else:
+        uvicorn.run(app, host="0.0.0.0", port=8000)
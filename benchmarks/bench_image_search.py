@@ -0,0 +1,75 @@
+# benchmarks/bench_image_search.py
+"""
+Image search scenario: concurrent image uploads to /search against the fakes.
+Also reports the server process's peak memory while the uploads are handled.
+
+    python -m benchmarks.bench_image_search --requests 50 --width 4000 --height 3000
+"""
+import io
+import threading
+
+import numpy as np
+import requests
+from PIL import Image
+
+from benchmarks.harness import (
+    fake_environment, make_parser, print_report, run_load, seed_index, serve_app, summarize, track_peak_rss
+)
+
+
+def make_jpeg(width, height, seed=0):
+    """
+    Photo-like JPEG of the given size: smooth colour regions plus sensor-style
+    grain, which compresses to roughly the size of a real camera photo.
+    """
+    rng = np.random.default_rng(seed)
+    base = rng.integers(0, 256, size=(max(height // 16, 1), max(width // 16, 1), 3), dtype=np.uint8)
+    smooth = np.asarray(Image.fromarray(base).resize((width, height), Image.BICUBIC), dtype=np.int16)
+    pixels = np.clip(smooth + rng.integers(-12, 13, size=smooth.shape), 0, 255).astype(np.uint8)
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).save(buffer, format="JPEG", quality=90)
+    return buffer.getvalue()
+
+
+def main():
+    parser = make_parser(__doc__)
+    parser.add_argument("--songs", type=int, default=500, help="Songs pre-loaded into the fake index")
+    parser.add_argument("--requests", type=int, default=50, help="Total image searches")
+    parser.add_argument("--concurrency", type=int, default=8, help="Concurrent clients")
+    parser.add_argument("--width", type=int, default=4000)
+    parser.add_argument("--height", type=int, default=3000)
+    parser.add_argument("--images", type=int, default=8, help="Distinct images uploaded in rotation")
+    parser.add_argument("--vision-latency", type=float, default=1.0, help="Seconds per fake vision call")
+    args = parser.parse_args()
+
+    # Distinct images, so concurrent uploads can't all share one decode
+    images = [make_jpeg(args.width, args.height, seed=i) for i in range(args.images)]
+    print(f"Upload size: {len(images[0]) / 1e6:.1f} MB ({args.width}x{args.height} JPEG, {args.images} distinct)")
+
+    with fake_environment(args) as (services, api, spotify, genai, pinecone):
+        seed_index(services, genai, args.songs)
+        # Vision calls are usually much slower than the text LLM calls
+        genai.llm_faults.latency = args.vision_latency
+        local = threading.local()
+
+        with serve_app(api.app) as base_url:
+            def search(i):
+                session = getattr(local, "session", None) or requests.Session()
+                local.session = session
+                res = session.post(
+                    f"{base_url}/search",
+                    data={"text": "for tonight"},
+                    files={"file": ("photo.jpg", images[i % len(images)], "image/jpeg")},
+                )
+                return res.status_code == 200
+
+            with track_peak_rss() as memory:
+                latencies, errors, wall = run_load(search, args.requests, args.concurrency)
+
+        summary = summarize(latencies, wall, errors)
+        summary.update(peak_rss_mb=memory["peak_mb"], rss_increase_mb=memory["increase_mb"])
+        print_report(f"Image search x{args.requests} @ concurrency {args.concurrency}", summary)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+# benchmarks/bench_search.py
+"""
+Search scenario: concurrent text searches through the HTTP API against the fakes.
+
+    python -m benchmarks.bench_search --requests 200 --concurrency 16
+"""
+import random
+import threading
+
+import requests
+
+from benchmarks.fakes import MOODS, SETTINGS
+from benchmarks.harness import fake_environment, make_parser, print_report, run_load, seed_index, serve_app, summarize
+
+
+def main():
+    parser = make_parser(__doc__)
+    parser.add_argument("--songs", type=int, default=500, help="Songs pre-loaded into the fake index")
+    parser.add_argument("--requests", type=int, default=200, help="Total search requests")
+    parser.add_argument("--concurrency", type=int, default=16, help="Concurrent clients")
+    parser.add_argument("--distinct-queries", type=int, default=20,
+                        help="Number of distinct query texts (fewer means more identical concurrent queries)")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    queries = [f"{rng.choice(MOODS)} music for a {rng.choice(SETTINGS)}" for _ in range(args.distinct_queries)]
+
+    with fake_environment(args) as (services, api, spotify, genai, pinecone):
+        seed_index(services, genai, args.songs)
+        with serve_app(api.app) as base_url:
+            local = threading.local()
+
+            def search(i):
+                session = getattr(local, "session", None) or requests.Session()
+                local.session = session
+                res = session.post(f"{base_url}/search", data={"text": queries[i % len(queries)]})
+                return res.status_code == 200
+
+            latencies, errors, wall = run_load(search, args.requests, args.concurrency)
+
+        print_report(
+            f"Text search x{args.requests} @ concurrency {args.concurrency}",
+            summarize(latencies, wall, errors),
+        )
+        print(f"  External calls: {genai.llm_faults.calls} LLM, {genai.embed_faults.calls} embed, "
+              f"{pinecone.faults.calls} Pinecone")
+
+        import coalesce
+        for group in ("key_check", "vector_search", "embed_query"):
+            print(f"  Coalesced {group}: {coalesce.DEDUPLICATED.value(group=group)} of "
+                  f"{coalesce.DEDUPLICATED.value(group=group) + coalesce.EXECUTED.value(group=group)} calls")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+# benchmarks/bench_startup.py
+"""
+Cold-start scenario: how long a fresh interpreter takes to import the API,
+and how long until a freshly started server answers its first request.
+Exits non-zero when the import exceeds the budget, so it can gate CI.
+
+    python -m benchmarks.bench_startup --runs 5 --budget-ms 1000
+"""
+import argparse
+import os
+import socket
+import subprocess
+import sys
+import time
+
+import numpy as np
+import requests
+
+from benchmarks.harness import ROOT, print_report
+
+# Import time (ms) of `import api` in a fresh interpreter that we aim to stay under
+STARTUP_BUDGET_MS = 1000
+
+
+def startup_env():
+    """Environment for the child processes: no background polling, no real credentials needed."""
+    env = dict(os.environ)
+    env.setdefault("SYNC_POLL_INTERVAL", "0")
+    env["PYTHONDONTWRITEBYTECODE"] = "1"
+    return env
+
+
+def parse_importtime(stderr):
+    """Returns {module: (self_us, cumulative_us)} from `python -X importtime` output."""
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        modules[name.strip()] = (int(self_us), int(cumulative_us))
+    return modules
+
+
+def measure_import(module):
+    """Imports the module in a fresh interpreter. Returns (wall seconds, importtime table)."""
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT, env=startup_env(), capture_output=True, text=True,
+    )
+    elapsed = time.perf_counter() - start
+    if result.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{result.stderr[-2000:]}")
+    return elapsed, parse_importtime(result.stderr)
+
+
+def measure_first_response(timeout=60):
+    """Starts the API under uvicorn and returns seconds until GET / succeeds."""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+
+    start = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "api:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        cwd=ROOT, env=startup_env(), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        while time.perf_counter() - start < timeout:
+            try:
+                if requests.get(f"http://127.0.0.1:{port}/", timeout=1).status_code == 200:
+                    return time.perf_counter() - start
+            except requests.ConnectionError:
+                time.sleep(0.02)
+        raise RuntimeError("Server did not start in time")
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=5, help="Cold starts to measure (median is reported)")
+    parser.add_argument("--budget-ms", type=float, default=STARTUP_BUDGET_MS, help="Max median import time of api")
+    parser.add_argument("--top", type=int, default=10, help="Slowest imports to list")
+    args = parser.parse_args()
+
+    import_ms, wall_ms, ready_ms = [], [], []
+    modules = {}
+    for _ in range(args.runs):
+        wall, modules = measure_import("api")
+        wall_ms.append(wall * 1000)
+        import_ms.append(modules["api"][1] / 1000)
+        ready_ms.append(measure_first_response() * 1000)
+
+    summary = {
+        "runs": args.runs,
+        "import_api_ms": float(np.median(import_ms)),
+        "interpreter_wall_ms": float(np.median(wall_ms)),
+        "first_response_ms": float(np.median(ready_ms)),
+        "budget_ms": float(args.budget_ms),
+    }
+    print_report("Cold start (median)", summary)
+
+    # Heaviest top-level dependencies of the last run, by cumulative time
+    print(f"  {'slowest imports':<40}{'cumulative ms':>14}")
+    heaviest = sorted(modules.items(), key=lambda item: item[1][1], reverse=True)
+    shown = 0
+    for name, (_, cumulative_us) in heaviest:
+        if name == "api" or "." in name:
+            continue
+        print(f"  {name:<40}{cumulative_us / 1000:>14.1f}")
+        shown += 1
+        if shown == args.top:
+            break
+
+    if summary["import_api_ms"] > args.budget_ms:
+        print(f"\nOver budget: import api took {summary['import_api_ms']:.0f} ms (budget {args.budget_ms:.0f} ms)")
+        sys.exit(1)
+    print(f"\nWithin budget ({args.budget_ms:.0f} ms)")
+
+
+if __name__ == "__main__":
+    main()
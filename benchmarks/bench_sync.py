@@ -0,0 +1,46 @@
+# benchmarks/bench_sync.py
+"""
+Sync scenario: index a playlist of N songs from scratch against the fakes.
+
+    python -m benchmarks.bench_sync --songs 200 --llm-latency 0.5
+"""
+import time
+
+from benchmarks.harness import fake_environment, make_parser, print_report, stage_summaries, summarize
+from benchmarks.fakes import make_tracks
+
+PLAYLIST_ID = "benchplaylist"
+
+
+def main():
+    parser = make_parser(__doc__)
+    parser.add_argument("--songs", type=int, default=100, help="Number of songs in the playlist")
+    parser.add_argument("--runs", type=int, default=1, help="Times to repeat the cold sync")
+    args = parser.parse_args()
+
+    import telemetry
+
+    latencies = []
+    trace = []
+    for run in range(args.runs):
+        with fake_environment(args) as (services, api, spotify, genai, pinecone):
+            spotify.add_playlist(PLAYLIST_ID, make_tracks(args.songs, seed=run))
+
+            run_trace = telemetry.start_trace()
+            start = time.perf_counter()
+            result = services.sync_collaborative_playlist(PLAYLIST_ID)
+            latencies.append(time.perf_counter() - start)
+            trace.extend(run_trace)
+
+            if not result.get("success"):
+                print(f"Run {run + 1} failed: {result.get('error')}")
+            print(f"Run {run + 1}: indexed {result.get('new_songs')} songs in {latencies[-1]:.2f}s "
+                  f"({genai.llm_faults.calls} LLM calls, {genai.embed_faults.calls} embed calls)")
+
+    summary = summarize(latencies, sum(latencies), units=args.songs * args.runs)
+    summary["throughput_per_s"] = summary["count"] / summary["wall_s"]
+    print_report(f"Sync {args.songs} songs (throughput in songs/s, latency per sync)", summary, stage_summaries(trace))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,366 @@
+# benchmarks/eval_retrieval.py
+"""
+Offline retrieval evaluation: recall@k, nDCG@k and per-query latency over a
+fixed, labeled song corpus, for each search backend.
+
+The labeled songs and vibe queries live in benchmarks/eval_data/. The
+bundled corpus.json carries template descriptions; --regenerate describes
+every song with the production prompt (services.generate_batch_descriptions)
+and embeds descriptions and queries with the production embedder, writing
+corpus.generated.json and benchmarks/eval_data/embeddings/ so later runs
+with --model models/gemini-embedding-001 measure what production would
+serve, fully offline.
+
+Without --model the run uses the offline hashed embedder, which needs no key
+or cache but only checks that the backends work and agree: its scores say
+nothing about production retrieval quality.
+
+    python -m benchmarks.eval_retrieval                       # smoke test, no key needed
+    python -m benchmarks.eval_retrieval --regenerate          # needs GOOGLE_API_KEY
+    python -m benchmarks.eval_retrieval --model models/gemini-embedding-001 --k 10
+    python -m benchmarks.eval_retrieval --backends numpy faiss --diversity 0.3
+"""
+import argparse
+import hashlib
+import json
+import os
+import random
+import time
+
+import numpy as np
+
+from benchmarks.fakes import FakePinecone, hashed_embedding
+from benchmarks.harness import ROOT, print_report
+
+EVAL_DIR = os.path.join(ROOT, "benchmarks", "eval_data")
+CORPUS_FILE = os.path.join(EVAL_DIR, "corpus.json")
+GENERATED_CORPUS_FILE = os.path.join(EVAL_DIR, "corpus.generated.json")  # written by --regenerate
+QUERIES_FILE = os.path.join(EVAL_DIR, "queries.json")
+EMBEDDINGS_DIR = os.path.join(EVAL_DIR, "embeddings")
+
+OFFLINE_MODEL = "hashed-768"
+PRODUCTION_MODEL = "models/gemini-embedding-001"  # what sync and search embed with
+BACKENDS = ("pinecone", "numpy", "faiss")
+
+# Candidates fetched before a diversity rerank, as in /search
+RERANK_CANDIDATES = 50
+
+# Extra candidates fetched per query, so near-ties at the cut-off settle the same way on every backend
+TIE_MARGIN = 10
+
+# Score gap below which two songs count as tied (backends score in float32)
+TIE_TOLERANCE = 1e-5
+
+# Songs per description prompt, as in sync
+DESCRIBE_BATCH_SIZE = 10
+
+# Words used to write descriptions and queries. Queries use different
+# synonyms than the descriptions, so retrieval has to do more than match words.
+MOOD_WORDS = {
+    "dreamy": (["dreamy", "hazy", "ethereal"], ["floaty", "dreamlike"]),
+    "energetic": (["energetic", "high-energy", "driving"], ["pumped", "full of energy"]),
+    "melancholic": (["melancholic", "wistful", "bittersweet"], ["sad", "melancholy"]),
+    "upbeat": (["upbeat", "cheerful", "bouncy"], ["happy", "feel-good"]),
+    "chill": (["chill", "laid-back", "mellow"], ["relaxed", "easygoing"]),
+    "dark": (["dark", "brooding", "moody"], ["gloomy", "ominous"]),
+    "romantic": (["romantic", "tender", "intimate"], ["lovey", "date-night"]),
+    "nostalgic": (["nostalgic", "retro", "sentimental"], ["throwback", "memory-lane"]),
+    "angry": (["angry", "aggressive", "furious"], ["rage", "raging"]),
+    "peaceful": (["peaceful", "calm", "serene"], ["tranquil", "quiet"]),
+}
+SETTING_WORDS = {
+    "rainy night": (["rainy night", "stormy evening"], ["rain at night", "thunderstorm"]),
+    "road trip": (["summer road trip", "long drive on the highway"], ["road trip", "highway drive"]),
+    "coffee shop": (["coffee shop", "quiet cafe"], ["cafe", "coffee break"]),
+    "late-night drive": (["late-night drive", "empty streets after midnight"], ["midnight drive", "night driving"]),
+    "workout": (["workout", "gym session"], ["exercise", "running"]),
+    "beach sunset": (["beach sunset", "golden hour by the sea"], ["sunset at the beach", "seaside evening"]),
+    "house party": (["house party", "crowded living room party"], ["party", "dance party"]),
+    "study session": (["study session", "focused homework"], ["studying", "focus time"]),
+    "forest walk": (["forest walk", "hike through the woods"], ["nature walk", "woods"]),
+    "city rooftop": (["city rooftop", "skyline at dusk"], ["rooftop", "city lights"]),
+}
+GENRES = ["indie pop", "synthwave", "lo-fi", "hip hop", "jazz", "rock", "folk", "house", "r&b", "ambient"]
+
+
+def build_fixture(songs=300, queries=40, seed=7):
+    """Generates the corpus and labeled queries. Only needed to rebuild benchmarks/eval_data."""
+    rng = random.Random(seed)
+    moods, settings = list(MOOD_WORDS), list(SETTING_WORDS)
+
+    corpus = []
+    for i in range(songs):
+        mood, setting, genre = rng.choice(moods), rng.choice(settings), rng.choice(GENRES)
+        mood_word = rng.choice(MOOD_WORDS[mood][0])
+        setting_phrase = rng.choice(SETTING_WORDS[setting][0])
+        description = rng.choice([
+            f"A {mood_word} {genre} song, perfect for a {setting_phrase}.",
+            f"{mood_word.capitalize()} {genre} that fits a {setting_phrase}.",
+            f"Play this {mood_word} {genre} track during a {setting_phrase}.",
+        ])
+        track_id = hashlib.md5(f"eval-{seed}-{i}".encode()).hexdigest()[:22]
+        corpus.append({
+            "id": track_id,
+            "name": f"{genre.title()} Song {i}",
+            "artist": f"Artist {rng.randint(1, songs // 5)}",
+            "mood": mood,
+            "setting": setting,
+            "genre": genre,
+            "description": description,
+        })
+
+    labeled = []
+    pairs = rng.sample([(m, s) for m in moods for s in settings], queries)
+    for mood, setting in pairs:
+        query = rng.choice([
+            f"{rng.choice(MOOD_WORDS[mood][1])} music for {rng.choice(SETTING_WORDS[setting][1])}",
+            f"something {rng.choice(MOOD_WORDS[mood][0])} for a {rng.choice(SETTING_WORDS[setting][1])}",
+            f"{rng.choice(SETTING_WORDS[setting][1])} vibes, {rng.choice(MOOD_WORDS[mood][1])}",
+        ])
+        # 2 = right mood and setting, 1 = one of the two
+        relevance = {}
+        for song in corpus:
+            grade = (song["mood"] == mood) + (song["setting"] == setting)
+            if grade:
+                relevance[song["id"]] = grade
+        labeled.append({"query": query, "mood": mood, "setting": setting, "relevance": relevance})
+    return corpus, labeled
+
+
+def load_fixture(corpus_file=CORPUS_FILE, queries_file=QUERIES_FILE):
+    with open(corpus_file) as f:
+        corpus = json.load(f)
+    with open(queries_file) as f:
+        queries = json.load(f)
+    return corpus, queries
+
+
+def default_corpus_file():
+    """The regenerated corpus if there is one, else the bundled template corpus."""
+    return GENERATED_CORPUS_FILE if os.path.exists(GENERATED_CORPUS_FILE) else CORPUS_FILE
+
+
+def regenerate_corpus(corpus):
+    """
+    Rewrites every song's description with the prompt sync uses, and saves
+    the result so later runs don't need Gemini. Returns the new corpus.
+    """
+    from services import generate_batch_descriptions
+
+    regenerated = []
+    for i in range(0, len(corpus), DESCRIBE_BATCH_SIZE):
+        batch = corpus[i:i + DESCRIBE_BATCH_SIZE]
+        results = generate_batch_descriptions(batch, {})
+        if len(results) != len(batch) or not all(isinstance(r, dict) and r.get("vibe") for r in results):
+            raise SystemExit(f"Gemini returned {len(results)} descriptions for {len(batch)} songs; rerun --regenerate")
+        regenerated.extend({**song, "description": result["vibe"]} for song, result in zip(batch, results))
+        print(f"Described {len(regenerated)}/{len(corpus)} songs")
+
+    with open(GENERATED_CORPUS_FILE, "w") as f:
+        json.dump(regenerated, f, indent=1)
+    return regenerated
+
+
+def embed_texts(texts, model, allow_network=False):
+    """
+    Embeds texts with the offline hashed model, or with a real model through
+    the app's embedding class. Real-model vectors are cached per text, so
+    only texts that changed since the last run need the network.
+    """
+    if model == OFFLINE_MODEL:
+        return np.stack([hashed_embedding(text, 768) for text in texts])
+
+    cache_path = os.path.join(EMBEDDINGS_DIR, f"{model.replace('/', '_')}.npz")
+    cache = {}
+    if os.path.exists(cache_path):
+        saved = np.load(cache_path)
+        cache = dict(zip(saved["keys"].tolist(), saved["vectors"]))
+
+    keys = [hashlib.sha1(text.encode()).hexdigest() for text in texts]
+    missing = [text for text, key in zip(texts, keys) if key not in cache]
+    if missing:
+        if not allow_network:
+            raise SystemExit(
+                f"{len(missing)} texts have no cached {model} embedding. Run --regenerate (or --allow-network)"
+                f" to compute them, or --model {OFFLINE_MODEL} for an offline smoke test."
+            )
+        from services import GoogleNativeEmbeddings
+        vectors = GoogleNativeEmbeddings(model=model).embed_documents(missing)
+        for text, vector in zip(missing, vectors):
+            cache[hashlib.sha1(text.encode()).hexdigest()] = np.asarray(vector, dtype=np.float32)
+        os.makedirs(EMBEDDINGS_DIR, exist_ok=True)
+        np.savez(cache_path, keys=np.asarray(list(cache)), vectors=np.stack(list(cache.values())))
+
+    return np.stack([cache[key] for key in keys]).astype(np.float32)
+
+
+def make_backend(name, ids, vectors):
+    """Returns search(query_vector, n) -> row indices of the top n songs, best first."""
+    if name == "numpy":
+        from local_index import LocalIndex
+        index = LocalIndex.from_vectors(ids, vectors)
+        return lambda query, n: index.search(query, n)[0][0]
+
+    if name == "faiss":
+        import faiss
+        from rerank import normalize_rows
+        index = faiss.IndexFlatIP(vectors.shape[1])
+        index.add(normalize_rows(vectors))
+        return lambda query, n: index.search(normalize_rows(query[None, :]), n)[1][0]
+
+    if name == "pinecone":
+        index = FakePinecone().Index("eval")
+        index.upsert(vectors=[(vid, vector.tolist(), {}) for vid, vector in zip(ids, vectors)], namespace="eval")
+        row_of = {vid: row for row, vid in enumerate(ids)}
+
+        def search(query, n):
+            matches = index.query(vector=query.tolist(), top_k=n, namespace="eval")["matches"]
+            return np.asarray([row_of[m["id"]] for m in matches])
+        return search
+
+    raise ValueError(f"Unknown backend: {name}")
+
+
+def settle_ties(search, query_vector, unit_vectors, n, found):
+    """
+    Re-scores a backend's candidates in float64 and orders them by score, then
+    corpus row. Exact backends differ only in float rounding and in which of
+    several equal scores they return first, so after this they agree on the
+    top n. found holds the first n + TIE_MARGIN rows; while songs tied with
+    the n-th could still be missing, twice as many are fetched.
+    """
+    query = query_vector.astype(np.float64)
+    query /= np.linalg.norm(query)
+    fetched = n + TIE_MARGIN
+    while True:
+        rows = np.unique(np.asarray(found, dtype=np.int64))
+        rows = rows[rows >= 0]  # FAISS pads with -1 when asked for more rows than it has
+        scores = unit_vectors[rows] @ query
+        order = np.lexsort((rows, -scores))
+        rows, scores = rows[order], scores[order]
+        if fetched >= len(unit_vectors) or len(rows) <= n or scores[n - 1] - scores[-1] > TIE_TOLERANCE:
+            return rows[:n]
+        fetched = min(fetched * 2, len(unit_vectors))
+        found = search(query_vector, fetched)
+
+
+def ndcg_at_k(ranked_grades, ideal_grades, k):
+    """nDCG@k with graded relevance (gain 2^grade - 1)."""
+    discounts = 1.0 / np.log2(np.arange(2, k + 2))
+    gains = (2.0 ** np.asarray(ranked_grades[:k], dtype=float) - 1) @ discounts[:len(ranked_grades[:k])]
+    ideal = np.sort(np.asarray(ideal_grades, dtype=float))[::-1][:k]
+    best = (2.0 ** ideal - 1) @ discounts[:len(ideal)]
+    return gains / best if best else 0.0
+
+
+def evaluate(search, corpus, queries, query_vectors, vectors, k, diversity):
+    """Runs every query through one backend. Returns (summary, per-query results)."""
+    from rerank import mmr, normalize_rows
+
+    ids = [song["id"] for song in corpus]
+    artists = [song["artist"] for song in corpus]
+    unit_vectors = normalize_rows(vectors.astype(np.float64))
+    results = []
+    for labeled, query_vector in zip(queries, query_vectors):
+        n = RERANK_CANDIDATES if diversity else k
+        start = time.perf_counter()
+        found = search(query_vector, n + TIE_MARGIN)
+        latency = time.perf_counter() - start
+
+        rows = settle_ties(search, query_vector, unit_vectors, n, found)
+        if diversity:
+            order = mmr(query_vector, vectors[rows], lambda_mult=1.0 - diversity, k=k,
+                        artists=[artists[row] for row in rows])
+            rows = rows[order]
+
+        relevance = labeled["relevance"]
+        grades = [relevance.get(ids[row], 0) for row in rows]
+        highly_relevant = [vid for vid, grade in relevance.items() if grade == 2]
+        hits = sum(1 for grade in grades if grade == 2)
+        results.append({
+            "query": labeled["query"],
+            "recall": hits / len(highly_relevant) if highly_relevant else 0.0,
+            "ndcg": ndcg_at_k(grades, list(relevance.values()), k),
+            "latency_ms": latency * 1000,
+        })
+
+    latencies = np.asarray([r["latency_ms"] for r in results])
+    summary = {
+        f"recall@{k}": float(np.mean([r["recall"] for r in results])),
+        f"ndcg@{k}": float(np.mean([r["ndcg"] for r in results])),
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p95_ms": float(np.percentile(latencies, 95)),
+        "p99_ms": float(np.percentile(latencies, 99)),
+    }
+    return summary, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--k", type=int, default=10, help="Results per query")
+    parser.add_argument("--backends", nargs="+", default=list(BACKENDS), choices=BACKENDS)
+    parser.add_argument("--model",
+                        help=f"Embedding model (default: {OFFLINE_MODEL}, a smoke test; "
+                             f"{PRODUCTION_MODEL} scores what production serves)")
+    parser.add_argument("--diversity", type=float, default=0.0, help="MMR diversity applied after retrieval (0-1)")
+    parser.add_argument("--corpus", help="Corpus JSON (default: the regenerated corpus, else the template one)")
+    parser.add_argument("--queries", default=QUERIES_FILE, help="Labeled queries JSON")
+    parser.add_argument("--allow-network", action="store_true", help="Embed texts missing from the cache")
+    parser.add_argument("--regenerate", action="store_true",
+                        help="Describe the corpus with the production prompt and embed it, rewriting the caches")
+    parser.add_argument("--per-query", action="store_true", help="Print every query's scores")
+    parser.add_argument("--json", help="Also write the results to this file, for comparing runs")
+    parser.add_argument("--rebuild-fixture", action="store_true", help="Regenerate the corpus and queries files")
+    args = parser.parse_args()
+
+    if args.rebuild_fixture:
+        corpus, queries = build_fixture()
+        os.makedirs(EVAL_DIR, exist_ok=True)
+        with open(CORPUS_FILE, "w") as f:
+            json.dump(corpus, f, indent=1)
+        with open(QUERIES_FILE, "w") as f:
+            json.dump(queries, f, indent=1)
+        print(f"Wrote {len(corpus)} songs and {len(queries)} queries to {EVAL_DIR}")
+        return
+
+    corpus, queries = load_fixture(args.corpus or default_corpus_file(), args.queries)
+    if args.model is None:
+        args.model = PRODUCTION_MODEL if args.regenerate else OFFLINE_MODEL
+    if args.regenerate:
+        if args.model == OFFLINE_MODEL:
+            parser.error(f"--regenerate needs a real embedding model, not {OFFLINE_MODEL}")
+        corpus = regenerate_corpus(corpus)
+        args.allow_network = True
+    elif not args.corpus and not os.path.exists(GENERATED_CORPUS_FILE):
+        print("Using template descriptions; run --regenerate to score descriptions from the production prompt")
+    vectors = embed_texts([song["description"] for song in corpus], args.model, args.allow_network)
+    query_vectors = embed_texts([q["query"] for q in queries], args.model, args.allow_network)
+    ids = [song["id"] for song in corpus]
+    print(f"{len(corpus)} songs, {len(queries)} queries, model {args.model}, k={args.k}, diversity={args.diversity}")
+    smoke_test = args.model == OFFLINE_MODEL
+    if smoke_test:
+        print(f"SMOKE TEST ONLY: {OFFLINE_MODEL} embeds by hashing words, so these scores only show the backends "
+              f"work and agree. Run --regenerate, then --model {PRODUCTION_MODEL}, for production quality.")
+
+    report = {}
+    for backend in args.backends:
+        try:
+            search = make_backend(backend, ids, vectors)
+        except ImportError as e:
+            print(f"\nSkipping {backend}: {e}")
+            continue
+        summary, results = evaluate(search, corpus, queries, query_vectors, vectors, args.k, args.diversity)
+        report[backend] = {"summary": summary, "queries": results}
+        print_report(f"{backend}", summary)
+        if args.per_query:
+            for r in results:
+                print(f"    {r['recall']:.2f}  {r['ndcg']:.2f}  {r['latency_ms']:7.2f} ms  {r['query']}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"model": args.model, "smoke_test": smoke_test, "k": args.k, "diversity": args.diversity,
+                       "backends": report}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
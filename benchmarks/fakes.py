@@ -0,0 +1,440 @@
+# benchmarks/fakes.py
+"""
+Local stand-ins for the Spotify Web API, Gemini and Pinecone.
+
+Each fake has configurable latency (seconds per call) and an error rate
+(probability a call fails with a quota/rate-limit error), so benchmarks can
+reproduce slow or flaky providers without touching a live service.
+"""
+import hashlib
+import io
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+
+# Small vocabulary used to generate song names and vibe descriptions
+MOODS = ["dreamy", "energetic", "melancholic", "upbeat", "chill", "dark", "romantic", "nostalgic", "angry", "peaceful"]
+SETTINGS = ["rainy night", "summer road trip", "coffee shop", "late-night drive", "workout", "beach sunset",
+            "house party", "study session", "forest walk", "city rooftop"]
+GENRES = ["indie pop", "synthwave", "lo-fi", "hip hop", "jazz", "rock", "folk", "house", "r&b", "ambient"]
+
+
+class FakeError(Exception):
+    """Raised by the fakes when error injection triggers."""
+
+
+class _Obj:
+    """Attribute bag that also allows item access, like the Pinecone response models."""
+
+    def __init__(self, **fields):
+        self.__dict__.update(fields)
+
+    def __getitem__(self, name):
+        return self.__dict__[name]
+
+    def __setitem__(self, name, value):
+        self.__dict__[name] = value
+
+    def __contains__(self, name):
+        return name in self.__dict__
+
+    def get(self, name, default=None):
+        return self.__dict__.get(name, default)
+
+
+class _Done:
+    """Result of an async_req upsert, already completed."""
+
+    def __init__(self, value):
+        self.value = value
+
+    def get(self):
+        return self.value
+
+
+class FaultInjector:
+    """Shared latency and error injection for the fakes."""
+
+    def __init__(self, latency=0.0, error_rate=0.0, seed=0, slow_rate=0.0, slow_latency=0.0):
+        self.latency = latency
+        self.error_rate = error_rate
+        # A brownout: this fraction of calls takes slow_latency instead
+        self.slow_rate = slow_rate
+        self.slow_latency = slow_latency
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls = 0
+
+    def hit(self):
+        """Simulates one call: sleeps for the latency and returns True if it should fail."""
+        with self._lock:
+            self.calls += 1
+            failed = self._random.random() < self.error_rate
+            slow = self.slow_rate and self._random.random() < self.slow_rate
+        latency = self.slow_latency if slow else self.latency
+        if latency:
+            time.sleep(latency)
+        return failed
+
+
+def make_tracks(count, seed=0):
+    """Generates Spotify-shaped playlist items with deterministic names and artists."""
+    rng = random.Random(seed)
+    items = []
+    for i in range(count):
+        track_id = hashlib.md5(f"{seed}-{i}".encode()).hexdigest()[:22]
+        mood = rng.choice(MOODS)
+        genre = rng.choice(GENRES)
+        items.append({
+            "track": {
+                "id": track_id,
+                "name": f"{mood.title()} {genre.title()} {i}",
+                "artists": [{"name": f"Artist {rng.randint(1, max(count // 4, 1))}"}],
+                "external_urls": {"spotify": f"https://open.spotify.com/track/{track_id}"},
+            }
+        })
+    return items
+
+
+def hashed_embedding(text, dimension):
+    """Deterministic bag-of-words embedding, so similar texts get similar vectors."""
+    vector = np.zeros(dimension, dtype=np.float32)
+    for token in re.findall(r"[a-z0-9&-]+", text.lower()):
+        digest = hashlib.md5(token.encode()).digest()
+        bucket = int.from_bytes(digest[:4], "little") % dimension
+        sign = 1.0 if digest[4] % 2 else -1.0
+        vector[bucket] += sign
+    norm = np.linalg.norm(vector)
+    if norm:
+        vector /= norm
+    return vector
+
+
+def vibe_for(name, artist):
+    """Deterministic vibe description for a song, built from the words in its name."""
+    words = name.lower().split()
+    rng = random.Random(f"{name}|{artist}")
+    return f"A {' '.join(words[:-1])} track for a {rng.choice(SETTINGS)}, {rng.choice(MOODS)} and immersive."
+
+
+class FakeSpotifyServer:
+    """
+    Local HTTP server implementing the Spotify endpoints used by the app:
+    client-credentials token, paginated playlist tracks, playlist snapshot_id
+    and batch audio features.
+    """
+
+    def __init__(self, latency=0.0, error_rate=0.0, error_status=429, page_size=100):
+        self.faults = FaultInjector(latency, error_rate)
+        self.error_status = error_status
+        self.page_size = page_size
+        self.playlists = {}   # playlist_id -> list of playlist items
+        self.snapshots = {}   # playlist_id -> snapshot_id
+        self.audio_feature_ids = 0  # track IDs requested from /audio-features
+        self._server = None
+        self._thread = None
+
+    def add_playlist(self, playlist_id, items):
+        """Registers (or replaces) a playlist and bumps its snapshot_id."""
+        self.playlists[playlist_id] = list(items)
+        self.snapshots[playlist_id] = hashlib.md5(
+            ",".join(item["track"]["id"] for item in items).encode()
+        ).hexdigest()
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def api_url(self):
+        return f"{self.url}/v1"
+
+    @property
+    def accounts_url(self):
+        return f"{self.url}/api"
+
+    def start(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status, payload, headers=None):
+                body = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _fail(self):
+                self._send(fake.error_status, {"error": {"status": fake.error_status, "message": "Injected failure"}},
+                           {"Retry-After": "0"})
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                self.rfile.read(length)
+                if fake.faults.hit():
+                    return self._fail()
+                if self.path.rstrip("/") == "/api/token":
+                    return self._send(200, {"access_token": "fake-token", "token_type": "Bearer", "expires_in": 3600})
+                self._send(404, {"error": {"status": 404, "message": "Not found"}})
+
+            def do_GET(self):
+                if fake.faults.hit():
+                    return self._fail()
+                parsed = urlparse(self.path)
+                query = parse_qs(parsed.query)
+                parts = parsed.path.strip("/").split("/")
+
+                if parts[:2] == ["v1", "audio-features"]:
+                    ids = query.get("ids", [""])[0].split(",")
+                    fake.audio_feature_ids += len(ids)
+                    return self._send(200, {"audio_features": [fake.audio_features(tid) for tid in ids if tid]})
+
+                if len(parts) >= 3 and parts[:2] == ["v1", "playlists"]:
+                    playlist_id = parts[2]
+                    if playlist_id not in fake.playlists:
+                        return self._send(404, {"error": {"status": 404, "message": "Not found"}})
+                    if len(parts) == 3:
+                        return self._send(200, {"id": playlist_id, "name": f"Playlist {playlist_id}",
+                                                "snapshot_id": fake.snapshots[playlist_id]})
+                    if parts[3] == "tracks":
+                        return self._send(200, fake.tracks_page(playlist_id, query))
+
+                self._send(404, {"error": {"status": 404, "message": "Not found"}})
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+
+    def tracks_page(self, playlist_id, query):
+        items = self.playlists[playlist_id]
+        offset = int(query.get("offset", ["0"])[0])
+        limit = int(query.get("limit", [str(self.page_size)])[0])
+        page = items[offset:offset + limit]
+        next_url = None
+        if offset + limit < len(items):
+            next_url = f"{self.api_url}/playlists/{playlist_id}/tracks?offset={offset + limit}&limit={limit}"
+        return {"items": page, "total": len(items), "offset": offset, "limit": limit, "next": next_url}
+
+    @staticmethod
+    def audio_features(track_id):
+        rng = random.Random(track_id)
+        return {
+            "id": track_id,
+            "energy": rng.random(),
+            "tempo": rng.uniform(60, 180),
+            "danceability": rng.random(),
+            "valence": rng.random(),
+            "acousticness": rng.random(),
+            "instrumentalness": rng.random(),
+        }
+
+
+class FakeGenAI:
+    """
+    Drop-in for the parts of `google.generativeai` the app uses:
+    GenerativeModel.generate_content and embed_content, plus per-key clients.
+    Every call records which API key's client made it in `keys_used`.
+    """
+
+    def __init__(self, llm_latency=0.0, embed_latency=0.0, error_rate=0.0, dimension=768):
+        self.llm_faults = FaultInjector(llm_latency, error_rate, seed=1)
+        self.embed_faults = FaultInjector(embed_latency, error_rate, seed=2)
+        self.dimension = dimension
+        self.keys_used = []
+        fake = self
+
+        class GenerativeModel:
+            def __init__(self, model_name, **kwargs):
+                self.model_name = model_name
+                self._client = None
+
+            def generate_content(self, contents, **kwargs):
+                return fake.generate_content(contents, client=self._client)
+
+        self.GenerativeModel = GenerativeModel
+
+    def make_client(self, api_key):
+        """Stand-in for a GenerativeServiceClient bound to one key."""
+        return _Obj(api_key=api_key)
+
+    def _record_key(self, client):
+        self.keys_used.append(client.api_key if client is not None else None)
+
+    def generate_content(self, contents, client=None):
+        self._record_key(client)
+        if not isinstance(contents, str):
+            # The SDK re-encodes PIL images before upload; keep that cost in the benchmarks
+            for part in contents:
+                if not isinstance(part, str):
+                    part.save(io.BytesIO(), format="PNG" if part.mode == "RGBA" else "JPEG")
+        if self.llm_faults.hit():
+            raise FakeError("429 Resource has been exhausted (e.g. check quota).")
+
+        prompt = contents if isinstance(contents, str) else " ".join(c for c in contents if isinstance(c, str))
+        songs = re.findall(r'^\s*\d+\.\s+"(.*)" by (.*)$', prompt, flags=re.MULTILINE)
+        if songs:
+            text = json.dumps([{"title": name, "vibe": vibe_for(name, artist)} for name, artist in songs])
+        elif isinstance(contents, str):
+            text = "ok"
+        else:
+            # Image description: deterministic but varied per call
+            rng = random.Random(prompt)
+            text = f"A {rng.choice(MOODS)} scene that feels like a {rng.choice(SETTINGS)}."
+        return _Obj(text=text)
+
+    def embed_content(self, model=None, content=None, client=None, **kwargs):
+        self._record_key(client)
+        if self.embed_faults.hit():
+            raise FakeError("429 Resource has been exhausted (e.g. check quota).")
+        if isinstance(content, list):
+            return {"embedding": [hashed_embedding(text, self.dimension).tolist() for text in content]}
+        return {"embedding": hashed_embedding(content, self.dimension).tolist()}
+
+
+class FakeIndex:
+    """In-memory Pinecone index with exact cosine search over each namespace."""
+
+    def __init__(self, faults):
+        self.faults = faults
+        self.namespaces = {}  # namespace -> {id: (values, metadata)}
+        self._matrices = {}   # namespace -> (ids, normalized matrix), rebuilt lazily
+        self._lock = threading.Lock()
+
+    def _check(self):
+        if self.faults.hit():
+            raise FakeError("429 Too Many Requests: injected failure")
+
+    def upsert(self, vectors, namespace="", async_req=False, **kwargs):
+        self._check()
+        namespace = namespace or ""
+        count = 0
+        with self._lock:
+            store = self.namespaces.setdefault(namespace, {})
+            for vector in vectors:
+                if isinstance(vector, dict):
+                    vid, values, metadata = vector["id"], vector["values"], vector.get("metadata", {})
+                else:
+                    vid, values, metadata = (tuple(vector) + ({},))[:3]
+                store[vid] = (np.asarray(values, dtype=np.float32), dict(metadata or {}))
+                count += 1
+            self._matrices.pop(namespace, None)
+        result = _Obj(upserted_count=count)
+        return _Done(result) if async_req else result
+
+    def _matrix(self, namespace):
+        with self._lock:
+            cached = self._matrices.get(namespace)
+            if cached is None:
+                store = self.namespaces.get(namespace, {})
+                ids = list(store)
+                if ids:
+                    matrix = np.stack([store[vid][0] for vid in ids])
+                    matrix /= np.linalg.norm(matrix, axis=1, keepdims=True) + 1e-12
+                else:
+                    matrix = np.zeros((0, 0), dtype=np.float32)
+                cached = self._matrices[namespace] = (ids, matrix)
+            return cached
+
+    def query(self, vector=None, top_k=10, namespace="", include_metadata=False, include_values=False,
+              filter=None, **kwargs):
+        self._check()
+        namespace = namespace or ""
+        ids, matrix = self._matrix(namespace)
+        if not ids:
+            return _Obj(matches=[], namespace=namespace)
+        query = np.asarray(vector, dtype=np.float32)
+        query /= np.linalg.norm(query) + 1e-12
+        scores = matrix @ query
+        top = np.argsort(-scores)[:top_k]
+        store = self.namespaces[namespace]
+        matches = []
+        for i in top:
+            vid = ids[i]
+            match = _Obj(id=vid, score=float(scores[i]))
+            if include_metadata:
+                match["metadata"] = dict(store[vid][1])
+            if include_values:
+                match["values"] = store[vid][0].tolist()
+            matches.append(match)
+        return _Obj(matches=matches, namespace=namespace)
+
+    def fetch(self, ids, namespace="", **kwargs):
+        self._check()
+        store = self.namespaces.get(namespace or "", {})
+        vectors = {
+            vid: _Obj(id=vid, values=store[vid][0].tolist(), metadata=dict(store[vid][1]))
+            for vid in ids if vid in store
+        }
+        return _Obj(vectors=vectors, namespace=namespace or "")
+
+    def list(self, prefix=None, limit=100, namespace="", **kwargs):
+        self._check()
+        ids = [vid for vid in self.namespaces.get(namespace or "", {}) if not prefix or vid.startswith(prefix)]
+        for i in range(0, len(ids), limit):
+            yield ids[i:i + limit]
+
+    def delete(self, ids=None, delete_all=False, namespace="", **kwargs):
+        self._check()
+        namespace = namespace or ""
+        with self._lock:
+            store = self.namespaces.setdefault(namespace, {})
+            if delete_all:
+                store.clear()
+            else:
+                for vid in ids or []:
+                    store.pop(vid, None)
+            self._matrices.pop(namespace, None)
+        return _Obj()
+
+    def describe_index_stats(self, **kwargs):
+        self._check()
+        namespaces = {ns: _Obj(vector_count=len(store)) for ns, store in self.namespaces.items()}
+        dimension = 0
+        for store in self.namespaces.values():
+            for values, _ in store.values():
+                dimension = len(values)
+                break
+        return _Obj(
+            total_vector_count=sum(len(store) for store in self.namespaces.values()),
+            dimension=dimension,
+            namespaces=namespaces,
+        )
+
+
+class FakePinecone:
+    """Drop-in for the `pinecone.Pinecone` client, holding named in-memory indexes."""
+
+    def __init__(self, latency=0.0, error_rate=0.0):
+        self.faults = FaultInjector(latency, error_rate, seed=3)
+        self.indexes = {}
+
+    def Index(self, name="", **kwargs):
+        if name not in self.indexes:
+            self.indexes[name] = FakeIndex(self.faults)
+        return self.indexes[name]
+
+    def delete_index(self, name, **kwargs):
+        self.indexes.pop(name, None)
+
+    def create_index(self, name, **kwargs):
+        self.indexes[name] = FakeIndex(self.faults)
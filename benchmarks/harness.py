@@ -0,0 +1,243 @@
+# benchmarks/harness.py
+"""
+Shared plumbing for the benchmark scenarios: wiring the fakes into the app,
+running the API in a background server, and reporting latency percentiles.
+"""
+import argparse
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+import numpy as np
+
+# Make the repo root importable when scenarios are run as scripts
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+# The app reads these at import time; the fakes never check them
+os.environ.setdefault("PINECONE_API_KEY", "bench-key")
+os.environ.setdefault("GOOGLE_API_KEY", "bench-key")
+os.environ.setdefault("SPOTIFY_CLIENT_ID", "bench-client")
+os.environ.setdefault("SPOTIFY_CLIENT_SECRET", "bench-secret")
+# Benchmarks trigger syncs themselves; keep the background poller out of the timings
+os.environ.setdefault("SYNC_POLL_INTERVAL", "0")
+
+from benchmarks.fakes import FakeGenAI, FakePinecone, FakeSpotifyServer  # noqa: E402
+
+
+def add_fake_arguments(parser):
+    """Adds the latency and error-injection flags shared by every scenario."""
+    parser.add_argument("--spotify-latency", type=float, default=0.02, help="Seconds per Spotify call")
+    parser.add_argument("--llm-latency", type=float, default=0.3, help="Seconds per Gemini generate call")
+    parser.add_argument("--embed-latency", type=float, default=0.05, help="Seconds per Gemini embed call")
+    parser.add_argument("--pinecone-latency", type=float, default=0.03, help="Seconds per Pinecone call")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Probability any external call fails")
+    parser.add_argument("--slow-rate", type=float, default=0.0, help="Probability a Gemini/Pinecone call is slow")
+    parser.add_argument("--slow-latency", type=float, default=2.0, help="Seconds a slow call takes")
+    parser.add_argument("--dimension", type=int, default=768, help="Embedding dimension of the fake model")
+    return parser
+
+
+def make_parser(description):
+    return add_fake_arguments(argparse.ArgumentParser(description=description))
+
+
+@contextmanager
+def fake_environment(args):
+    """
+    Starts the fakes, points the app at them and runs inside a scratch
+    directory so local state files (indexed songs, caches) are isolated.
+    Yields (services, api, spotify, genai, pinecone).
+    """
+    spotify = FakeSpotifyServer(latency=args.spotify_latency, error_rate=args.error_rate).start()
+    genai = FakeGenAI(
+        llm_latency=args.llm_latency,
+        embed_latency=args.embed_latency,
+        error_rate=args.error_rate,
+        dimension=args.dimension,
+    )
+    pinecone = FakePinecone(latency=args.pinecone_latency, error_rate=args.error_rate)
+    for faults in (genai.llm_faults, genai.embed_faults, pinecone.faults):
+        faults.slow_rate = args.slow_rate
+        faults.slow_latency = args.slow_latency
+
+    previous_cwd = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix="chromatune-bench-") as workdir:
+        os.chdir(workdir)
+        import services
+        import api
+
+        saved = {
+            (services, "genai"): services.genai,
+            (services, "make_gemini_client"): services.make_gemini_client,
+            (services, "pc"): services.pc,
+            (services, "SPOTIFY_API_URL"): services.SPOTIFY_API_URL,
+            (services, "SPOTIFY_ACCOUNTS_URL"): services.SPOTIFY_ACCOUNTS_URL,
+            (api, "RATE_LIMIT_REQUESTS"): api.RATE_LIMIT_REQUESTS,
+            (services, "_audio_feature_cache"): services._audio_feature_cache,
+        }
+        services._audio_feature_cache = None  # Reload from the scratch directory
+        services.genai = genai
+        services.make_gemini_client = genai.make_client
+        services._gemini_clients.clear()
+        services.pc = pinecone
+        services.SPOTIFY_API_URL = spotify.api_url
+        services.SPOTIFY_ACCOUNTS_URL = spotify.accounts_url
+        api.RATE_LIMIT_REQUESTS = 10 ** 9  # Load tests would trip the per-IP limiter
+        try:
+            yield services, api, spotify, genai, pinecone
+        finally:
+            for (module, name), value in saved.items():
+                setattr(module, name, value)
+            services._gemini_clients.clear()
+            os.chdir(previous_cwd)
+            spotify.stop()
+
+
+def seed_index(services, genai, count, seed=0):
+    """Fills the fake Pinecone index with `count` songs without going through sync."""
+    from benchmarks.fakes import hashed_embedding, make_tracks, vibe_for
+
+    index = services.get_index()
+    vectors = []
+    for item in make_tracks(count, seed=seed):
+        track = item["track"]
+        artist = track["artists"][0]["name"]
+        vibe = vibe_for(track["name"], artist)
+        vectors.append((track["id"], hashed_embedding(vibe, genai.dimension).tolist(), {
+            "Song_Name": track["name"],
+            "Artist": artist,
+            "Song_URL": track["external_urls"]["spotify"],
+            "text": vibe,
+        }))
+    for i in range(0, len(vectors), 100):
+        index.upsert(vectors=vectors[i:i + 100])
+    return vectors
+
+
+@contextmanager
+def serve_app(app):
+    """Runs the ASGI app under uvicorn on a free local port. Yields the base URL."""
+    import uvicorn
+
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+    try:
+        yield f"http://127.0.0.1:{port}"
+    finally:
+        server.should_exit = True
+        thread.join(timeout=5)
+
+
+def current_rss_bytes():
+    """Resident memory of this process (Linux /proc; 0 where unavailable)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return 0
+
+
+@contextmanager
+def track_peak_rss(interval=0.005):
+    """
+    Samples resident memory in a background thread while the block runs.
+    Yields a dict that ends up holding baseline_mb, peak_mb and increase_mb.
+    """
+    result = {}
+    baseline = current_rss_bytes()
+    peak = baseline
+    done = threading.Event()
+
+    def sample():
+        nonlocal peak
+        while not done.wait(interval):
+            peak = max(peak, current_rss_bytes())
+
+    thread = threading.Thread(target=sample, daemon=True)
+    thread.start()
+    try:
+        yield result
+    finally:
+        done.set()
+        thread.join()
+        peak = max(peak, current_rss_bytes())
+        result.update(baseline_mb=baseline / 1e6, peak_mb=peak / 1e6, increase_mb=(peak - baseline) / 1e6)
+
+
+def run_load(fn, total, concurrency):
+    """
+    Calls fn(i) `total` times from `concurrency` threads.
+    Returns (latencies in seconds, error count, wall time).
+    """
+    latencies = []
+    errors = 0
+    lock = threading.Lock()
+
+    def one(i):
+        nonlocal errors
+        start = time.perf_counter()
+        try:
+            ok = fn(i)
+        except Exception:
+            ok = False
+        elapsed = time.perf_counter() - start
+        with lock:
+            latencies.append(elapsed)
+            if ok is False:
+                errors += 1
+
+    wall_start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(one, range(total)))
+    return latencies, errors, time.perf_counter() - wall_start
+
+
+def summarize(latencies, wall_time, errors=0, units=None):
+    """Throughput and latency percentiles for a set of timed operations."""
+    values = np.asarray(latencies, dtype=np.float64)
+    count = units if units is not None else len(values)
+    if not len(values):
+        return {"count": 0, "errors": errors, "wall_s": wall_time}
+    return {
+        "count": count,
+        "errors": errors,
+        "wall_s": wall_time,
+        "throughput_per_s": count / wall_time if wall_time else float("inf"),
+        "mean_ms": values.mean() * 1000,
+        "p50_ms": np.percentile(values, 50) * 1000,
+        "p95_ms": np.percentile(values, 95) * 1000,
+        "p99_ms": np.percentile(values, 99) * 1000,
+    }
+
+
+def stage_summaries(trace):
+    """Per-stage latency percentiles from a telemetry trace of (stage, seconds) pairs."""
+    stages = {}
+    for stage, elapsed in trace:
+        stages.setdefault(stage, []).append(elapsed)
+    return {stage: summarize(values, sum(values)) for stage, values in stages.items()}
+
+
+def print_report(title, summary, stages=None):
+    print(f"\n== {title} ==")
+    for key, value in summary.items():
+        print(f"  {key:>18}: {value:.2f}" if isinstance(value, float) else f"  {key:>18}: {value}")
+    if stages:
+        print(f"  {'stage':<16}{'calls':>7}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'total s':>10}")
+        for stage, s in sorted(stages.items()):
+            print(f"  {stage:<16}{s['count']:>7}{s['p50_ms']:>10.1f}{s['p95_ms']:>10.1f}{s['p99_ms']:>10.1f}"
+                  f"{s['wall_s']:>10.2f}")
@@ -0,0 +1,159 @@
+# catalog.py
+"""
+Local columnar catalog of song metadata, one per namespace.
+
+Each column (track ID, name, artist, URL, vibe text, audio features) is a
+NumPy array saved as its own .npy file and memory-mapped on load. Rows are
+sorted by track ID, so looking up a page of search results is one
+searchsorted call plus one gather per column, with no Pinecone fetches and
+no per-song metadata dicts. Updates are published as new versions that every
+worker process maps (see shared_store.py).
+"""
+import numpy as np
+
+import resilience
+import shared_store
+import telemetry
+
+CATALOG_DIR = "song_catalog"
+
+# Pinecone metadata keys stored as string columns, and as float columns
+TEXT_COLUMNS = ("Song_Name", "Artist", "Song_URL", "text")
+FEATURE_COLUMNS = ("energy", "tempo", "danceability", "valence", "acousticness")
+
+# Pinecone fetch accepts a limited number of IDs per call
+FETCH_BATCH_SIZE = 100
+
+
+class SongCatalog:
+    """Song metadata as parallel column arrays, with rows sorted by track ID."""
+
+    def __init__(self, ids, text, features):
+        self.ids = ids            # (n,) unicode array, sorted
+        self.text = text          # column name -> (n,) unicode array
+        self.features = features  # (n, len(FEATURE_COLUMNS)) float32
+
+    @classmethod
+    def empty(cls):
+        return cls(
+            np.zeros(0, dtype="U1"),
+            {name: np.zeros(0, dtype="U1") for name in TEXT_COLUMNS},
+            np.zeros((0, len(FEATURE_COLUMNS)), dtype=np.float32),
+        )
+
+    def __len__(self):
+        return len(self.ids)
+
+    def lookup(self, track_ids):
+        """Returns the row of each track ID (-1 if it isn't in the catalog)."""
+        track_ids = np.asarray(track_ids, dtype=str)
+        if len(self.ids) == 0 or len(track_ids) == 0:
+            return np.full(len(track_ids), -1, dtype=np.int64)
+        rows = np.searchsorted(self.ids, track_ids)
+        rows = np.minimum(rows, len(self.ids) - 1)
+        return np.where(self.ids[rows] == track_ids, rows, -1)
+
+    def columns(self, rows, names=TEXT_COLUMNS):
+        """Gathers the given columns for rows; rows of -1 come back as empty strings / zeros."""
+        rows = np.asarray(rows, dtype=np.int64)
+        found = rows >= 0
+        safe_rows = np.where(found, rows, 0)
+        gathered = {}
+        for name in names:
+            if name in self.text:
+                column = self.text[name][safe_rows] if len(self.ids) else np.zeros(len(rows), dtype="U1")
+                gathered[name] = np.where(found, column, "")
+            else:
+                column = self.features[safe_rows, FEATURE_COLUMNS.index(name)] if len(self.ids) else np.zeros(len(rows))
+                gathered[name] = np.where(found, column, 0.0)
+        return gathered
+
+    def merged(self, records):
+        """Returns a new catalog with {track_id: metadata} added (replacing existing rows)."""
+        keep = ~np.isin(self.ids, list(records)) if len(self.ids) else np.zeros(0, dtype=bool)
+        new_ids = list(records)
+        ids = np.concatenate([self.ids[keep].astype(str), np.asarray(new_ids, dtype=str)])
+        text = {
+            name: np.concatenate([
+                self.text[name][keep].astype(str),
+                np.asarray([str(records[tid].get(name) or "") for tid in new_ids], dtype=str),
+            ])
+            for name in TEXT_COLUMNS
+        }
+        features = np.concatenate([
+            np.asarray(self.features[keep], dtype=np.float32),
+            np.asarray(
+                [[float(records[tid].get(name) or 0) for name in FEATURE_COLUMNS] for tid in new_ids],
+                dtype=np.float32,
+            ).reshape(len(new_ids), len(FEATURE_COLUMNS)),
+        ])
+
+        order = np.argsort(ids)
+        return SongCatalog(ids[order], {name: column[order] for name, column in text.items()}, features[order])
+
+
+def _build(arrays):
+    return SongCatalog(arrays["ids"], {name: arrays[name] for name in TEXT_COLUMNS}, arrays["features"])
+
+
+# Published catalogs are memory-mapped and shared by every worker process
+_store = shared_store.SharedArrays(CATALOG_DIR, ("ids",) + TEXT_COLUMNS + ("features",), _build, SongCatalog.empty)
+
+
+def get_catalog(namespace):
+    """Returns a namespace's catalog (memory-mapped), picking up versions other workers published."""
+    return _store.get(namespace)
+
+
+def update_catalog(namespace, records):
+    """Adds {track_id: metadata} to a namespace's catalog and publishes it as a new version."""
+    if not records:
+        return get_catalog(namespace)
+    with _store.write_lock(namespace):
+        # Merge into the latest published version, not a possibly stale cached one
+        current = _store.load_latest(namespace)
+        updated = current.merged(records)
+        published = _store.publish(namespace, {
+            "ids": updated.ids, **updated.text, "features": updated.features,
+        })
+    print(f"[Catalog] {len(records)} songs added to '{namespace}' ({len(updated)} total)")
+    return published
+
+
+def fetch_batches(index, namespace, track_ids):
+    """
+    Fetches track_ids from a Pinecone namespace FETCH_BATCH_SIZE at a time,
+    yielding each batch's {track ID: vector}. IDs it doesn't have are left out.
+    """
+    for i in range(0, len(track_ids), FETCH_BATCH_SIZE):
+        with telemetry.external_call("pinecone", "vector_fetch"):
+            response = resilience.call(
+                "pinecone", index.fetch, hedge=True, sdk_timeout=True,
+                ids=track_ids[i:i + FETCH_BATCH_SIZE], namespace=namespace,
+            )
+        yield response.vectors
+
+
+def hydrate(index, namespace, track_ids, names=("Song_Name", "Artist", "Song_URL")):
+    """
+    Returns {column: array} for track_ids, in order. Songs the catalog doesn't
+    know yet (e.g. indexed before it existed) are fetched from Pinecone once
+    and added, so later lookups stay local.
+    """
+    catalog = get_catalog(namespace)
+    rows = catalog.lookup(track_ids)
+    missing = [tid for tid, row in zip(track_ids, rows) if row < 0]
+    if missing:
+        fetched = {}
+        for vectors in fetch_batches(index, namespace, missing):
+            for vid, vec in vectors.items():
+                fetched[vid] = vec.metadata or {}
+        if fetched:
+            catalog = update_catalog(namespace, fetched)
+            rows = catalog.lookup(track_ids)
+    return catalog.columns(rows, names)
+
+
+def clear(namespace=None):
+    """Deletes a namespace's catalog (or all of them) after its vectors are removed."""
+    _store.clear(namespace)
@@ -0,0 +1,113 @@
+# checkpoint.py
+"""
+Durable per-track progress for playlist syncs.
+
+Each song moves through three stages: described (vibe text generated),
+embedded (vector computed) and upserted (stored in Pinecone). The stage,
+description and vector are written to disk as soon as each batch finishes a
+stage, so a sync that fails part-way resumes where it stopped and never
+re-prompts or re-embeds a song it already paid for.
+"""
+import json
+import os
+import shutil
+
+import numpy as np
+
+CHECKPOINT_DIR = "sync_checkpoints"
+
+DESCRIBED = "described"
+EMBEDDED = "embedded"
+UPSERTED = "upserted"
+
+
+class SyncCheckpoint:
+    """Progress of one namespace's sync, stored under CHECKPOINT_DIR/<namespace>."""
+
+    def __init__(self, namespace):
+        self.dir = os.path.join(CHECKPOINT_DIR, namespace or "_default")
+        self.vectors_dir = os.path.join(self.dir, "vectors")
+        self.path = os.path.join(self.dir, "state.json")
+        self.tracks = {}  # track_id -> {"stage", "description", "metadata"}
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, 'r') as f:
+                    self.tracks = json.load(f)
+            except (json.JSONDecodeError, OSError) as e:
+                print(f"[Checkpoint] Ignoring unreadable checkpoint {self.path}: {e}")
+
+    def stage(self, track_id):
+        """Returns the last completed stage for a track, or None."""
+        entry = self.tracks.get(track_id)
+        return entry["stage"] if entry else None
+
+    def description(self, track_id):
+        return self.tracks[track_id]["description"]
+
+    def metadata(self, track_id):
+        return self.tracks[track_id]["metadata"]
+
+    def record_descriptions(self, described):
+        """Records {track_id: (description, metadata)} as described."""
+        for track_id, (description, metadata) in described.items():
+            self.tracks[track_id] = {"stage": DESCRIBED, "description": description, "metadata": metadata}
+        self._save()
+
+    def record_embeddings(self, track_ids, vectors):
+        """Saves each track's vector, then marks the tracks as embedded."""
+        os.makedirs(self.vectors_dir, exist_ok=True)
+        for track_id, vector in zip(track_ids, vectors):
+            np.save(self._vector_path(track_id), np.asarray(vector, dtype=np.float32))
+        for track_id in track_ids:
+            self.tracks[track_id]["stage"] = EMBEDDED
+        self._save()
+
+    def load_vector(self, track_id):
+        return np.load(self._vector_path(track_id)).tolist()
+
+    def record_upserted(self, track_ids):
+        """Marks tracks as stored in Pinecone; their saved vectors are no longer needed."""
+        for track_id in track_ids:
+            self.tracks[track_id]["stage"] = UPSERTED
+        self._save()
+        for track_id in track_ids:
+            self._remove_vector(track_id)
+
+    def requeue(self, track_ids):
+        """Sends upserted tracks Pinecone doesn't have back to the embed stage; their descriptions are kept."""
+        for track_id in track_ids:
+            self.tracks[track_id]["stage"] = DESCRIBED
+        if track_ids:
+            self._save()
+
+    def forget(self, track_ids):
+        """Drops tracks that Pinecone now lists as indexed, so the checkpoint stays small."""
+        confirmed = [tid for tid in track_ids if tid in self.tracks]
+        if not confirmed:
+            return
+        for track_id in confirmed:
+            del self.tracks[track_id]
+            self._remove_vector(track_id)
+        self._save()
+
+    def _vector_path(self, track_id):
+        return os.path.join(self.vectors_dir, f"{track_id}.npy")
+
+    def _remove_vector(self, track_id):
+        try:
+            os.remove(self._vector_path(track_id))
+        except FileNotFoundError:
+            pass
+
+    def _save(self):
+        """Writes the state atomically so a crash never leaves a half-written checkpoint."""
+        os.makedirs(self.dir, exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(self.tracks, f)
+        os.replace(tmp_path, self.path)
+
+
+def clear():
+    """Deletes every namespace's checkpoint, after the vectors they describe were removed from Pinecone."""
+    shutil.rmtree(CHECKPOINT_DIR, ignore_errors=True)
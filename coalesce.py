@@ -0,0 +1,77 @@
+# coalesce.py
+"""
+Single-flight request coalescing.
+
+When several threads ask for the same work at the same time (e.g. a burst of
+identical searches after a playlist link is shared), only the first one runs
+it; the others wait and receive the same result (or exception).
+"""
+import threading
+
+import resilience
+import telemetry
+
+EXECUTED = telemetry.Counter(
+    "chromatune_singleflight_executed_total", "Calls that actually ran, by coalescing group."
+)
+DEDUPLICATED = telemetry.Counter(
+    "chromatune_singleflight_deduplicated_total", "Calls that joined an identical in-flight call, by coalescing group."
+)
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Runs at most one call per key at a time; concurrent callers share its outcome."""
+
+    def __init__(self, name):
+        self.name = name
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, fn, *args, **kwargs):
+        """Runs fn(*args, **kwargs) unless a call with the same key is already in flight."""
+        with self._lock:
+            call = self._calls.get(key)
+            is_leader = call is None
+            if is_leader:
+                call = self._calls[key] = _Call()
+
+        if not is_leader:
+            DEDUPLICATED.inc(group=self.name)
+            # Wait no longer than this caller's own request deadline
+            time_left = resilience.remaining()
+            if not call.done.wait(None if time_left is None else max(time_left, 0)):
+                raise resilience.DeadlineExceeded(f"{self.name} did not finish before the request deadline")
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        EXECUTED.inc(group=self.name)
+        try:
+            call.result = fn(*args, **kwargs)
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def in_flight(self, key):
+        """Whether a call with this key is currently running."""
+        with self._lock:
+            return key in self._calls
+
+    def stats(self):
+        """Returns how many calls ran and how many were served from another caller's run."""
+        return {
+            "executed": EXECUTED.value(group=self.name),
+            "deduplicated": DEDUPLICATED.value(group=self.name),
+        }
@@ -0,0 +1,161 @@
+# local_index.py
+"""
+Local copy of a namespace's song vectors for matrix-based search.
+
+Pinecone answers one query per call. For bulk work (many queries at once)
+it is far cheaper to pull the namespace's vectors once and score every
+query against every song with a single matrix product.
+
+The normalized matrix is published as a versioned .npy file that every
+worker process maps read-only (see shared_store.py), so adding workers does
+not add copies of the vectors. Syncs extend it with just the new songs.
+"""
+import time
+
+import numpy as np
+
+import catalog
+import resilience
+import shared_store
+import telemetry
+from rerank import normalize_rows, top_k
+
+VECTORS_DIR = "song_vectors"
+
+# Re-pull vectors at least this often, in case songs were indexed outside a sync
+LOCAL_INDEX_TTL_SECONDS = 300
+
+
+class LocalIndex:
+    """Normalized vector matrix plus the ID of each row."""
+
+    def __init__(self, ids, matrix, pulled_at=None):
+        self.ids = ids                        # (n,) unicode array
+        self.matrix = matrix                  # (n, d) float32, unit-length rows
+        self.pulled_at = pulled_at or time.time()  # when the vectors were last fully pulled from Pinecone
+        self.row_of = {vid: row for row, vid in enumerate(np.asarray(ids).tolist())}
+
+    @classmethod
+    def from_vectors(cls, ids, vectors, pulled_at=None):
+        ids = np.asarray(ids, dtype=str)
+        matrix = normalize_rows(vectors) if len(ids) else np.zeros((0, 0), dtype=np.float32)
+        return cls(ids, matrix, pulled_at)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def search(self, query_vectors, k):
+        """
+        Scores every query against every song in one matrix product.
+        Returns (rows, scores), each shaped (num_queries, k), best match first.
+        """
+        queries = normalize_rows(np.atleast_2d(query_vectors))
+        k = min(k, len(self.ids))
+        if k == 0:
+            empty = np.zeros((len(queries), 0))
+            return empty.astype(int), empty
+
+        return top_k(queries @ self.matrix.T, k)
+
+
+def _build(arrays):
+    return LocalIndex(arrays["ids"], arrays["matrix"], float(arrays["pulled_at"][0]))
+
+
+_store = shared_store.SharedArrays(VECTORS_DIR, ("ids", "matrix", "pulled_at"), _build)
+
+
+def _publish(namespace, songs_index):
+    return _store.publish(namespace, {
+        "ids": songs_index.ids,
+        "matrix": songs_index.matrix,
+        "pulled_at": np.asarray([songs_index.pulled_at]),
+    })
+
+
+def list_ids(index, namespace):
+    """Every vector ID in a Pinecone namespace."""
+    def list_all(**request_kwargs):
+        return [vid for page in index.list(namespace=namespace, **request_kwargs) if page for vid in page]
+
+    with telemetry.external_call("pinecone", "vector_list"):
+        return resilience.call("pinecone", list_all, sdk_timeout=True)
+
+
+def fetch_vectors(index, namespace, track_ids):
+    """
+    Fetches the vectors of track_ids from Pinecone. Returns (ids, vectors).
+    Songs the namespace's catalog doesn't know yet (e.g. indexed before it
+    existed) are added to it from the metadata that comes with the vectors.
+    """
+    ids, vectors, metadata = [], [], {}
+    for fetched in catalog.fetch_batches(index, namespace, track_ids):
+        for vid, vec in fetched.items():
+            ids.append(vid)
+            vectors.append(vec.values)
+            if vec.metadata:
+                metadata[vid] = vec.metadata
+    if metadata:
+        rows = catalog.get_catalog(namespace).lookup(list(metadata))
+        catalog.update_catalog(namespace, {vid: meta for (vid, meta), row in zip(metadata.items(), rows) if row < 0})
+    return ids, np.asarray(vectors, dtype=np.float32)
+
+
+def load_namespace(index, namespace):
+    """Pulls every vector in a Pinecone namespace into a LocalIndex."""
+    ids, vectors = fetch_vectors(index, namespace, list_ids(index, namespace))
+    print(f"[LocalIndex] Loaded {len(ids)} vectors from namespace '{namespace}'")
+    return LocalIndex.from_vectors(ids, vectors)
+
+
+def is_fresh(songs_index):
+    return songs_index is not None and time.time() - songs_index.pulled_at < LOCAL_INDEX_TTL_SECONDS
+
+
+def get_local_index(index, namespace):
+    """Returns the namespace's published vectors, pulling them from Pinecone when missing or stale."""
+    songs_index = _store.get(namespace)
+    if is_fresh(songs_index):
+        return songs_index
+
+    # Only one thread in one worker pulls; the rest wait, then map what it published
+    with _store.write_lock(namespace):
+        songs_index = _store.load_latest(namespace)
+        if is_fresh(songs_index):
+            return songs_index
+        return _publish(namespace, load_namespace(index, namespace))
+
+
+def refresh(index, namespace):
+    """
+    Brings a namespace's published vectors up to date after a sync: only the
+    songs it doesn't have yet are fetched and appended. If songs were removed
+    (or nothing was published yet) everything is pulled again.
+    """
+    listed = list_ids(index, namespace)
+    with _store.write_lock(namespace):
+        songs_index = _store.load_latest(namespace)
+        known = set(songs_index.ids.tolist()) if songs_index is not None else set()
+        if songs_index is not None and known == set(listed):
+            return songs_index
+
+        if not known or known - set(listed):
+            ids, vectors = fetch_vectors(index, namespace, listed)
+            updated = LocalIndex.from_vectors(ids, vectors)
+        else:
+            ids, vectors = fetch_vectors(index, namespace, [vid for vid in listed if vid not in known])
+            if not ids:
+                return songs_index
+            added = LocalIndex.from_vectors(ids, vectors)
+            updated = LocalIndex(
+                np.concatenate([np.asarray(songs_index.ids, dtype=str), added.ids]),
+                np.concatenate([np.asarray(songs_index.matrix, dtype=np.float32), added.matrix]),
+                songs_index.pulled_at,
+            )
+        print(f"[LocalIndex] Published {len(updated)} vectors for namespace '{namespace}' ({len(ids)} fetched)")
+        return _publish(namespace, updated)
+
+
+def clear(namespace=None):
+    """Deletes the published vectors for a namespace (or all of them) after its vectors are removed."""
+    _store.clear(namespace)
@@ -0,0 +1,162 @@
+# neighbors.py
+"""
+Precomputed "more like this" table: each song's nearest neighbors by cosine
+similarity, one table per namespace.
+
+The table is built after a sync with blocked matrix products over the
+namespace's published vectors (local_index.py), and extended incrementally
+when new songs arrive (new songs are scored against everything, existing
+songs only against the new ones). It is published as versioned .npy files
+that every worker maps read-only, so /similar needs no LLM, embedding or
+Pinecone calls.
+"""
+import numpy as np
+
+import shared_store
+import telemetry
+from rerank import top_k
+
+NEIGHBORS_DIR = "song_neighbors"
+
+# Neighbors kept per song (the most /similar can return)
+NEIGHBORS_PER_SONG = 25
+
+# Rows scored per matrix product, to bound memory on large namespaces
+BLOCK_SIZE = 1024
+
+
+
+class NeighborTable:
+    """Song IDs and each song's top neighbors (as rows, best first)."""
+
+    def __init__(self, ids, rows, scores):
+        self.ids = ids          # (n,) unicode array
+        self.rows = rows        # (n, NEIGHBORS_PER_SONG) int32, -1 where a song has fewer neighbors
+        self.scores = scores    # (n, NEIGHBORS_PER_SONG) float32
+        self.row_of = {vid: row for row, vid in enumerate(self.ids.tolist())}
+
+    def __len__(self):
+        return len(self.ids)
+
+    def similar(self, track_id, k):
+        """Returns ([track IDs], [scores]) of the k songs most like track_id, or None if it isn't in the table."""
+        row = self.row_of.get(track_id)
+        if row is None:
+            return None
+        rows = self.rows[row, :k]
+        found = rows >= 0
+        return self.ids[rows[found]].tolist(), self.scores[row, :k][found].tolist()
+
+
+def top_neighbors(scores, k=NEIGHBORS_PER_SONG):
+    """Best k columns of each row of scores, best first, padded with -1 / -inf."""
+    n, columns = scores.shape
+    rows = np.full((n, k), -1, dtype=np.int32)
+    best = np.full((n, k), -np.inf, dtype=np.float32)
+    take = min(k, columns)
+    if take == 0:
+        return rows, best
+    rows[:, :take], best[:, :take] = top_k(scores, take)
+    # Columns scored -inf (a song against itself) are not neighbors
+    rows[~np.isfinite(best)] = -1
+    return rows, best
+
+
+def build_table(ids, matrix):
+    """Builds the table from scratch: every song scored against every other song (rows of matrix are unit length)."""
+    ids = np.asarray(ids, dtype=str)
+    rows = np.empty((len(ids), NEIGHBORS_PER_SONG), dtype=np.int32)
+    scores = np.empty((len(ids), NEIGHBORS_PER_SONG), dtype=np.float32)
+    for start in range(0, len(ids), BLOCK_SIZE):
+        end = min(start + BLOCK_SIZE, len(ids))
+        block = matrix[start:end] @ matrix.T
+        block[np.arange(end - start), np.arange(start, end)] = -np.inf  # a song isn't its own neighbor
+        rows[start:end], scores[start:end] = top_neighbors(block)
+    return NeighborTable(ids, rows, scores)
+
+
+def extend_table(table, new_ids, matrix):
+    """
+    Adds songs to a table. matrix holds the vectors of the table's songs
+    followed by the new ones. New songs are scored against every song;
+    existing songs only against the new ones, merged into the neighbors they
+    already had.
+    """
+    n = len(table)
+    ids = np.concatenate([np.asarray(table.ids, dtype=str), np.asarray(new_ids, dtype=str)])
+    new_vectors = matrix[n:]
+
+    rows = np.empty((len(ids), NEIGHBORS_PER_SONG), dtype=np.int32)
+    scores = np.empty((len(ids), NEIGHBORS_PER_SONG), dtype=np.float32)
+    for start in range(0, n, BLOCK_SIZE):
+        end = min(start + BLOCK_SIZE, n)
+        # Candidates: the existing neighbors plus every new song
+        cross = matrix[start:end] @ new_vectors.T
+        candidate_rows = np.concatenate(
+            [table.rows[start:end], np.broadcast_to(np.arange(n, len(ids), dtype=np.int32), cross.shape)], axis=1
+        )
+        candidate_scores = np.concatenate([table.scores[start:end], cross], axis=1)
+        picked, scores[start:end] = top_neighbors(candidate_scores)
+        rows[start:end] = np.where(picked >= 0, np.take_along_axis(candidate_rows, np.maximum(picked, 0), axis=1), -1)
+
+    for start in range(0, len(new_vectors), BLOCK_SIZE):
+        end = min(start + BLOCK_SIZE, len(new_vectors))
+        block = new_vectors[start:end] @ matrix.T
+        block[np.arange(end - start), n + np.arange(start, end)] = -np.inf
+        rows[n + start:n + end], scores[n + start:n + end] = top_neighbors(block)
+
+    return NeighborTable(ids, rows, scores)
+
+
+def _build(arrays):
+    return NeighborTable(arrays["ids"], arrays["rows"], arrays["scores"])
+
+
+_store = shared_store.SharedArrays(NEIGHBORS_DIR, ("ids", "rows", "scores"), _build)
+
+
+def get_table(namespace):
+    """Returns a namespace's table (memory-mapped), or None if none was built yet."""
+    return _store.get(namespace)
+
+
+def similar(namespace, track_id, k):
+    """([track IDs], [scores]) of the songs most like track_id, or None if the song has no entry."""
+    table = get_table(namespace)
+    if table is None:
+        return None
+    with telemetry.span("neighbor_lookup"):
+        return table.similar(track_id, k)
+
+
+def refresh(namespace, songs_index):
+    """
+    Brings a namespace's table up to date with its published vectors (a
+    LocalIndex) after a sync. New songs are added incrementally; if songs were
+    removed (or there is no table) it is rebuilt.
+    """
+    listed = set(songs_index.ids.tolist())
+    with _store.write_lock(namespace):
+        table = _store.load_latest(namespace)
+        known = set(table.ids.tolist()) if table is not None else set()
+        if table is not None and known == listed:
+            return table
+        if not listed:
+            _store.clear(namespace)
+            return None
+
+        with telemetry.span("neighbor_build"):
+            if not known or known - listed:
+                updated = build_table(songs_index.ids, np.asarray(songs_index.matrix))
+                print(f"[Neighbors] Built table for '{namespace}' ({len(updated)} songs)")
+            else:
+                new_ids = [vid for vid in songs_index.ids.tolist() if vid not in known]
+                order = [songs_index.row_of[vid] for vid in table.ids.tolist() + new_ids]
+                updated = extend_table(table, new_ids, np.asarray(songs_index.matrix)[order])
+                print(f"[Neighbors] Added {len(new_ids)} songs to '{namespace}' ({len(updated)} total)")
+        return _store.publish(namespace, {"ids": updated.ids, "rows": updated.rows, "scores": updated.scores})
+
+
+def clear(namespace=None):
+    """Deletes a namespace's table (or all of them) after its vectors are removed."""
+    _store.clear(namespace)
@@ -3,14 +3,35 @@
 import streamlit as st
 import requests
 import time
-from langchain_core.documents import Document
+import os
+import json
+import shutil
+import threading
+import faiss
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from langchain_community.vectorstores import FAISS
-from utils.connect import initialize_connections
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+from utils.connect import initialize_connections, get_vector_store_registry, get_gemini_rate_limiter
 
 # Initialize connections from our updated connect.py
 initialize_connections()
 
-@st.cache_data
+# Number of songs described concurrently; all of them share one Gemini rate limiter
+DESCRIPTION_WORKERS = 4
+
+# Attempts per Gemini call, waiting RETRY_BACKOFF_SECONDS, then twice as long, and so on
+MAX_ATTEMPTS = 4
+RETRY_BACKOFF_SECONDS = 2
+
+# Number of descriptions embedded and added to the index at a time
+EMBED_BATCH_SIZE = 8
+
+# Saved FAISS stores, one folder per playlist ID
+FAISS_STORE_DIR = "faiss_stores"
+STORE_META_FILE = "snapshot.json"
+
+@st.cache_data(ttl=3000)
 def get_spotify_auth_token():
     """Gets an auth token from the Spotify API."""
     auth_url = 'https://accounts.spotify.com/api/token'
@@ -27,107 +48,354 @@ def get_spotify_auth_token():
         st.error(f"Failed to get Spotify token: {e}")
         return None
 
+@st.cache_data(ttl=60)
+def get_playlist_snapshot_id(playlist_id):
+    """Gets the playlist's current snapshot_id, which changes whenever its tracks change."""
+    access_token = get_spotify_auth_token()
+    if not access_token:
+        return None
+    headers = {'Authorization': f'Bearer {access_token}'}
+    playlist_url = f'https://api.spotify.com/v1/playlists/{playlist_id}'
+    try:
+        response = requests.get(playlist_url, headers=headers, params={'fields': 'snapshot_id'})
+        response.raise_for_status()
+        return response.json().get('snapshot_id')
+    except requests.exceptions.RequestException as e:
+        print(f"Failed to get playlist snapshot: {e}")
+        return None
+
 @st.cache_data
-def get_tracks_from_spotify(playlist_id):
-    """Gets a list of tracks from a specific Spotify playlist."""
+def get_tracks_from_spotify(playlist_id, snapshot_id=None):
+    """
+    Gets every track from a specific Spotify playlist, following the `next`
+    link across pages. The snapshot_id is only part of the cache key, so a
+    changed playlist is fetched again.
+    """
     access_token = get_spotify_auth_token()
     if not access_token:
         return None
     headers = {'Authorization': f'Bearer {access_token}'}
     playlist_url = f'https://api.spotify.com/v1/playlists/{playlist_id}/tracks'
+    playlist_tracks = []
     try:
-        response = requests.get(playlist_url, headers=headers)
-        response.raise_for_status()
-        playlist_tracks = response.json().get('items', [])
+        while playlist_url:
+            response = requests.get(playlist_url, headers=headers)
+            response.raise_for_status()
+            data = response.json()
+            playlist_tracks.extend(data.get('items', []))
+            playlist_url = data.get('next')
         return playlist_tracks
     except requests.exceptions.RequestException as e:
-        st.error(f"Failed to get tracks from Spotify. Is the Playlist ID correct? Error: {e}")
+        # Runs in the build thread; the build reports the failure to the page
+        print(f"Failed to get tracks from Spotify. Is the Playlist ID correct? Error: {e}")
         return None
 
+def get_store_path(playlist_id):
+    """Returns the folder where a playlist's FAISS store is saved."""
+    return os.path.join(FAISS_STORE_DIR, playlist_id)
+
+def load_saved_store(playlist_id, snapshot_id, embedding_model):
+    """
+    Loads a previously saved FAISS store for the playlist, or returns None if
+    there isn't one or it was built from a different snapshot of the playlist.
+    The index file is memory-mapped (IndexFlat needs IO_FLAG_MMAP_IFC for that)
+    instead of kept in memory.
+    """
+    store_path = get_store_path(playlist_id)
+    meta_path = os.path.join(store_path, STORE_META_FILE)
+    if not snapshot_id or not os.path.exists(meta_path):
+        return None
+
+    try:
+        with open(meta_path, 'r') as f:
+            meta = json.load(f)
+        if meta.get("snapshot_id") != snapshot_id:
+            print(f"Saved store for {playlist_id} is stale, rebuilding")
+            return None
+
+        # Only this app writes under FAISS_STORE_DIR, so its pickled docstore is trusted
+        store = FAISS.load_local(store_path, embedding_model, allow_dangerous_deserialization=True)
+        # load_local reads the whole index into memory; serve a memory-mapped copy instead
+        store.index = faiss.read_index(
+            os.path.join(store_path, "index.faiss"),
+            faiss.IO_FLAG_MMAP_IFC
+        )
+        return store
+    except Exception as e:
+        print(f"Failed to load saved store for {playlist_id}: {e}")
+        return None
+
+def save_store(vector_store, playlist_id, snapshot_id):
+    """
+    Saves the FAISS store for the playlist along with the snapshot it was built
+    from. Writes to a temporary folder first so readers never see a partial store.
+    """
+    if not snapshot_id:
+        return
+
+    store_path = get_store_path(playlist_id)
+    tmp_path = f"{store_path}.tmp"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    vector_store.save_local(tmp_path)
+    with open(os.path.join(tmp_path, STORE_META_FILE), 'w') as f:
+        json.dump({"snapshot_id": snapshot_id, "song_count": vector_store.index.ntotal}, f)
+
+    shutil.rmtree(store_path, ignore_errors=True)
+    os.replace(tmp_path, store_path)
+
 @st.cache_data
-def get_song_description(song_name, artist_name):
-    """Generates a setting/vibe description for a song using Google Gemini."""
+def get_song_description(song_name, artist_name, _text_model):
+    """
+    Generates a setting/vibe description for a song using Google Gemini.
+    Waits for the shared rate limiter first, so concurrent workers (and
+    sessions) together stay within the Gemini quota.
+    """
     prompt = f"""
         You are an AI agent that helps users determine what songs to play to match
         their setting. Based on the included song name and artist, '{song_name}' by '{artist_name}', write up a
         description of what kind of setting would be appropriate to listen to. Do not make assumptions based purely
         on the song name, you should try to use real information about the song to come up with your setting description.
     """
-    # Use the Gemini text model from the session state
-    gemini_text_model = st.session_state.gemini_text_model
-    response = gemini_text_model.generate_content(prompt)
-    
-    # Add a small delay to avoid hitting the free tier rate limit (e.g., 60 queries per minute)
-    time.sleep(1)
-    
+    get_gemini_rate_limiter().acquire()
+    response = _text_model.generate_content(prompt)
     return response.text.strip()
 
-def load_tracks_to_faiss(new_playlist_id):
-    """
-    Main function to fetch songs, generate descriptions, and build an
-    in-memory FAISS vector store.
-    """
-    playlist_tracks = get_tracks_from_spotify(new_playlist_id)
-    if not playlist_tracks:
-        st.warning("Could not retrieve tracks. Please check the Playlist ID and your Spotify credentials.")
-        return
-
-    st.toast("New playlist detected. Building a new in-memory vector store.")
-    
-    progress_bar = st.progress(0, "Starting song processing...")
-    num_tracks = len(playlist_tracks)
-    langchain_documents = []
+def with_retries(fn, *args):
+    """Calls fn(*args), retrying failures (such as 429s) with exponential backoff. Raises the last error."""
+    for attempt in range(MAX_ATTEMPTS):
+        try:
+            return fn(*args)
+        except Exception as e:
+            if attempt == MAX_ATTEMPTS - 1:
+                raise
+            delay = RETRY_BACKOFF_SECONDS * 2 ** attempt
+            print(f"{fn.__name__} failed ({e}), retrying in {delay}s")
+            time.sleep(delay)
 
-    for i, item in enumerate(playlist_tracks):
-        percentage_complete = (i + 1) / num_tracks
+def parse_playlist_items(playlist_tracks):
+    """Turns raw Spotify playlist items into (song_name, artist_name, song_url) tuples."""
+    songs = []
+    for item in playlist_tracks:
         if not item or 'track' not in item or not item['track']:
-            progress_bar.progress(percentage_complete, text=f"Skipping invalid item {i+1}/{num_tracks}.")
             continue
-        
+
         track = item['track']
         song_name = track.get("name", "Unknown Song")
         artist_name = track.get('artists', [{}])[0].get('name', 'Unknown Artist')
         song_url = track.get('external_urls', {}).get('spotify')
 
         if not song_url:
-            progress_bar.progress(percentage_complete, text=f"Skipping {song_name} (no URL).")
             continue
-            
-        progress_text = f"({i+1}/{num_tracks}) Generating description for: {song_name}"
-        progress_bar.progress(percentage_complete, text=progress_text)
-        
-        description = get_song_description(song_name, artist_name)
-        
-        # Create a LangChain Document for each song
-        metadata = {
-            "Song_Name": song_name,
-            "Artist": artist_name,
-            "Song_URL": song_url
+        songs.append((song_name, artist_name, song_url))
+    return songs
+
+def snapshot_store(vector_store):
+    """
+    Copies a FAISS store (index, docstore and ID mapping) so it can be
+    searched while the original keeps growing. add_embeddings is not safe to
+    run alongside a search: the index grows before the ID mapping does, and
+    the flat index reallocates the buffer a search may be reading.
+    """
+    return FAISS(
+        vector_store.embedding_function,
+        faiss.clone_index(vector_store.index),
+        InMemoryDocstore(dict(vector_store.docstore._dict)),
+        dict(vector_store.index_to_docstore_id),
+    )
+
+def add_batch_to_store(vector_store, texts, metadatas, embedding_model):
+    """
+    Embeds a batch of descriptions and appends them to the FAISS store,
+    creating the store on the first batch.
+    """
+    vectors = embedding_model.embed_documents(texts)
+    text_embeddings = list(zip(texts, vectors))
+    if vector_store is None:
+        return FAISS.from_embeddings(text_embeddings, embedding_model, metadatas=metadatas)
+    vector_store.add_embeddings(text_embeddings, metadatas=metadatas)
+    return vector_store
+
+class BuildJob:
+    """
+    A playlist store being built in a background thread. The thread updates
+    it as batches land; page reruns read it to show progress and to publish
+    the partial store to the session.
+    """
+
+    def __init__(self, playlist_id, snapshot_id):
+        self.playlist_id = playlist_id
+        self.snapshot_id = snapshot_id
+        self.store = None          # latest store, partial until done
+        self.total = 0
+        self.described = 0
+        self.searchable = 0
+        self.failed = 0            # songs dropped after every retry failed
+        self.status = "Starting song processing..."
+        self.message = None        # (kind, text) shown once the build ends
+        self.done = False
+        self.abandoned = False     # the session moved on before the build ended
+
+    def progress(self):
+        return self.described / self.total if self.total else 0.0
+
+def build_playlist_store(job, text_model, embedding_model):
+    """
+    Fetches songs, generates descriptions, and streams them into an
+    in-memory FAISS vector store. Returns the store, or None on failure.
+
+    Descriptions are generated by a small pool of worker threads. As they
+    complete, they are embedded in batches and added to a growing FAISS index.
+    A copy is published on the job after every batch, so the playlist becomes
+    searchable as soon as the first batch lands without searches racing the
+    next add. Failed Gemini calls are
+    retried with backoff; songs that still fail are counted on the job.
+
+    The finished store is saved to disk, so later sessions (and server restarts)
+    reuse it until the playlist's snapshot_id changes.
+    """
+    saved_store = load_saved_store(job.playlist_id, job.snapshot_id, embedding_model)
+    if saved_store:
+        job.message = ("success", f"Loaded {saved_store.index.ntotal} songs from the saved vector store.")
+        return saved_store
+
+    playlist_tracks = get_tracks_from_spotify(job.playlist_id, job.snapshot_id)
+    if not playlist_tracks:
+        job.message = ("warning", "Could not retrieve tracks. Please check the Playlist ID and your Spotify credentials.")
+        return None
+
+    songs = parse_playlist_items(playlist_tracks)
+    if not songs:
+        job.message = ("error", "No valid songs could be processed from this playlist.")
+        return None
+
+    job.total = len(songs)
+    vector_store = None
+    pending_texts = []
+    pending_metadatas = []
+
+    def flush():
+        nonlocal vector_store, pending_texts, pending_metadatas
+        try:
+            vector_store = with_retries(add_batch_to_store, vector_store, pending_texts, pending_metadatas, embedding_model)
+            job.searchable += len(pending_texts)
+            # Publish a copy of the partial store so it can be queried right away
+            job.store = snapshot_store(vector_store)
+        except Exception as e:
+            print(f"Embedding error, dropping {len(pending_texts)} songs: {e}")
+            job.failed += len(pending_texts)
+        pending_texts, pending_metadatas = [], []
+
+    # Worker threads need the script context to use st.cache_data
+    ctx = get_script_run_ctx()
+    with ThreadPoolExecutor(
+        max_workers=DESCRIPTION_WORKERS,
+        initializer=add_script_run_ctx,
+        initargs=(None, ctx),
+    ) as executor:
+        futures = {
+            executor.submit(with_retries, get_song_description, song_name, artist_name, text_model): (song_name, artist_name, song_url)
+            for song_name, artist_name, song_url in songs
         }
-        doc = Document(page_content=description, metadata=metadata)
-        langchain_documents.append(doc)
 
-    if not langchain_documents:
-        st.error("No valid songs could be processed from this playlist.")
-        progress_bar.empty()
-        return
+        for described_count, future in enumerate(as_completed(futures), start=1):
+            song_name, artist_name, song_url = futures[future]
+            job.described = described_count
+            try:
+                description = future.result()
+            except Exception as e:
+                print(f"Description error for {song_name} after {MAX_ATTEMPTS} attempts: {e}")
+                job.failed += 1
+            else:
+                pending_texts.append(description)
+                pending_metadatas.append({
+                    "Song_Name": song_name,
+                    "Artist": artist_name,
+                    "Song_URL": song_url
+                })
 
-    progress_bar.progress(1.0, "Building FAISS vector store from all song descriptions...")
-    embedding_model = st.session_state.embedding_model
-    vector_store = FAISS.from_documents(langchain_documents, embedding_model)
-    
-    st.session_state.vector_store = vector_store
-    st.session_state.current_pid = new_playlist_id
+            # Flush a batch into the index once enough descriptions are ready
+            if len(pending_texts) >= EMBED_BATCH_SIZE:
+                flush()
 
-    progress_bar.empty()
-    st.success(f"Successfully loaded {len(langchain_documents)} songs into the in-memory FAISS store!")
-    time.sleep(2)
-    st.rerun()
+            job.status = f"({described_count}/{job.total}) Described: {song_name} | {job.searchable} songs searchable"
 
-def clear_playlist():
-    """Clears the in-memory vector store and playlist ID."""
+    if pending_texts:
+        flush()
+
+    if not vector_store:
+        job.message = ("error", "No valid songs could be processed from this playlist.")
+        return None
+
+    if job.failed:
+        # Not saved: a saved store counts as complete for its snapshot, so the next load retries instead
+        job.message = ("warning", f"Loaded {vector_store.index.ntotal} songs; {job.failed} could not be described or embedded and will be retried on the next load.")
+    else:
+        save_store(vector_store, job.playlist_id, job.snapshot_id)
+    return vector_store
+
+def run_build_job(job, registry, session_id, text_model, embedding_model):
+    """
+    Background thread body: gets the playlist's store from the process-wide
+    registry, building it only if no other session already has it (or is
+    building it right now).
+    """
+    try:
+        vector_store = registry.acquire(
+            job.playlist_id,
+            session_id,
+            lambda: build_playlist_store(job, text_model, embedding_model),
+            version=job.snapshot_id,
+        )
+    except Exception as e:
+        print(f"Building the store for {job.playlist_id} failed: {e}")
+        job.message = ("error", f"Could not load the playlist: {e}")
+        vector_store = None
+
+    if vector_store is not None:
+        job.store = vector_store
+        if job.message is None:
+            job.message = ("success", f"Successfully loaded {vector_store.index.ntotal} songs into the in-memory FAISS store!")
+        if job.failed:
+            registry.mark_incomplete(job.playlist_id)
+        if job.abandoned:
+            registry.release(job.playlist_id, session_id)
+    job.done = True
+
+def load_tracks_to_faiss(new_playlist_id):
+    """
+    Starts loading the playlist's vector store in a background thread. The
+    page keeps rerunning meanwhile, showing progress, and the partial store
+    can be queried as soon as its first batch is embedded.
+    """
+    release_current_playlist()
+
+    ctx = get_script_run_ctx()
+    job = BuildJob(new_playlist_id, get_playlist_snapshot_id(new_playlist_id))
+    thread = threading.Thread(
+        target=run_build_job,
+        args=(job, get_vector_store_registry(), ctx.session_id,
+              st.session_state.gemini_text_model, st.session_state.embedding_model),
+        daemon=True,
+    )
+    add_script_run_ctx(thread, ctx)
+    st.session_state.build_job = job
+    thread.start()
+
+def release_current_playlist():
+    """Drops this session's reference to its current shared vector store (and any build it started)."""
+    job = st.session_state.get("build_job")
+    if job is not None:
+        job.abandoned = True
+        st.session_state.build_job = None
+    current_pid = st.session_state.get("current_pid")
+    if current_pid:
+        get_vector_store_registry().release(current_pid, get_script_run_ctx().session_id)
     st.session_state.vector_store = None
     st.session_state.current_pid = None
+
+def clear_playlist():
+    """Clears the vector store and playlist ID from this session."""
+    release_current_playlist()
     st.toast("Cleared the in-memory vector store.")
     st.rerun()
 
@@ -139,10 +407,27 @@ def load_playlist():
     else:
         st.warning("Please enter a Spotify Playlist ID.")
 
+@st.fragment(run_every=1)
+def show_build_progress():
+    """Polls the background build, rerunning the page when its first batch lands and when it ends."""
+    job = st.session_state.get("build_job")
+    if job is None or (job.done and job.message is None):
+        return
+    if job.done or (job.store is not None and st.session_state.get("current_pid") != job.playlist_id):
+        st.rerun()
+    st.progress(job.progress(), text=job.status)
+
 ### --- UI SECTION --- ###
 st.title("Vibe Check 🎶")
 st.markdown("### Connect to Your Playlist")
 
+build_job = st.session_state.get("build_job")
+if build_job is not None and build_job.done and build_job.message:
+    kind, text = build_job.message
+    build_job.message = None
+    getattr(st, kind)(text)
+show_build_progress()
+
 with st.container(border=True):
     st.write("**Current Playlist ID:**", st.session_state.get("current_pid", "None"))
     disable_buttons = not st.session_state.get("current_pid")
@@ -159,7 +444,7 @@ with st.form(key="new_playlist_form"):
         Copy/paste a Spotify playlist ID below. This app will:
         1. Retrieve songs from the playlist using the Spotify API.
         2. Generate descriptions for each song using **Google's Gemini model**.
-        3. Load the song data into an **in-memory FAISS vector store**.
+        3. Load the song data into an **in-memory FAISS vector store**, saved to disk so it is reused until the playlist changes.
         """
     )
     new_pid = st.text_input(
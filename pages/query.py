@@ -15,11 +15,18 @@ prompt = """
     What kind of mood is conveyed in the image?
 """
 
+# Songs shown per page; "Show more" adds another page from the cached query embedding
+PAGE_SIZE = 5
+
 # Initialize session state variables
 if 'user_feedback' not in st.session_state:
     st.session_state.user_feedback = ''
 if 'top_songs' not in st.session_state:
     st.session_state.top_songs = []
+if 'query_embedding' not in st.session_state:
+    st.session_state.query_embedding = None
+if 'result_count' not in st.session_state:
+    st.session_state.result_count = PAGE_SIZE
 
 @st.cache_data
 def get_setting_description_from_image(photo_input):
@@ -42,7 +49,9 @@ def get_setting_description_from_image(photo_input):
 
 def find_songs(setting_description):
     """
-    Finds the top 5 most similar songs from the in-memory FAISS vector store.
+    Embeds the setting description once and shows the most similar songs from
+    the FAISS vector store. The embedding is kept so more results can be
+    shown later without another embedding call.
     """
     vector_store = st.session_state.get("vector_store")
     if not vector_store:
@@ -51,10 +60,28 @@ def find_songs(setting_description):
 
     if not setting_description:
         st.session_state.top_songs = []
+        st.session_state.query_embedding = None
+        return
+
+    st.session_state.query_embedding = st.session_state.embedding_model.embed_query(setting_description)
+    st.session_state.result_count = st.session_state.get("k_input", PAGE_SIZE)
+    rank_songs()
+
+def rank_songs():
+    """Ranks songs for the cached query embedding (no API calls), optionally diversified with MMR."""
+    vector_store = st.session_state.get("vector_store")
+    embedding = st.session_state.query_embedding
+    if not vector_store or embedding is None:
         return
 
-    # Use the similarity_search_with_score method from FAISS
-    results = vector_store.similarity_search_with_score(setting_description, k=5)
+    count = st.session_state.result_count
+    if st.session_state.get("diversify_input"):
+        # Maximal marginal relevance: trade a little similarity for variety
+        results = vector_store.max_marginal_relevance_search_with_score_by_vector(
+            embedding, k=count, fetch_k=max(count * 4, 20), lambda_mult=0.5
+        )
+    else:
+        results = vector_store.similarity_search_with_score_by_vector(embedding, k=count)
 
     # Process the results into the format our UI expects
     top_songs = []
@@ -69,6 +96,11 @@ def find_songs(setting_description):
     
     st.session_state.top_songs = top_songs
 
+def show_more_songs():
+    """Adds another page of results from the cached embedding."""
+    st.session_state.result_count += PAGE_SIZE
+    rank_songs()
+
 def handle_submit():
     """
     Handles the form submission, gets the vibe description, and finds songs.
@@ -118,6 +150,12 @@ with st.form(key="query_form"):
         key="text_input",
         placeholder="e.g., 'upbeat and energetic for a workout'"
     )
+
+    col_k, col_diverse = st.columns(2)
+    with col_k:
+        st.slider("Number of songs", min_value=1, max_value=20, value=PAGE_SIZE, key="k_input")
+    with col_diverse:
+        st.checkbox("Diversify results (fewer songs by the same artist)", key="diversify_input")
     
     st.form_submit_button("Find My Vibe ✨", on_click=handle_submit, use_container_width=True)
 
@@ -135,6 +173,10 @@ if st.session_state.get('user_feedback'):
                 artist = song.get("Artist", "N/A")
                 url = song.get("Song_URL", "")
                 st.markdown(f"- **[{name} - {artist}]({url})**")
+
+            vector_store = st.session_state.get("vector_store")
+            if vector_store and len(st.session_state.top_songs) < vector_store.index.ntotal:
+                st.button("Show more songs", on_click=show_more_songs)
             
             with st.expander("Show Raw Data from FAISS"):
                 st.dataframe(
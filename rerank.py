@@ -0,0 +1,63 @@
+# rerank.py
+"""
+Diversity reranking of search candidates with maximal marginal relevance (MMR).
+
+All similarities are computed up front as matrix products over the candidate
+matrix, so each selection step is a handful of vectorized NumPy operations.
+"""
+import numpy as np
+
+
+def normalize_rows(matrix):
+    """Scales each row to unit length (zero rows stay zero)."""
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    return matrix / np.maximum(norms, 1e-12)
+
+
+def top_k(scores, k):
+    """
+    Returns (columns, scores) of the best k entries in each row of scores,
+    best first. k must not exceed the number of columns.
+    """
+    # argpartition finds the top k per row without a full sort
+    top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    top_scores = np.take_along_axis(scores, top, axis=1)
+    order = np.argsort(-top_scores, axis=1)
+    return np.take_along_axis(top, order, axis=1), np.take_along_axis(top_scores, order, axis=1)
+
+
+def mmr(query_vector, candidate_vectors, lambda_mult=0.5, k=None, artists=None, artist_penalty=0.5):
+    """
+    Orders candidates by maximal marginal relevance and returns their indices.
+
+    lambda_mult trades relevance (1.0) against diversity (0.0). If artist names
+    are given, candidates by an artist that was already picked are treated as
+    more redundant, so one artist cannot crowd the top of the list.
+    """
+    candidates = normalize_rows(candidate_vectors)
+    n = len(candidates)
+    if n == 0:
+        return []
+    k = n if k is None else min(k, n)
+
+    query = normalize_rows(query_vector)
+    relevance = candidates @ query
+    redundancy = candidates @ candidates.T
+
+    if artists is not None:
+        _, artist_codes = np.unique(np.asarray(artists, dtype=object), return_inverse=True)
+        redundancy = redundancy + artist_penalty * (artist_codes[:, None] == artist_codes[None, :])
+
+    selected = []
+    max_redundancy = np.zeros(n, dtype=np.float32)
+    available = np.ones(n, dtype=bool)
+    for _ in range(k):
+        scores = lambda_mult * relevance - (1 - lambda_mult) * max_redundancy
+        scores[~available] = -np.inf
+        best = int(np.argmax(scores))
+        selected.append(best)
+        available[best] = False
+        max_redundancy = np.maximum(max_redundancy, redundancy[best])
+
+    return selected
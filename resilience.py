@@ -0,0 +1,268 @@
+# resilience.py
+"""
+Fail-fast protection for calls to external providers (Gemini, Pinecone).
+
+- Circuit breakers: after several consecutive failures a provider's breaker
+  opens and calls fail immediately instead of piling up behind a slow or
+  broken API. After a cool-down one probe call is let through (half-open);
+  if it succeeds the breaker closes again.
+- Deadlines: a request sets an end-to-end deadline and every guarded call
+  gives up when it runs out, instead of waiting for the SDK's own timeout.
+  Calls that opt in also hand the time left to the SDK as its timeout. A
+  timeout only counts against a provider that had a fair share of the
+  budget, not one left with what earlier stages didn't use.
+- Hedging: idempotent calls (query embedding, vector query) can send a
+  second identical request if the first hasn't answered after a delay,
+  and use whichever answers first.
+"""
+import contextvars
+import os
+import re
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+
+import telemetry
+
+# Consecutive failures that open a breaker, and how long it stays open
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD", "5"))
+BREAKER_RESET_SECONDS = float(os.getenv("BREAKER_RESET_SECONDS", "30"))
+
+# Send a hedge for idempotent calls still unanswered after this long (0 disables)
+HEDGE_AFTER_SECONDS = float(os.getenv("HEDGE_AFTER_MS", "0")) / 1000
+
+# A timed-out call counts toward opening the breaker only if it was given at least this long
+BREAKER_MIN_TIMEOUT_SECONDS = float(os.getenv("BREAKER_MIN_TIMEOUT_SECONDS", "2"))
+
+# Threads per provider that run guarded calls when a deadline or hedge needs them off the caller's thread
+PROVIDER_WORKERS = 16
+
+PROVIDERS = ("gemini", "pinecone")
+
+# How each provider's SDK takes a per-request timeout in seconds
+SDK_TIMEOUT_KWARGS = {
+    "gemini": lambda seconds: {"request_options": {"timeout": seconds}},
+    "pinecone": lambda seconds: {"_request_timeout": seconds},
+}
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+BREAKER_REJECTIONS = telemetry.Counter(
+    "chromatune_breaker_rejections_total", "Calls failed fast because the provider's circuit breaker was open."
+)
+HEDGES = telemetry.Counter(
+    "chromatune_hedged_calls_total", "Hedge requests sent, by provider and which request answered first."
+)
+
+_deadline = contextvars.ContextVar("deadline", default=None)
+
+# Separate pools, so calls stuck on one provider can't take the threads another needs
+_executors = {
+    provider: ThreadPoolExecutor(max_workers=PROVIDER_WORKERS, thread_name_prefix=provider) for provider in PROVIDERS
+}
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a provider whose breaker is open."""
+
+    def __init__(self, provider, retry_after):
+        super().__init__(f"{provider} is unavailable (circuit open), retry in {retry_after:.0f}s")
+        self.provider = provider
+        self.retry_after = retry_after
+
+
+class DeadlineExceeded(Exception):
+    """Raised when a request's deadline passes before a provider answers."""
+
+
+def is_provider_failure(error):
+    """
+    Whether an error says something about the provider's health. Quota and
+    bad-request errors are about the caller's key or input, so they don't
+    count toward opening the breaker.
+    """
+    if isinstance(error, DeadlineExceeded):
+        return True
+    if telemetry.is_quota_error(error):
+        return False
+    return not re.search(r"\b(400|401|403|404)\b", str(error))
+
+
+class CircuitBreaker:
+    """Closed -> open after repeated failures -> half-open probe -> closed (or open again)."""
+
+    def __init__(self, provider, failure_threshold=BREAKER_FAILURE_THRESHOLD, reset_seconds=BREAKER_RESET_SECONDS):
+        self.provider = provider
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self._lock = threading.Lock()
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+
+    def before_call(self):
+        """Raises CircuitOpenError unless the call may go ahead."""
+        with self._lock:
+            if self.state == CLOSED:
+                return
+            waited = time.time() - self.opened_at
+            if self.state == OPEN and waited >= self.reset_seconds:
+                self.state = HALF_OPEN
+                print(f"[Breaker] {self.provider} half-open, probing")
+            # While half-open, only one probe call is in flight at a time
+            if self.state == HALF_OPEN and not self._probing:
+                self._probing = True
+                return
+        BREAKER_REJECTIONS.inc(provider=self.provider)
+        raise CircuitOpenError(self.provider, max(self.reset_seconds - waited, 1.0))
+
+    def record_success(self):
+        with self._lock:
+            if self.state != CLOSED:
+                print(f"[Breaker] {self.provider} closed")
+            self.state = CLOSED
+            self.failures = 0
+            self._probing = False
+
+    def record_inconclusive(self):
+        """Ends a call that says nothing about the provider's health, freeing the half-open probe slot."""
+        with self._lock:
+            self._probing = False
+
+    def record_failure(self, error):
+        with self._lock:
+            self._probing = False
+            if not is_provider_failure(error):
+                if self.state == HALF_OPEN:
+                    self.state = CLOSED  # The provider answered, so it is up
+                return
+            self.failures += 1
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != OPEN:
+                    print(f"[Breaker] {self.provider} open after {self.failures} failures: {error}")
+                self.state = OPEN
+                self.opened_at = time.time()
+
+    def status(self):
+        with self._lock:
+            retry_in = None
+            if self.state == OPEN:
+                retry_in = max(self.reset_seconds - (time.time() - self.opened_at), 0.0)
+            return {"state": self.state, "consecutive_failures": self.failures, "retry_in_seconds": retry_in}
+
+
+BREAKERS = {provider: CircuitBreaker(provider) for provider in PROVIDERS}
+
+
+@contextmanager
+def deadline(seconds):
+    """Gives guarded calls inside the block (including in threads it starts) `seconds` to finish."""
+    token = _deadline.set(time.monotonic() + seconds)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining():
+    """Seconds left before the current deadline, or None if there is none."""
+    current = _deadline.get()
+    return None if current is None else current - time.monotonic()
+
+
+def call(provider, fn, *args, hedge=False, breaker=True, sdk_timeout=False, **kwargs):
+    """
+    Runs fn(*args, **kwargs) against a provider: fails fast if its breaker is
+    open, stops waiting at the request deadline and, if hedge is set (only for
+    idempotent calls), sends a second request when the first is slow. If
+    sdk_timeout is set, fn also gets the time left as the SDK's own timeout
+    (see SDK_TIMEOUT_KWARGS), so abandoned requests don't keep running.
+
+    With breaker=False the call keeps the deadline and hedging but neither
+    checks nor updates the breaker, for calls whose outcome says little about
+    the provider's health.
+    """
+    time_left = remaining()
+    if time_left is not None and time_left <= 0:
+        # Earlier stages used up the budget; this provider was never asked
+        raise DeadlineExceeded(f"Deadline passed before calling {provider}")
+    hedge_after = HEDGE_AFTER_SECONDS if hedge else 0
+    if not breaker:
+        return _run(provider, fn, args, kwargs, hedge_after, sdk_timeout)
+    breaker = BREAKERS[provider]
+    breaker.before_call()
+    try:
+        result = _run(provider, fn, args, kwargs, hedge_after, sdk_timeout)
+    except DeadlineExceeded as e:
+        if time_left is None or time_left >= BREAKER_MIN_TIMEOUT_SECONDS:
+            breaker.record_failure(e)
+        else:
+            breaker.record_inconclusive()
+        raise
+    except Exception as e:
+        breaker.record_failure(e)
+        raise
+    breaker.record_success()
+    return result
+
+
+def _run(provider, fn, args, kwargs, hedge_after, sdk_timeout):
+    if remaining() is None and not hedge_after:
+        return fn(*args, **kwargs)
+
+    def submit():
+        call_kwargs = kwargs
+        time_left = remaining()
+        if sdk_timeout and time_left is not None:
+            call_kwargs = {**kwargs, **SDK_TIMEOUT_KWARGS[provider](max(time_left, 0.001))}
+        # Copy the context so trace spans and the deadline follow the call into the worker thread
+        return _executors[provider].submit(contextvars.copy_context().run, fn, *args, **call_kwargs)
+
+    pending = {submit()}
+    primary = next(iter(pending))
+    hedged = False
+    try:
+        while pending:
+            time_left = remaining()
+            timeout = time_left
+            if hedge_after and not hedged:
+                timeout = hedge_after if time_left is None else min(hedge_after, time_left)
+            done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+
+            succeeded = [future for future in done if future.exception() is None]
+            if succeeded:
+                if hedged:
+                    HEDGES.inc(provider=provider, winner="primary" if succeeded[0] is primary else "hedge")
+                return succeeded[0].result()
+            if done and not pending:
+                # Hedging covers slowness, not errors: a failure is final once nothing else is in flight
+                raise next(iter(done)).exception()
+
+            if time_left is not None and remaining() <= 0:
+                raise DeadlineExceeded(f"{provider} did not answer before the request deadline")
+            if hedge_after and not hedged and not done:
+                # The first request is slow: send one duplicate and take whichever answers first
+                hedged = True
+                pending.add(submit())
+
+        raise DeadlineExceeded(f"{provider} did not answer before the request deadline")
+    finally:
+        # Requests nobody waits for any more: drop those still queued (running ones end at their SDK timeout)
+        for future in pending:
+            future.cancel()
+
+
+def status():
+    """Breaker state, fail-fast rejections and hedge outcomes for every provider."""
+    providers = {}
+    for provider, breaker in BREAKERS.items():
+        providers[provider] = {
+            **breaker.status(),
+            "rejections": BREAKER_REJECTIONS.value(provider=provider),
+            "hedges": {winner: HEDGES.value(provider=provider, winner=winner) for winner in ("primary", "hedge")},
+        }
+    return providers
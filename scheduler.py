@@ -0,0 +1,175 @@
+# scheduler.py
+"""
+Background playlist sync.
+
+A worker thread polls each registered playlist's Spotify snapshot_id (a cheap
+call that returns no tracks) and queues an incremental sync only when the
+snapshot changed since the last successful sync. Polls and syncs that fail
+back off exponentially with jitter, so a Spotify or Gemini outage is not
+hammered by every worker on the same schedule.
+"""
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import services
+import shared_store
+import telemetry
+
+# Seconds between snapshot checks (0 disables the background worker)
+SYNC_POLL_INTERVAL = float(os.getenv("SYNC_POLL_INTERVAL", "300"))
+
+# Each wait is randomly stretched or shortened by up to this fraction
+SYNC_POLL_JITTER = 0.2
+
+# Longest a failing playlist waits before it is checked again
+SYNC_MAX_BACKOFF = float(os.getenv("SYNC_MAX_BACKOFF", "3600"))
+
+# Background syncs that may run at once
+SCHEDULER_SYNC_WORKERS = 2
+
+# Held by the one API worker process that polls (the others skip polling)
+SCHEDULER_LOCK_FILE = "scheduler.lock"
+
+POLLS = telemetry.Counter(
+    "chromatune_sync_polls_total", "Background snapshot checks, by result (unchanged, changed, error)."
+)
+
+
+def jittered(seconds):
+    """Returns seconds randomly adjusted by up to SYNC_POLL_JITTER either way."""
+    return seconds * random.uniform(1 - SYNC_POLL_JITTER, 1 + SYNC_POLL_JITTER)
+
+
+class SyncScheduler:
+    """Polls registered playlists for changes and syncs the ones that changed."""
+
+    def __init__(self, interval=SYNC_POLL_INTERVAL, max_backoff=SYNC_MAX_BACKOFF):
+        self.interval = interval
+        self.max_backoff = max_backoff
+        self._stop = threading.Event()
+        self._thread = None
+        self._executor = None
+        self._leader_lock = None
+        self._lock = threading.Lock()
+        self._queued = set()     # playlist IDs with a background sync queued or running
+        self._failures = {}      # playlist_id -> consecutive failed polls/syncs
+        self._next_check = {}    # playlist_id -> earliest time to poll again
+        self.last_poll = None
+
+    def start(self):
+        """
+        Starts the worker thread (no-op if the interval is 0, it is already
+        running, or another worker process already polls).
+        """
+        if self.interval <= 0 or self._thread is not None:
+            return
+        self._leader_lock = shared_store.try_exclusive(SCHEDULER_LOCK_FILE)
+        if self._leader_lock is None:
+            print("[Scheduler] Another worker process is polling playlists")
+            return
+        self._stop.clear()
+        self._executor = ThreadPoolExecutor(max_workers=SCHEDULER_SYNC_WORKERS, thread_name_prefix="sync")
+        self._thread = threading.Thread(target=self._run, name="sync-scheduler", daemon=True)
+        self._thread.start()
+        print(f"[Scheduler] Polling playlists every ~{self.interval:.0f}s")
+
+    def stop(self):
+        """Stops polling. Syncs already running finish in the background."""
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self._thread = None
+        self._leader_lock.close()
+        self._leader_lock = None
+        print("[Scheduler] Stopped")
+
+    def _run(self):
+        # Stagger the first poll so restarted workers don't all hit Spotify at once
+        while not self._stop.wait(jittered(self.interval) if self.last_poll else random.uniform(0, 5)):
+            try:
+                self.poll_once()
+            except Exception as e:
+                print(f"[Scheduler] Poll error: {e}")
+
+    def poll_once(self):
+        """Checks every registered playlist once and queues syncs for the changed ones."""
+        self.last_poll = time.time()
+        for playlist_id, info in services.load_playlists().items():
+            if self._stop.is_set():
+                return
+            if time.time() < self._next_check.get(playlist_id, 0):
+                continue
+            with self._lock:
+                if playlist_id in self._queued or services.is_sync_running(playlist_id):
+                    continue
+
+            latest = services.fetch_playlist_info(playlist_id)
+            if latest is None:
+                POLLS.inc(result="error")
+                self._back_off(playlist_id)
+                continue
+
+            snapshot_id = latest.get("snapshot_id")
+            if snapshot_id and snapshot_id == info.get("snapshot_id"):
+                POLLS.inc(result="unchanged")
+                self._failures.pop(playlist_id, None)
+                continue
+
+            POLLS.inc(result="changed")
+            self.enqueue(playlist_id)
+
+    def enqueue(self, playlist_id):
+        """Queues a background sync unless one is already queued for the playlist."""
+        with self._lock:
+            if playlist_id in self._queued:
+                return False
+            self._queued.add(playlist_id)
+        print(f"[Scheduler] Playlist {playlist_id} changed, queueing sync")
+        self._executor.submit(self._sync, playlist_id)
+        return True
+
+    def _sync(self, playlist_id):
+        try:
+            # A successful sync records the playlist's new snapshot_id
+            result = services.sync_playlist(playlist_id)
+            if result.get("success") and not result.get("error"):
+                self._failures.pop(playlist_id, None)
+                print(f"[Scheduler] Synced {playlist_id}: {result.get('new_songs', 0)} new songs")
+            else:
+                print(f"[Scheduler] Sync of {playlist_id} failed: {result.get('error')}")
+                self._back_off(playlist_id)
+        except Exception as e:
+            print(f"[Scheduler] Sync of {playlist_id} failed: {e}")
+            self._back_off(playlist_id)
+        finally:
+            with self._lock:
+                self._queued.discard(playlist_id)
+
+    def _back_off(self, playlist_id):
+        failures = self._failures.get(playlist_id, 0) + 1
+        self._failures[playlist_id] = failures
+        delay = min(self.interval * 2 ** failures, self.max_backoff)
+        self._next_check[playlist_id] = time.time() + jittered(delay)
+
+    def status(self):
+        """Returns the worker's state for the API."""
+        now = time.time()
+        with self._lock:
+            queued = sorted(self._queued)
+        return {
+            "enabled": self._thread is not None,
+            "interval_seconds": self.interval,
+            "last_poll": self.last_poll,
+            "queued": queued,
+            "backing_off": {
+                playlist_id: round(next_check - now)
+                for playlist_id, next_check in self._next_check.items()
+                if next_check > now
+            },
+            "polls": {result: POLLS.value(result=result) for result in ("unchanged", "changed", "error")},
+        }
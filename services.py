@@ -4,58 +4,306 @@ import requests
 import time
 import json
 import re
+import threading
+import hashlib
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from typing import List
+import numpy as np
 from dotenv import load_dotenv
-import google.generativeai as genai
-from langchain_core.documents import Document
-from langchain_core.embeddings import Embeddings
-from langchain_pinecone import PineconeVectorStore
-from pinecone import Pinecone
+
+import telemetry
+import resilience
+import local_index
+import catalog
+import neighbors
+import shared_cache
+import shared_store
+from coalesce import SingleFlight
+from checkpoint import SyncCheckpoint, CHECKPOINT_DIR, DESCRIBED, EMBEDDED, UPSERTED
 
 load_dotenv()
-genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
 
+# SDK clients are created on first use (see get_genai / get_pinecone), not at
+# import, so the API starts accepting requests without loading every SDK
+genai = None
+pc = None
+_clients_lock = threading.Lock()
+
+# Gemini clients, one per API key (each with its own connection pool), so
+# concurrent requests with different keys never share the SDK's global config
+MAX_GEMINI_CLIENTS = 32
+_gemini_clients = OrderedDict()  # key hash -> client, least recently used first
+
+
+def get_genai():
+    """Returns the google.generativeai module, importing it on first use."""
+    global genai
+    if genai is None:
+        with _clients_lock:
+            if genai is None:
+                import google.generativeai as sdk
+                genai = sdk
+    return genai
+
+
+def key_id(api_key):
+    """Short, non-reversible identifier for an API key (safe to log and use as a cache key)."""
+    return hashlib.sha256((api_key or "").encode()).hexdigest()[:16]
+
+
+def make_gemini_client(api_key):
+    """Creates a Gemini client bound to one API key."""
+    get_genai()
+    from google.ai import generativelanguage as glm
+    return glm.GenerativeServiceClient(client_options={"api_key": api_key})
+
+
+def get_gemini_client(api_key=None):
+    """Returns the cached client for an API key (the server key if none is given)."""
+    api_key = api_key or os.getenv("GOOGLE_API_KEY")
+    cache_key = key_id(api_key)
+    with _clients_lock:
+        client = _gemini_clients.get(cache_key)
+        if client is not None:
+            _gemini_clients.move_to_end(cache_key)
+            return client
+
+    client = make_gemini_client(api_key)
+    with _clients_lock:
+        client = _gemini_clients.setdefault(cache_key, client)
+        _gemini_clients.move_to_end(cache_key)
+        # Evicted clients aren't closed: a request may still be using one
+        while len(_gemini_clients) > MAX_GEMINI_CLIENTS:
+            _gemini_clients.popitem(last=False)
+    return client
+
+
+def generative_model(model_name, api_key=None):
+    """Returns a GenerativeModel that sends its requests with the given API key."""
+    model = get_genai().GenerativeModel(model_name)
+    model._client = get_gemini_client(api_key)
+    return model
+
+
+def embed_content(api_key=None, **kwargs):
+    """genai.embed_content using the given API key's client."""
+    return get_genai().embed_content(client=get_gemini_client(api_key), **kwargs)
+
+
+def get_pinecone():
+    """Returns the Pinecone client, creating it on first use."""
+    global pc
+    if pc is None:
+        with _clients_lock:
+            if pc is None:
+                from pinecone import Pinecone
+                pc = Pinecone(api_key=os.getenv("PINECONE_API_KEY"))
+    return pc
+
+
+def warm_up():
+    """Loads the SDKs and opens the index handle ahead of the first request."""
+    start = time.perf_counter()
+    try:
+        get_gemini_client()
+        get_index()
+        print(f"[Startup] SDK clients ready in {time.perf_counter() - start:.2f}s")
+    except Exception as e:
+        # The first request will retry (and report) whatever failed here
+        print(f"[Startup] Warm-up failed: {e}")
+
+# Identical concurrent query embeddings and playlist syncs run only once
+_embed_flight = SingleFlight("embed_query")
+_sync_flight = SingleFlight("sync")
+
+# Query embeddings are reused across requests and worker processes
+QUERY_EMBEDDING_CACHE_SIZE = 10000
+_query_embeddings = shared_cache.SharedTable("query_embeddings", max_entries=QUERY_EMBEDDING_CACHE_SIZE)
+
+
+# Max texts per batch embedding request
+EMBED_BATCH_SIZE = 100
 
-class GoogleNativeEmbeddings(Embeddings):
-    """Custom embeddings using Google's native SDK."""
 
-    def __init__(self, model: str = "models/text-embedding-004"):
+class GoogleNativeEmbeddings:
+    """
+    Custom embeddings using Google's native SDK. Same embed_documents /
+    embed_query interface as a LangChain Embeddings, without importing
+    LangChain at startup.
+    """
+
+    def __init__(self, model: str = "models/text-embedding-004", api_key: str = None):
         self.model = model
+        self.api_key = api_key
 
     def embed_documents(self, texts: List[str]) -> List[List[float]]:
-        """Embed a list of documents."""
+        """Embed a list of documents, up to EMBED_BATCH_SIZE per request."""
         embeddings = []
-        for text in texts:
-            response = genai.embed_content(model=self.model, content=text)
-            embeddings.append(response['embedding'])
+        for i in range(0, len(texts), EMBED_BATCH_SIZE):
+            response = resilience.call("gemini", self._embed, texts[i:i + EMBED_BATCH_SIZE], sdk_timeout=True)
+            embeddings.extend(response['embedding'])
         return embeddings
 
     def embed_query(self, text: str) -> List[float]:
-        """Embed a single query."""
-        response = genai.embed_content(model=self.model, content=text)
-        return response['embedding']
+        """
+        Embed a single query. Repeated queries come from the shared cache;
+        concurrent requests for the same text and key share one call.
+        """
+        cache_key = f"{self.model}:{hashlib.sha256(text.encode()).hexdigest()}"
+        cached = _query_embeddings.get(cache_key)
+        if cached is not None:
+            return np.frombuffer(cached, dtype=np.float32).tolist()
+        vector = _embed_flight.do((self.model, key_id(self.api_key), text), self._embed_query, text)
+        _query_embeddings.put(cache_key, np.asarray(vector, dtype=np.float32).tobytes())
+        return vector
+
+    def _embed_query(self, text: str) -> List[float]:
+        # Embedding is idempotent, so a slow call may be hedged with a duplicate
+        return resilience.call("gemini", self._embed, text, hedge=True, sdk_timeout=True)['embedding']
+
+    def _embed(self, content, **request_kwargs):
+        with telemetry.external_call("gemini", "embedding"):
+            return embed_content(self.api_key, model=self.model, content=content, **request_kwargs)
 
-# Initialize Pinecone
-pc = Pinecone(api_key=os.getenv("PINECONE_API_KEY"))
 INDEX_NAME = "chroma-tune"
 
+# Spotify endpoints (overridable so benchmarks can point at a local stand-in server)
+SPOTIFY_API_URL = os.getenv("SPOTIFY_API_URL", "https://api.spotify.com/v1")
+SPOTIFY_ACCOUNTS_URL = os.getenv("SPOTIFY_ACCOUNTS_URL", "https://accounts.spotify.com/api")
+
 # Track indexed songs locally
 INDEXED_SONGS_FILE = "indexed_songs.json"
+INDEXED_SONGS_LOCK_FILE = f"{INDEXED_SONGS_FILE}.lock"  # held while any worker rewrites the file
 
 # Free tier limits
 MAX_SONGS = 500  # Stay well under free tier limits
 
+# Registered playlists, each stored in its own Pinecone namespace
+PLAYLISTS_FILE = "playlists.json"
+
+# The original collaborative playlist keeps the default namespace
+DEFAULT_PLAYLIST_ID = "5DYHhVIXo6PhfXqjIlu6rt"
+
+# Taken around every read and write of PLAYLISTS_FILE, by every worker process
+PLAYLISTS_LOCK_FILE = f"{PLAYLISTS_FILE}.lock"
+
+# Audio features are fixed per track, so they are cached on disk for good
+AUDIO_FEATURES_FILE = "audio_features.json"
+AUDIO_FEATURE_WORKERS = 4     # chunk requests in flight at once
+AUDIO_FEATURE_RETRIES = 3     # extra attempts for a rate-limited or failed chunk
+AUDIO_FEATURE_MAX_WAIT = 30   # longest wait between attempts, in seconds
+AUDIO_FEATURES_LOCK_FILE = f"{AUDIO_FEATURES_FILE}.lock"  # held while any worker rewrites the file
+_audio_feature_cache = None
+_audio_feature_lock = threading.Lock()
+
+
+def get_index():
+    """Returns a handle to the Pinecone index."""
+    return get_pinecone().Index(INDEX_NAME)
+
+
+def load_playlists():
+    """Returns the registered playlists as {playlist_id: info}, always including the default one."""
+    with shared_store.file_lock(PLAYLISTS_LOCK_FILE):
+        return _read_playlists()
+
+
+def _read_playlists():
+    playlists = {}
+    if os.path.exists(PLAYLISTS_FILE):
+        try:
+            with open(PLAYLISTS_FILE, 'r') as f:
+                playlists = json.load(f)
+        except (json.JSONDecodeError, OSError) as e:
+            print(f"[Playlists] Could not read {PLAYLISTS_FILE}: {e}")
+    playlists.setdefault(DEFAULT_PLAYLIST_ID, {"name": "ChromaTune Collaborative", "namespace": ""})
+    return playlists
+
+
+def save_playlists(playlists):
+    """
+    Saves the playlist registry; callers hold PLAYLISTS_LOCK_FILE, which
+    readers take too, so no worker sees a half-written file. It is rewritten in place
+    rather than replaced: docker-compose bind-mounts the file, and renaming
+    over a bind-mounted file fails with EBUSY.
+    """
+    with open(PLAYLISTS_FILE, 'w') as f:
+        json.dump(playlists, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def get_playlist(playlist_id):
+    """Returns the registry entry for a playlist, or None if it isn't registered."""
+    return load_playlists().get(playlist_id)
+
 
-def get_pinecone_indexed_ids():
-    """Fetch all indexed song IDs directly from Pinecone."""
+def get_namespace(playlist_id):
+    """Returns the Pinecone namespace a playlist's songs live in."""
+    playlist = get_playlist(playlist_id)
+    if playlist is None:
+        return playlist_id
+    return playlist.get("namespace", playlist_id)
+
+
+def register_playlist(playlist_id):
+    """
+    Registers a playlist (validating it with Spotify) and returns its entry.
+    Returns None if Spotify doesn't know the playlist.
+    """
+    existing = get_playlist(playlist_id)
+    if existing:
+        return existing
+
+    info = fetch_playlist_info(playlist_id)
+    if info is None:
+        return None
+
+    with shared_store.file_lock(PLAYLISTS_LOCK_FILE):
+        playlists = _read_playlists()
+        playlists[playlist_id] = {
+            "name": info.get("name", playlist_id),
+            "namespace": playlist_id,
+            "added_at": time.time(),
+        }
+        save_playlists(playlists)
+        return playlists[playlist_id]
+
+
+def set_playlist_snapshot(playlist_id, snapshot_id):
+    """Records the Spotify snapshot_id a playlist was last fully synced at."""
+    with shared_store.file_lock(PLAYLISTS_LOCK_FILE):
+        playlists = _read_playlists()
+        if playlist_id not in playlists:
+            return
+        playlists[playlist_id]["snapshot_id"] = snapshot_id
+        playlists[playlist_id]["synced_at"] = time.time()
+        save_playlists(playlists)
+
+
+def get_namespace_counts():
+    """Returns {namespace: vector_count} for the whole index."""
+    try:
+        with telemetry.external_call("pinecone", "vector_stats"):
+            stats = get_index().describe_index_stats()
+        return {ns: info.vector_count for ns, info in (stats.namespaces or {}).items()}
+    except Exception as e:
+        print(f"Pinecone stats error: {e}")
+        return {}
+
+
+def get_pinecone_indexed_ids(namespace=""):
+    """Fetch all indexed song IDs in a namespace directly from Pinecone."""
     try:
-        index = pc.Index(INDEX_NAME)
+        index = get_index()
         indexed_ids = set()
 
         # List all vector IDs from Pinecone
-        for ids in index.list():
-            if ids:
-                indexed_ids.update(ids)
+        with telemetry.external_call("pinecone", "vector_list"):
+            for ids in index.list(namespace=namespace):
+                if ids:
+                    indexed_ids.update(ids)
 
         return indexed_ids
     except Exception as e:
@@ -69,11 +317,12 @@ def get_spotify_token():
         client_secret = os.getenv("SPOTIFY_CLIENT_SECRET")
         print(f"[Spotify Auth] Client ID: {client_id[:8]}... Secret: {'***' if client_secret else 'MISSING'}")
 
-        response = requests.post('https://accounts.spotify.com/api/token', {
-            'grant_type': 'client_credentials',
-            'client_id': client_id,
-            'client_secret': client_secret,
-        })
+        with telemetry.external_call("spotify", "spotify"):
+            response = requests.post(f'{SPOTIFY_ACCOUNTS_URL}/token', {
+                'grant_type': 'client_credentials',
+                'client_id': client_id,
+                'client_secret': client_secret,
+            })
         data = response.json()
 
         if 'access_token' in data:
@@ -95,14 +344,16 @@ def fetch_playlist_tracks(playlist_id):
         return None
 
     headers = {'Authorization': f'Bearer {token}'}
-    url = f'https://api.spotify.com/v1/playlists/{playlist_id}/tracks'
+    url = f'{SPOTIFY_API_URL}/playlists/{playlist_id}/tracks'
     tracks = []
 
     print(f"[Spotify] Fetching playlist {playlist_id}...")
     while url:
-        res = requests.get(url, headers=headers)
+        with telemetry.external_call("spotify", "spotify"):
+            res = requests.get(url, headers=headers)
         print(f"[Spotify] Response: {res.status_code}")
         if res.status_code != 200:
+            telemetry.record_error("spotify", quota=res.status_code == 429)
             try:
                 error_data = res.json()
                 error_msg = error_data.get('error', {}).get('message', res.text[:200])
@@ -126,37 +377,132 @@ def fetch_playlist_tracks(playlist_id):
     return tracks
 
 
-def fetch_audio_features(track_ids):
-    """Fetches audio features for multiple tracks (max 100 per request)."""
+def fetch_playlist_info(playlist_id):
+    """Fetches a playlist's name and snapshot_id (a cheap call, no tracks). Returns None on failure."""
     token = get_spotify_token()
     if not token:
-        return {}
+        return None
 
     headers = {'Authorization': f'Bearer {token}'}
-    features = {}
-
-    # Spotify allows max 100 IDs per request
-    for i in range(0, len(track_ids), 100):
-        batch_ids = track_ids[i:i + 100]
-        url = f'https://api.spotify.com/v1/audio-features?ids={",".join(batch_ids)}'
-
-        res = requests.get(url, headers=headers)
-        if res.status_code == 200:
-            data = res.json()
-            for feature in data.get('audio_features', []):
-                if feature:
-                    features[feature['id']] = {
-                        'energy': feature.get('energy', 0),
-                        'tempo': feature.get('tempo', 0),
-                        'danceability': feature.get('danceability', 0),
-                        'valence': feature.get('valence', 0),  # happiness
-                        'acousticness': feature.get('acousticness', 0),
-                        'instrumentalness': feature.get('instrumentalness', 0)
-                    }
+    url = f'{SPOTIFY_API_URL}/playlists/{playlist_id}'
+    with telemetry.external_call("spotify", "spotify"):
+        res = requests.get(url, headers=headers, params={'fields': 'name,snapshot_id'})
+    if res.status_code != 200:
+        telemetry.record_error("spotify", quota=res.status_code == 429)
+        print(f"[Spotify] Playlist info error for {playlist_id}: {res.status_code}")
+        return None
+    return res.json()
+
+
+def load_audio_feature_cache():
+    """Returns the on-disk audio-feature cache as {track_id: features or None}."""
+    global _audio_feature_cache
+    with _audio_feature_lock:
+        if _audio_feature_cache is None:
+            _audio_feature_cache = _read_audio_features()
+        return _audio_feature_cache
+
+
+def _read_audio_features():
+    if not os.path.exists(AUDIO_FEATURES_FILE):
+        return {}
+    try:
+        with open(AUDIO_FEATURES_FILE, 'r') as f:
+            return json.load(f)
+    except (json.JSONDecodeError, OSError) as e:
+        print(f"[AudioFeatures] Could not read {AUDIO_FEATURES_FILE}: {e}")
+        return {}
+
+
+def save_audio_features(fetched):
+    """
+    Adds fetched features to the cache and writes it to disk atomically,
+    merged with whatever other worker processes saved since it was loaded.
+    """
+    cache = load_audio_feature_cache()
+    with shared_store.file_lock(AUDIO_FEATURES_LOCK_FILE):
+        on_disk = _read_audio_features()
+        with _audio_feature_lock:
+            cache.update(on_disk)
+            cache.update(fetched)
+            merged = dict(cache)
+        tmp_path = f"{AUDIO_FEATURES_FILE}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(merged, f)
+        os.replace(tmp_path, AUDIO_FEATURES_FILE)
+
+
+def _fetch_audio_feature_chunk(batch_ids, headers):
+    """
+    Fetches one chunk of up to 100 tracks, retrying rate limits and server
+    errors. Returns {track_id: features or None}, or None if every attempt failed.
+    """
+    url = f'{SPOTIFY_API_URL}/audio-features'
+    for attempt in range(AUDIO_FEATURE_RETRIES + 1):
+        delay = min(2 ** attempt, AUDIO_FEATURE_MAX_WAIT)
+        try:
+            with telemetry.external_call("spotify", "spotify"):
+                res = requests.get(url, headers=headers, params={'ids': ",".join(batch_ids)})
+        except requests.RequestException as e:
+            print(f"[AudioFeatures] Request error (attempt {attempt + 1}): {e}")
         else:
-            print(f"Audio features error: {res.status_code}")
+            if res.status_code == 200:
+                chunk = {tid: None for tid in batch_ids}  # Spotify returns null for tracks it has no analysis for
+                for feature in res.json().get('audio_features', []):
+                    if feature:
+                        chunk[feature['id']] = {
+                            'energy': feature.get('energy', 0),
+                            'tempo': feature.get('tempo', 0),
+                            'danceability': feature.get('danceability', 0),
+                            'valence': feature.get('valence', 0),  # happiness
+                            'acousticness': feature.get('acousticness', 0),
+                            'instrumentalness': feature.get('instrumentalness', 0)
+                        }
+                return chunk
+
+            telemetry.record_error("spotify", quota=res.status_code == 429)
+            print(f"Audio features error: {res.status_code} (attempt {attempt + 1})")
+            if res.status_code != 429 and res.status_code < 500:
+                return None
+            retry_after = res.headers.get('Retry-After')
+            if retry_after and retry_after.isdigit():
+                delay = min(int(retry_after), AUDIO_FEATURE_MAX_WAIT)
+
+        if attempt < AUDIO_FEATURE_RETRIES:
+            time.sleep(delay)
+    return None
 
-    return features
+
+def fetch_audio_features(track_ids):
+    """
+    Fetches audio features for multiple tracks. Features never change for a
+    track ID, so each track is fetched from Spotify once and then served from
+    AUDIO_FEATURES_FILE. Missing tracks are fetched in chunks of 100, a few
+    chunks at a time.
+    """
+    cache = load_audio_feature_cache()
+    missing = list(dict.fromkeys(tid for tid in track_ids if tid not in cache))
+
+    if missing:
+        token = get_spotify_token()
+        if token:
+            headers = {'Authorization': f'Bearer {token}'}
+            # Spotify allows max 100 IDs per request
+            chunks = [missing[i:i + 100] for i in range(0, len(missing), 100)]
+            with ThreadPoolExecutor(max_workers=min(len(chunks), AUDIO_FEATURE_WORKERS)) as executor:
+                results = list(executor.map(lambda ids: _fetch_audio_feature_chunk(ids, headers), chunks))
+
+            fetched = {}
+            for chunk_ids, chunk in zip(chunks, results):
+                if chunk is None:
+                    print(f"[AudioFeatures] Gave up on {len(chunk_ids)} tracks; they will be retried next sync")
+                else:
+                    fetched.update(chunk)
+            if fetched:
+                save_audio_features(fetched)
+        print(f"[AudioFeatures] {len(track_ids) - len(missing)} cached, {len(missing)} fetched")
+
+    return {tid: cache[tid] for tid in track_ids if cache.get(tid)}
 
 
 def describe_audio_features(features):
@@ -215,24 +561,48 @@ def describe_audio_features(features):
 
 def get_indexed_song_ids():
     """Returns set of already indexed song IDs."""
+    with shared_store.file_lock(INDEXED_SONGS_LOCK_FILE):
+        return _read_indexed_song_ids()
+
+
+def _read_indexed_song_ids():
     if not os.path.exists(INDEXED_SONGS_FILE):
         return set()
-    with open(INDEXED_SONGS_FILE, 'r') as f:
-        return set(json.load(f))
+    try:
+        with open(INDEXED_SONGS_FILE, 'r') as f:
+            return set(json.load(f))
+    except (json.JSONDecodeError, OSError) as e:
+        print(f"[Sync] Could not read {INDEXED_SONGS_FILE}: {e}")
+        return set()
 
 
-def save_indexed_song_ids(song_ids):
-    """Saves the set of indexed song IDs."""
-    with open(INDEXED_SONGS_FILE, 'w') as f:
+def _write_indexed_song_ids(song_ids):
+    """Writes the file atomically. Caller holds INDEXED_SONGS_LOCK_FILE."""
+    tmp_path = f"{INDEXED_SONGS_FILE}.tmp"
+    with open(tmp_path, 'w') as f:
         json.dump(list(song_ids), f)
+    os.replace(tmp_path, INDEXED_SONGS_FILE)
+
+
+def save_indexed_song_ids(song_ids):
+    """Saves the set of indexed song IDs (across all playlists)."""
+    with shared_store.file_lock(INDEXED_SONGS_LOCK_FILE):
+        _write_indexed_song_ids(song_ids)
+
+
+def add_indexed_song_ids(song_ids):
+    """Adds song IDs to the indexed set, keeping whatever other workers added meanwhile."""
+    with shared_store.file_lock(INDEXED_SONGS_LOCK_FILE):
+        _write_indexed_song_ids(_read_indexed_song_ids() | set(song_ids))
 
 
 def get_song_count():
     """Returns the number of indexed songs from Pinecone."""
     try:
         # Get actual count from Pinecone
-        index = pc.Index(INDEX_NAME)
-        stats = index.describe_index_stats()
+        index = get_index()
+        with telemetry.external_call("pinecone", "vector_stats"):
+            stats = index.describe_index_stats()
         return stats.total_vector_count
     except Exception as e:
         print(f"Pinecone stats error: {e}")
@@ -264,8 +634,11 @@ def init_indexed_songs(playlist_id):
 
 
 def generate_batch_descriptions(songs_batch, audio_features_map):
-    """Uses Gemini to generate vibe descriptions for songs."""
-    model = genai.GenerativeModel("gemini-2.5-flash")
+    """
+    Uses Gemini to generate vibe descriptions for songs. Raises if Gemini
+    fails (or its breaker is open) or the reply isn't the expected JSON.
+    """
+    model = generative_model("gemini-2.5-flash")
 
     # Build song list
     songs_lines = []
@@ -282,16 +655,77 @@ def generate_batch_descriptions(songs_batch, audio_features_map):
     Songs:
     {songs_text}
     """
-    try:
-        response = model.generate_content(prompt)
-        clean_text = re.sub(r'```json|```', '', response.text).strip()
-        return json.loads(clean_text)
-    except Exception as e:
-        print(f"Gemini Error: {e}")
-        return []
+    with telemetry.external_call("gemini", "llm"):
+        response = resilience.call("gemini", model.generate_content, prompt, sdk_timeout=True)
+    clean_text = re.sub(r'```json|```', '', response.text).strip()
+    results = json.loads(clean_text)
+    if not isinstance(results, list):
+        raise ValueError(f"Expected a JSON list of descriptions, got {type(results).__name__}")
+    return results
+
+
+def copy_shared_songs(track_ids, namespace):
+    """
+    Copies songs that were already embedded for another playlist into this
+    playlist's namespace, so a song shared between playlists is only described
+    and embedded once. Returns the set of track IDs that were copied.
+    """
+    index = get_index()
+    copied = set()
+    remaining = list(track_ids)
+
+    for playlist in load_playlists().values():
+        other_namespace = playlist.get("namespace", "")
+        if not remaining or other_namespace == namespace:
+            continue
+
+        for fetched in catalog.fetch_batches(index, other_namespace, remaining):
+            vectors = [(vid, vec.values, vec.metadata or {}) for vid, vec in fetched.items()]
+            if vectors:
+                with telemetry.external_call("pinecone", "vector_upsert"):
+                    index.upsert(vectors=vectors, namespace=namespace)
+                catalog.update_catalog(namespace, {vid: metadata for vid, _, metadata in vectors})
+                copied.update(vid for vid, _, _ in vectors)
+
+        remaining = [tid for tid in remaining if tid not in copied]
+
+    return copied
+
+
+def sync_playlist(playlist_id):
+    """
+    Syncs one registered playlist into its namespace. Syncs of different
+    playlists can run in parallel; a sync requested while the same playlist
+    is already syncing waits for that run and returns its result.
+    """
+    return _sync_flight.do(playlist_id, _sync_namespace, playlist_id, get_namespace(playlist_id))
+
+
+def _sync_namespace(playlist_id, namespace):
+    # With several worker processes, a sync of the same namespace in another worker runs first
+    with shared_store.write_lock(os.path.join(CHECKPOINT_DIR, namespace or "_default")):
+        # Read the snapshot first: if the playlist changes mid-sync, the next poll still sees it as changed
+        info = fetch_playlist_info(playlist_id)
+        try:
+            result = sync_collaborative_playlist(playlist_id, namespace=namespace)
+            # Only a sync that indexed every new song records the snapshot; otherwise the next poll retries
+            if info and result.get("success") and not result.get("error"):
+                set_playlist_snapshot(playlist_id, info.get("snapshot_id"))
+            return result
+        finally:
+            # Publish the new songs' vectors and neighbors; every worker picks them up
+            try:
+                neighbors.refresh(namespace, local_index.refresh(get_index(), namespace))
+            except Exception as e:
+                print(f"[Sync] Could not publish local vectors for '{namespace}': {e}")
+
+
+def is_sync_running(playlist_id):
+    """Whether a sync of the playlist is in progress."""
+    return _sync_flight.in_flight(playlist_id)
 
 
-def sync_collaborative_playlist(playlist_id):
+def sync_collaborative_playlist(playlist_id, namespace=""):
     """
     Syncs the collaborative playlist.
     Only processes NEW songs that haven't been indexed yet.
@@ -316,16 +750,30 @@ def sync_collaborative_playlist(playlist_id):
             })
 
     # 3. Find new songs (check Pinecone directly, not local file)
-    indexed_ids = get_pinecone_indexed_ids()
+    indexed_ids = get_pinecone_indexed_ids(namespace)
+
+    # Songs Pinecone lists are done; songs an earlier run upserted may not be listed yet,
+    # so those are looked up by ID and re-embedded if Pinecone no longer has them
+    checkpoint = SyncCheckpoint(namespace)
+    checkpoint.forget(indexed_ids)
+    upserted = [t['id'] for t in all_tracks if checkpoint.stage(t['id']) == UPSERTED and t['id'] not in indexed_ids]
+    if upserted:
+        stored = {vid for fetched in catalog.fetch_batches(get_index(), namespace, upserted) for vid in fetched}
+        checkpoint.requeue([tid for tid in upserted if tid not in stored])
+        indexed_ids.update(stored)
+
     new_tracks = [t for t in all_tracks if t['id'] not in indexed_ids]
+    resumable = sum(1 for t in new_tracks if checkpoint.stage(t['id']))
 
-    print(f"Total songs: {len(all_tracks)}, Already in Pinecone: {len(indexed_ids)}, New: {len(new_tracks)}")
+    print(f"Total songs: {len(all_tracks)}, Already in Pinecone: {len(indexed_ids)}, New: {len(new_tracks)}"
+          f" ({resumable} resuming from checkpoint)")
 
     if not new_tracks:
         return {"success": True, "song_count": len(indexed_ids), "new_songs": 0, "error": None}
 
-    # 4. Check free tier limit
-    if len(indexed_ids) >= MAX_SONGS:
+    # 4. Check free tier limit (all playlists share one index) before anything is copied or upserted
+    total_count = max(sum(get_namespace_counts().values()), len(indexed_ids))
+    if total_count >= MAX_SONGS:
         return {
             "success": False,
             "song_count": len(indexed_ids),
@@ -334,23 +782,35 @@ def sync_collaborative_playlist(playlist_id):
         }
 
     # Limit new songs to stay under cap
-    space_left = MAX_SONGS - len(indexed_ids)
-    if len(new_tracks) > space_left:
+    space_left = MAX_SONGS - total_count
+    capped = max(len(new_tracks) - space_left, 0)
+    if capped:
         print(f"Limiting to {space_left} new songs (free tier)")
         new_tracks = new_tracks[:space_left]
 
-    # 5. Fetch audio features for all new tracks
+    # Songs already embedded for another playlist are copied, not re-described
+    shared_ids = copy_shared_songs([t['id'] for t in new_tracks], namespace)
+    if shared_ids:
+        print(f"Reused {len(shared_ids)} songs already embedded for other playlists")
+        indexed_ids.update(shared_ids)
+        new_tracks = [t for t in new_tracks if t['id'] not in shared_ids]
+        if not new_tracks:
+            add_indexed_song_ids(indexed_ids)
+            return {"success": True, "song_count": len(indexed_ids), "new_songs": len(shared_ids), "error": None}
+
+    # 5. Fetch audio features for new tracks (checkpointed songs already have them)
     print("Fetching audio features from Spotify...")
-    new_track_ids = [t['id'] for t in new_tracks]
+    new_track_ids = [t['id'] for t in new_tracks if checkpoint.stage(t['id']) is None]
     audio_features_map = fetch_audio_features(new_track_ids)
     print(f"Got audio features for {len(audio_features_map)} tracks")
 
-    # 6. Process new songs in batches
+    # 6. Process new songs in batches. Each batch is described, embedded and
+    # upserted, checkpointing after every stage so a failed sync can resume.
     BATCH_SIZE = 10
 
     try:
         embeddings = GoogleNativeEmbeddings(model="models/gemini-embedding-001")
-        vector_store = PineconeVectorStore(index_name=INDEX_NAME, embedding=embeddings)
+        index = get_index()
     except Exception as e:
         print(f"Embedding init error: {e}")
         return {"success": False, "song_count": 0, "new_songs": 0, "error": f"Embedding error: {str(e)}"}
@@ -362,18 +822,20 @@ def sync_collaborative_playlist(playlist_id):
             batch = new_tracks[i:i + BATCH_SIZE]
             print(f"Processing batch {i // BATCH_SIZE + 1}: {len(batch)} songs")
 
-            results = generate_batch_descriptions(batch, audio_features_map)
-
-            batch_docs = []
-            batch_ids = []
-
-            for track_data, result in zip(batch, results):
-                description = result.get('vibe', f"Music by {track_data['artist']}")
-                features = audio_features_map.get(track_data['id'], {})
-
-                doc = Document(
-                    page_content=description,
-                    metadata={
+            # Describe only songs with no saved description
+            to_describe = [t for t in batch if checkpoint.stage(t['id']) is None]
+            if to_describe:
+                try:
+                    results = generate_batch_descriptions(to_describe, audio_features_map)
+                except Exception as e:
+                    # The songs stay undescribed; the sync reports them and the next one retries them
+                    print(f"Gemini Error, skipping {len(to_describe)} songs: {e}")
+                    results = []
+                described = {}
+                for track_data, result in zip(to_describe, results):
+                    description = result.get('vibe', f"Music by {track_data['artist']}")
+                    features = audio_features_map.get(track_data['id'], {})
+                    described[track_data['id']] = (description, {
                         "Song_Name": track_data['name'],
                         "Artist": track_data['artist'],
                         "Song_URL": track_data['url'],
@@ -382,27 +844,51 @@ def sync_collaborative_playlist(playlist_id):
                         "danceability": features.get('danceability', 0),
                         "valence": features.get('valence', 0),
                         "acousticness": features.get('acousticness', 0)
-                    }
-                )
-                batch_docs.append(doc)
-                batch_ids.append(track_data['id'])
-                newly_indexed.append(track_data['id'])
-
-            if batch_docs:
-                vector_store.add_documents(documents=batch_docs, ids=batch_ids)
-
-            time.sleep(1)  # Rate limiting
+                    })
+                if described:
+                    checkpoint.record_descriptions(described)
+
+            # Embed only songs with no saved vector
+            to_embed = [t['id'] for t in batch if checkpoint.stage(t['id']) == DESCRIBED]
+            if to_embed:
+                vectors = embeddings.embed_documents([checkpoint.description(tid) for tid in to_embed])
+                checkpoint.record_embeddings(to_embed, vectors)
+
+            # Upsert everything embedded but not yet stored
+            to_upsert = [t['id'] for t in batch if checkpoint.stage(t['id']) == EMBEDDED]
+            if to_upsert:
+                vectors = [
+                    (tid, checkpoint.load_vector(tid), {**checkpoint.metadata(tid), "text": checkpoint.description(tid)})
+                    for tid in to_upsert
+                ]
+                with telemetry.external_call("pinecone", "vector_upsert"):
+                    resilience.call("pinecone", index.upsert, vectors=vectors, namespace=namespace, sdk_timeout=True)
+                checkpoint.record_upserted(to_upsert)
+                catalog.update_catalog(namespace, {tid: metadata for tid, _, metadata in vectors})
+                newly_indexed.extend(to_upsert)
+                add_indexed_song_ids(to_upsert)
+
+            if to_describe:
+                time.sleep(1)  # Rate limiting
     except Exception as e:
         print(f"Indexing error: {e}")
-        return {"success": False, "song_count": len(indexed_ids), "new_songs": len(newly_indexed), "error": f"Indexing failed: {str(e)}"}
+        return {
+            "success": False,
+            "song_count": len(indexed_ids) + len(newly_indexed),
+            "new_songs": len(newly_indexed),
+            "error": f"Indexing failed: {str(e)} (progress saved, the next sync resumes from here)"
+        }
 
     # 7. Update indexed songs list
     indexed_ids.update(newly_indexed)
-    save_indexed_song_ids(indexed_ids)
+    add_indexed_song_ids(indexed_ids)
 
+    # Songs left short of UPSERTED (or over the cap) make the sync partial
+    skipped = sum(1 for t in new_tracks if checkpoint.stage(t['id']) != UPSERTED) + capped
     return {
         "success": True,
         "song_count": len(indexed_ids),
-        "new_songs": len(newly_indexed),
-        "error": None
+        "new_songs": len(newly_indexed) + len(shared_ids),
+        "skipped": skipped,
+        "error": f"{skipped} songs could not be indexed; the next sync retries them." if skipped else None
     }
@@ -0,0 +1,139 @@
+# shared_cache.py
+"""
+Small key-value tables shared by every worker process, kept in one SQLite file.
+
+Unlike the arrays a sync publishes (shared_store.py), these entries are
+written by any worker at request time: query embeddings, saved searches
+so a cursor works whichever worker it reaches, and per-client request logs so
+the rate limit holds across workers. SQLite in WAL mode lets
+readers run alongside a writer, and with mmap enabled lookups read straight
+from the OS page cache that all workers share.
+
+The cache is best effort: if the file is busy or unreadable, a lookup is a
+miss and a write is skipped.
+"""
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+SHARED_CACHE_FILE = "shared_cache.sqlite3"
+
+# Bytes of the database file each connection memory-maps
+SHARED_CACHE_MMAP_BYTES = 256 * 1024 * 1024
+
+# Old entries are trimmed once every this many writes
+PRUNE_EVERY = 200
+
+_local = threading.local()  # one connection per thread (sqlite3 connections aren't shared across threads)
+
+
+def _connection():
+    path = os.path.abspath(SHARED_CACHE_FILE)
+    conn = getattr(_local, "conn", None)
+    if conn is None or _local.path != path:
+        conn = sqlite3.connect(path, timeout=1, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA mmap_size={SHARED_CACHE_MMAP_BYTES}")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            " tbl TEXT NOT NULL, key TEXT NOT NULL, value BLOB NOT NULL, created REAL NOT NULL,"
+            " PRIMARY KEY (tbl, key))"
+        )
+        _local.conn, _local.path = conn, path
+    return conn
+
+
+class SharedTable:
+    """One named table: bytes values by string key, bounded in size and optionally in age."""
+
+    def __init__(self, name, max_entries, ttl_seconds=None):
+        self.name = name
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._writes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Returns the stored bytes, or None if missing, expired or unreadable."""
+        try:
+            row = _connection().execute(
+                "SELECT value, created FROM entries WHERE tbl = ? AND key = ?", (self.name, key)
+            ).fetchone()
+        except sqlite3.Error as e:
+            print(f"[SharedCache] Read from {self.name} failed: {e}")
+            return None
+        if row is None or (self.ttl_seconds and time.time() - row[1] > self.ttl_seconds):
+            return None
+        return row[0]
+
+    def put(self, key, value):
+        try:
+            conn = _connection()
+            conn.execute(
+                "INSERT OR REPLACE INTO entries (tbl, key, value, created) VALUES (?, ?, ?, ?)",
+                (self.name, key, value, time.time()),
+            )
+            with self._lock:
+                self._writes += 1
+                prune = self._writes % PRUNE_EVERY == 0
+            if prune:
+                self.prune(conn)
+        except sqlite3.Error as e:
+            print(f"[SharedCache] Write to {self.name} failed: {e}")
+
+    def prune(self, conn=None):
+        """Drops expired entries and the oldest ones beyond max_entries."""
+        conn = conn or _connection()
+        if self.ttl_seconds:
+            conn.execute("DELETE FROM entries WHERE tbl = ? AND created < ?", (self.name, time.time() - self.ttl_seconds))
+        conn.execute(
+            "DELETE FROM entries WHERE tbl = ? AND key NOT IN"
+            " (SELECT key FROM entries WHERE tbl = ? ORDER BY created DESC LIMIT ?)",
+            (self.name, self.name, self.max_entries),
+        )
+
+
+class SharedRateLimit(SharedTable):
+    """
+    Sliding-window request limit per client, counted across every worker
+    process: each allowed request is one row, kept for the window.
+    """
+
+    def __init__(self, name, window_seconds, max_entries=100_000):
+        super().__init__(name, max_entries, window_seconds)
+
+    def allow(self, client, limit):
+        """Records a request and returns True, or returns False if the client used up its window."""
+        now = time.time()
+        try:
+            conn = _connection()
+            # IMMEDIATE takes the write lock up front, so two workers can't both see room for one more
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                (count,) = conn.execute(
+                    "SELECT COUNT(*) FROM entries WHERE tbl = ? AND key >= ? AND key < ? AND created > ?",
+                    (self.name, f"{client}|", f"{client}}}", now - self.ttl_seconds),  # keys "client|..."
+                ).fetchone()
+                allowed = count < limit
+                if allowed:
+                    conn.execute(
+                        "INSERT INTO entries (tbl, key, value, created) VALUES (?, ?, ?, ?)",
+                        (self.name, f"{client}|{uuid.uuid4().hex}", b"", now),
+                    )
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            with self._lock:
+                self._writes += 1
+                prune = self._writes % PRUNE_EVERY == 0
+            if prune:
+                self.prune(conn)
+            return allowed
+        except sqlite3.Error as e:
+            # Best effort, like the rest of the cache: let the request through
+            print(f"[SharedCache] Rate limit check in {self.name} failed: {e}")
+            return True
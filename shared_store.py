@@ -0,0 +1,191 @@
+# shared_store.py
+"""
+Versioned, memory-mapped array snapshots shared by every worker process.
+
+A writer publishes a complete set of .npy files into a new version folder and
+then atomically repoints the CURRENT file at it. Readers map the arrays
+read-only, so all workers share one copy of the data in the OS page cache,
+and they pick up a new version the next time they check CURRENT. A version
+stays on disk until a newer one replaces it, so readers switching over never
+see a partial set of files.
+"""
+import os
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: single-process only, so in-process locks are enough
+    fcntl = None
+
+# How often a worker checks whether a newer version was published
+RELOAD_CHECK_SECONDS = float(os.getenv("SHARED_RELOAD_SECONDS", "1"))
+
+CURRENT_FILE = "CURRENT"
+
+
+def current_version(path):
+    """Returns the folder of the published version at path, or None if nothing was published."""
+    try:
+        with open(os.path.join(path, CURRENT_FILE)) as f:
+            version = f.read().strip()
+    except OSError:
+        # Folders written before versioning hold their files directly
+        return path if os.path.exists(os.path.join(path, "ids.npy")) else None
+    return os.path.join(path, version) if version else None
+
+
+def load_arrays(version_path, names):
+    """Maps each {name}.npy of a version read-only."""
+    return {name: np.load(os.path.join(version_path, f"{name}.npy"), mmap_mode="r") for name in names}
+
+
+def publish(path, arrays):
+    """Writes {name: array} as a new version and makes it current. Returns the version folder."""
+    os.makedirs(path, exist_ok=True)
+    version = f"v{time.time_ns()}-{os.getpid()}"
+    version_path = os.path.join(path, version)
+    os.makedirs(version_path)
+    for name, array in arrays.items():
+        np.save(os.path.join(version_path, f"{name}.npy"), array)
+
+    tmp_file = os.path.join(path, f"{CURRENT_FILE}.{os.getpid()}.tmp")
+    with open(tmp_file, "w") as f:
+        f.write(version)
+    os.replace(tmp_file, os.path.join(path, CURRENT_FILE))
+
+    # Keep the new version and the one before it (a reader may be switching from it)
+    versions = sorted(entry for entry in os.listdir(path) if entry.startswith("v"))
+    for old in versions[:-2]:
+        shutil.rmtree(os.path.join(path, old), ignore_errors=True)
+    return version_path
+
+
+@contextmanager
+def write_lock(path):
+    """Serializes read-modify-publish cycles on path across threads and worker processes."""
+    os.makedirs(path, exist_ok=True)
+    with file_lock(os.path.join(path, ".lock")):
+        yield
+
+
+@contextmanager
+def file_lock(lock_path):
+    """Holds lock_path exclusively across threads and worker processes (e.g. around a JSON file's read-modify-write)."""
+    with _thread_lock(lock_path):
+        if fcntl is None:
+            yield
+            return
+        with open(lock_path, "w") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+_thread_locks = {}
+_thread_locks_lock = threading.Lock()
+
+
+def _thread_lock(path):
+    with _thread_locks_lock:
+        return _thread_locks.setdefault(os.path.abspath(path), threading.Lock())
+
+
+def try_exclusive(path):
+    """
+    Takes a lock file that only one process may hold, for as long as that
+    process runs. Returns the open file (keep it referenced), or None if
+    another process holds it.
+    """
+    f = open(path, "w")
+    if fcntl is None:
+        return f
+    try:
+        fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        f.close()
+        return None
+    return f
+
+
+class SharedArrays:
+    """
+    Per-namespace objects built from published arrays, reloaded when a newer
+    version appears. build(arrays) turns the mapped arrays into the object.
+    """
+
+    def __init__(self, root, names, build, empty=None):
+        self.root = root
+        self.names = names
+        self.build = build
+        self.empty = empty  # returned when nothing is published
+        self._lock = threading.Lock()
+        self._cached = {}  # namespace -> (version folder, object, last check time)
+
+    def path(self, namespace):
+        return os.path.join(self.root, namespace or "_default")
+
+    def get(self, namespace):
+        """Returns the object for the namespace's current version."""
+        now = time.monotonic()
+        with self._lock:
+            cached = self._cached.get(namespace)
+            if cached and now - cached[2] < RELOAD_CHECK_SECONDS:
+                return cached[1]
+
+        version_path = current_version(self.path(namespace))
+        if cached and cached[0] == version_path:
+            value = cached[1]
+        else:
+            value, version_path = self._load(version_path)
+        with self._lock:
+            self._cached[namespace] = (version_path, value, now)
+        return value
+
+    def _load(self, version_path):
+        """Returns (object, version folder); the folder is None if nothing could be loaded."""
+        if version_path is not None:
+            try:
+                return self.build(load_arrays(version_path, self.names)), version_path
+            except (OSError, ValueError) as e:
+                # Replaced while loading (or damaged): the next check tries again
+                print(f"[SharedStore] Could not load {version_path}: {e}")
+        return (self.empty() if self.empty else None), None
+
+    def load_latest(self, namespace):
+        """Loads the latest published version now, without waiting for the next check (for read-modify-publish)."""
+        version_path = current_version(self.path(namespace))
+        with self._lock:
+            cached = self._cached.get(namespace)
+        if cached and cached[0] == version_path:
+            return cached[1]
+        value, version_path = self._load(version_path)
+        with self._lock:
+            self._cached[namespace] = (version_path, value, time.monotonic())
+        return value
+
+    def publish(self, namespace, arrays):
+        """Publishes a new version for the namespace and returns the reloaded object."""
+        value, version_path = self._load(publish(self.path(namespace), arrays))
+        with self._lock:
+            self._cached[namespace] = (version_path, value, time.monotonic())
+        return value
+
+    def write_lock(self, namespace):
+        return write_lock(self.path(namespace))
+
+    def clear(self, namespace=None):
+        """Deletes a namespace's versions (or every namespace's)."""
+        with self._lock:
+            if namespace is None:
+                self._cached.clear()
+                shutil.rmtree(self.root, ignore_errors=True)
+            else:
+                self._cached.pop(namespace, None)
+                shutil.rmtree(self.path(namespace), ignore_errors=True)
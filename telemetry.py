@@ -0,0 +1,162 @@
+# telemetry.py
+"""
+Lightweight request tracing and Prometheus-style metrics.
+
+Everything lives in process memory and is exposed as text at /metrics, so no
+external collector is needed. Each request gets a trace (a list of stage
+timings) that is also returned to the client in the Server-Timing header.
+"""
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# Latency buckets in seconds, covering fast cache hits up to slow LLM calls
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Stage timings for the request currently being handled
+_current_trace = ContextVar("current_trace", default=None)
+
+_metrics = []
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(key, extra=None):
+    pairs = list(key) + (extra or [])
+    if not pairs:
+        return ""
+    inner = ",".join(f'{name}="{value}"' for name, value in pairs)
+    return "{" + inner + "}"
+
+
+class Counter:
+    """Monotonic counter with optional labels."""
+
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help_text = help_text
+        self._values = {}
+        self._lock = threading.Lock()
+        _metrics.append(self)
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        with self._lock:
+            return self._values.get(_label_key(labels), 0)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(key)} {value}")
+        return lines
+
+
+class Histogram:
+    """Cumulative-bucket histogram with optional labels."""
+
+    def __init__(self, name, help_text, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = buckets
+        self._series = {}  # label key -> [bucket counts, sum, count]
+        self._lock = threading.Lock()
+        _metrics.append(self)
+
+    def observe(self, value, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, (counts, total, count) in sorted(self._series.items()):
+                for bound, bucket_count in zip(self.buckets, counts):
+                    lines.append(f"{self.name}_bucket{_format_labels(key, [('le', bound)])} {bucket_count}")
+                lines.append(f"{self.name}_bucket{_format_labels(key, [('le', '+Inf')])} {count}")
+                lines.append(f"{self.name}_sum{_format_labels(key)} {total}")
+                lines.append(f"{self.name}_count{_format_labels(key)} {count}")
+        return lines
+
+
+REQUEST_LATENCY = Histogram("chromatune_request_seconds", "End-to-end request latency by route.")
+STAGE_LATENCY = Histogram("chromatune_stage_seconds", "Latency of each pipeline stage.")
+EXTERNAL_CALLS = Counter("chromatune_external_calls_total", "Calls made to external APIs by provider.")
+EXTERNAL_ERRORS = Counter("chromatune_external_errors_total", "Failed external API calls by provider and kind.")
+
+
+def render_metrics():
+    """Returns all metrics in the Prometheus text exposition format."""
+    lines = []
+    for metric in _metrics:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+def start_trace():
+    """Starts a new trace for the current request and returns it."""
+    trace = []
+    _current_trace.set(trace)
+    return trace
+
+
+@contextmanager
+def span(stage):
+    """Times a block, recording it in the stage histogram and the current trace."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_LATENCY.observe(elapsed, stage=stage)
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.append((stage, elapsed))
+
+
+def is_quota_error(error):
+    """Whether an exception looks like a rate limit or exhausted quota."""
+    message = str(error).lower()
+    return "quota" in message or "limit" in message or "exhausted" in message or "429" in message
+
+
+def record_error(provider, quota=False):
+    """Counts a failed external call."""
+    EXTERNAL_ERRORS.inc(provider=provider, kind="quota" if quota else "error")
+
+
+@contextmanager
+def external_call(provider, stage):
+    """Times an external API call and counts it (and any failure) against the provider."""
+    EXTERNAL_CALLS.inc(provider=provider)
+    with span(stage):
+        try:
+            yield
+        except Exception as e:
+            record_error(provider, quota=is_quota_error(e))
+            raise
+
+
+def format_server_timing(trace, total):
+    """Builds a Server-Timing header value from a trace, summing repeated stages."""
+    totals = {}
+    for stage, elapsed in trace:
+        totals[stage] = totals.get(stage, 0.0) + elapsed
+    parts = [f"{stage};dur={elapsed * 1000:.1f}" for stage, elapsed in totals.items()]
+    parts.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(parts)
@@ -0,0 +1,30 @@
+# tests/conftest.py
+"""
+Shared fixtures. Tests run the app against the in-process fakes from
+benchmarks/, in a scratch directory, so they need no network or API keys.
+"""
+import argparse
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.harness import add_fake_arguments, fake_environment  # noqa: E402
+
+
+@pytest.fixture
+def fake_env():
+    """Yields (services, api, spotify, genai, pinecone) wired to zero-latency fakes."""
+    args = add_fake_arguments(argparse.ArgumentParser()).parse_args([
+        "--spotify-latency", "0", "--llm-latency", "0", "--embed-latency", "0", "--pinecone-latency", "0",
+    ])
+    with fake_environment(args) as env:
+        # Each test runs in a fresh directory; drop arrays another test left mapped in this process
+        import catalog
+        import local_index
+        import neighbors
+        for module in (catalog, local_index, neighbors):
+            module._store._cached.clear()
+        yield env
@@ -0,0 +1,58 @@
+# tests/test_keys.py
+import itertools
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from fastapi.testclient import TestClient
+
+from benchmarks.fakes import FakeError
+from benchmarks.harness import seed_index
+
+
+def test_concurrent_searches_use_their_own_key(fake_env, monkeypatch):
+    services, api, spotify, genai, pinecone = fake_env
+    seed_index(services, genai, 40)
+    monkeypatch.setattr(api, "RATE_LIMIT_REQUESTS", 1000)
+    server_key = os.environ["GOOGLE_API_KEY"]
+    user_keys = [f"user-key-{i}" for i in range(4)]
+
+    # The server key's quota check alternates between passing and failing,
+    # so concurrent searches run on a mix of the server key and users' keys
+    quota_ok = itertools.cycle([True, False])
+    generate = genai.generate_content
+
+    def flaky_server_key(contents, client=None):
+        if contents == "test" and not next(quota_ok):
+            raise FakeError("429 Resource has been exhausted (e.g. check quota).")
+        return generate(contents, client=client)
+
+    monkeypatch.setattr(genai, "generate_content", flaky_server_key)
+
+    embedded_with = {}  # query -> key of the client that embedded it
+    embed = genai.embed_content
+
+    def recording_embed(model=None, content=None, client=None, **kwargs):
+        embedded_with[content] = client.api_key
+        return embed(model=model, content=content, client=client, **kwargs)
+
+    monkeypatch.setattr(genai, "embed_content", recording_embed)
+
+    with TestClient(api.app) as client:
+        def search(i):
+            data = {"text": f"vibe number {i}", "user_api_key": user_keys[i % len(user_keys)]}
+            return data, client.post("/search", data=data).json()
+
+        with ThreadPoolExecutor(16) as pool:
+            results = list(pool.map(search, range(48)))
+
+    used_user_key = [body["used_user_key"] for _, body in results]
+    assert any(used_user_key) and not all(used_user_key)
+    for data, body in results:
+        expected = data["user_api_key"] if body["used_user_key"] else server_key
+        assert embedded_with[body["vibe_analysis"]] == expected
+
+    # No call ever went out under a key that wasn't the server's or one a request sent
+    assert set(genai.keys_used) <= {server_key, *user_keys}
+    for key in user_keys:
+        searches = sum(1 for data, body in results if body["used_user_key"] and data["user_api_key"] == key)
+        assert genai.keys_used.count(key) == searches
@@ -0,0 +1,45 @@
+# tests/test_resilience.py
+import time
+
+from fastapi.testclient import TestClient
+
+from benchmarks.harness import seed_index
+
+
+def test_search_deadline_covers_server_key_check(fake_env, monkeypatch):
+    services, api, spotify, genai, pinecone = fake_env
+    seed_index(services, genai, 50)
+    monkeypatch.setattr(api, "SEARCH_DEADLINE_SECONDS", 1)
+
+    # Gemini text calls (the server key check) brown out for 4 seconds
+    genai.llm_faults.latency = 4
+
+    with TestClient(api.app) as client:
+        start = time.perf_counter()
+        response = client.post("/search", data={"text": "dreamy jazz for a rainy night"})
+        elapsed = time.perf_counter() - start
+
+    assert response.status_code == 504
+    assert elapsed < 2
+    # The stalled key check doesn't count against the Gemini breaker
+    assert api.resilience.BREAKERS["gemini"].failures == 0
+
+
+def test_deadline_spent_on_gemini_is_not_blamed_on_pinecone(fake_env, monkeypatch):
+    services, api, spotify, genai, pinecone = fake_env
+    seed_index(services, genai, 50)
+    monkeypatch.setattr(api, "SEARCH_DEADLINE_SECONDS", 1)
+    monkeypatch.setattr(api, "RATE_LIMIT_REQUESTS", 1000)
+
+    # Embeddings use up nearly the whole budget, leaving the vector query too little to finish
+    genai.embed_faults.latency = 0.9
+    pinecone.faults.latency = 0.3
+
+    with TestClient(api.app) as client:
+        for i in range(api.resilience.BREAKER_FAILURE_THRESHOLD + 1):
+            response = client.post("/search", data={"text": f"late-night drive number {i}"})
+            assert response.status_code == 504
+
+    # Pinecone was never given a fair share of the deadline, so its breaker stays closed
+    assert api.resilience.BREAKERS["pinecone"].failures == 0
+    assert api.resilience.BREAKERS["pinecone"].state == "closed"
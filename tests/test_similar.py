@@ -0,0 +1,26 @@
+# tests/test_similar.py
+from fastapi.testclient import TestClient
+
+import catalog
+import local_index
+import neighbors
+from benchmarks.harness import seed_index
+
+
+def test_similar_fills_songs_indexed_before_the_catalog(fake_env):
+    services, api, spotify, genai, pinecone = fake_env
+    # Indexed straight into Pinecone, so the catalog has never seen these songs
+    vectors = seed_index(services, genai, 40)
+    track_id, _, metadata = vectors[0]
+    neighbors.refresh("", local_index.refresh(services.get_index(), ""))
+
+    with TestClient(api.app) as client:
+        body = client.get(f"/similar/{track_id}", params={"k": 5}).json()
+        assert body["song"]["name"] == metadata["Song_Name"]
+        assert all(song["name"] and song["artist"] and song["url"] for song in body["songs"])
+
+        # A catalog lost after the table was built is refilled from Pinecone
+        catalog.clear("")
+        body = client.get(f"/similar/{track_id}", params={"k": 5}).json()
+        assert body["song"]["url"] == metadata["Song_URL"]
+        assert all(song["name"] for song in body["songs"])
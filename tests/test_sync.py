@@ -0,0 +1,86 @@
+# tests/test_sync.py
+from fastapi.testclient import TestClient
+
+import scheduler
+from benchmarks.fakes import make_tracks
+
+
+def test_failed_descriptions_keep_playlist_queued(fake_env, monkeypatch):
+    services, api, spotify, genai, pinecone = fake_env
+    monkeypatch.setattr(services.time, "sleep", lambda seconds: None)  # the sync's pause between batches
+    playlist_id = services.DEFAULT_PLAYLIST_ID
+    spotify.add_playlist(playlist_id, make_tracks(12, seed=1))
+
+    poller = scheduler.SyncScheduler(interval=1)
+    queued = []
+    poller.enqueue = queued.append
+
+    # Gemini fails every description: nothing is indexed, so the snapshot must not be recorded
+    genai.llm_faults.error_rate = 1.0
+    result = services.sync_playlist(playlist_id)
+    assert result["skipped"] == 12
+    assert result["error"]
+    assert "snapshot_id" not in services.get_playlist(playlist_id)
+
+    poller.poll_once()
+    assert queued == [playlist_id]
+
+    # Once Gemini recovers, the retried sync finishes and the playlist counts as unchanged
+    genai.llm_faults.error_rate = 0.0
+    result = services.sync_playlist(playlist_id)
+    assert result["skipped"] == 0
+    assert result["error"] is None
+    assert result["new_songs"] == 12
+    assert services.get_playlist(playlist_id)["snapshot_id"] == spotify.snapshots[playlist_id]
+
+    queued.clear()
+    poller.poll_once()
+    assert queued == []
+
+
+def test_sync_after_clear_indexes_everything_again(fake_env, monkeypatch):
+    services, api, spotify, genai, pinecone = fake_env
+    monkeypatch.setattr(services.time, "sleep", lambda seconds: None)
+    playlist_id = services.DEFAULT_PLAYLIST_ID
+    spotify.add_playlist(playlist_id, make_tracks(12, seed=2))
+    assert services.sync_playlist(playlist_id)["new_songs"] == 12
+
+    with TestClient(api.app) as client:
+        assert client.post("/clear", params={"secret": api.ADMIN_SECRET}).json()["status"] == "cleared"
+
+    result = services.sync_playlist(playlist_id)
+    assert result["new_songs"] == 12
+    assert len(services.get_pinecone_indexed_ids()) == 12
+
+
+def test_sync_reembeds_checkpointed_songs_pinecone_lost(fake_env, monkeypatch):
+    services, api, spotify, genai, pinecone = fake_env
+    monkeypatch.setattr(services.time, "sleep", lambda seconds: None)
+    playlist_id = services.DEFAULT_PLAYLIST_ID
+    spotify.add_playlist(playlist_id, make_tracks(12, seed=3))
+    services.sync_playlist(playlist_id)
+
+    # Vectors deleted behind the sync's back: the checkpoint still says they were upserted
+    services.get_index().delete(delete_all=True)
+    descriptions = genai.llm_faults.calls
+    result = services.sync_playlist(playlist_id)
+    assert result["new_songs"] == 12
+    assert len(services.get_pinecone_indexed_ids()) == 12
+    # The saved descriptions are reused; only the embeddings are redone
+    assert genai.llm_faults.calls == descriptions
+
+
+def test_resync_reuses_cached_audio_features(fake_env, monkeypatch):
+    services, api, spotify, genai, pinecone = fake_env
+    monkeypatch.setattr(services.time, "sleep", lambda seconds: None)
+    playlist_id = services.DEFAULT_PLAYLIST_ID
+    spotify.add_playlist(playlist_id, make_tracks(12, seed=4))
+
+    # The first sync fetches features but indexes nothing, so the second has the same 12 songs to do
+    genai.llm_faults.error_rate = 1.0
+    services.sync_playlist(playlist_id)
+    assert spotify.audio_feature_ids == 12
+
+    genai.llm_faults.error_rate = 0.0
+    assert services.sync_playlist(playlist_id)["new_songs"] == 12
+    assert spotify.audio_feature_ids == 12
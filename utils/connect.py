@@ -1,8 +1,19 @@
 # utils/connect.py
 
+import os
+import threading
+import time
+from collections import OrderedDict
 import streamlit as st
 import google.generativeai as genai
 from langchain_google_genai import GoogleGenerativeAIEmbeddings
+from streamlit import runtime
+
+# Memory budget for all shared vector stores in this process
+VECTOR_STORE_BUDGET_MB = int(os.getenv("VECTOR_STORE_BUDGET_MB", "512"))
+
+# Gemini text requests per minute this process may send (the free tier allows 60)
+GEMINI_REQUESTS_PER_MINUTE = int(os.getenv("GEMINI_REQUESTS_PER_MINUTE", "60"))
 
 @st.cache_resource
 def load_gemini_models():
@@ -34,6 +45,159 @@ def load_embedding_model():
     )
     return embeddings
 
+class RateLimiter:
+    """
+    Token bucket shared by every thread that calls a rate-limited API.
+    acquire() blocks until a request may be sent, so any number of workers
+    together stay within the quota.
+    """
+
+    def __init__(self, requests_per_minute, burst=1):
+        self.rate = requests_per_minute / 60
+        self.capacity = burst
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+@st.cache_resource
+def get_gemini_rate_limiter():
+    """Returns the Gemini text quota limiter shared by all sessions in this process."""
+    return RateLimiter(GEMINI_REQUESTS_PER_MINUTE)
+
+def estimate_store_bytes(vector_store):
+    """Rough memory footprint of a FAISS store: float32 vectors plus document text."""
+    index = vector_store.index
+    text_bytes = sum(len(doc.page_content) for doc in vector_store.docstore._dict.values())
+    return index.ntotal * index.d * 4 + text_bytes
+
+
+class VectorStoreRegistry:
+    """
+    Process-wide registry of vector stores keyed by playlist ID, shared by
+    every browser session.
+
+    Each session that uses a store holds a reference to it. Stores nobody
+    references are evicted least-recently-used first once the memory budget
+    is exceeded. Concurrent requests for the same playlist wait on a single
+    build instead of each building their own copy.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # playlist_id -> entry dict, oldest first
+        self._building = {}            # playlist_id -> threading.Event
+
+    def acquire(self, playlist_id, session_id, build_fn, version=None):
+        """
+        Returns the shared store for the playlist and records a reference for
+        the session. If it isn't loaded (or was built from a different version),
+        exactly one caller runs build_fn while the others wait for its result.
+        """
+        while True:
+            with self._lock:
+                entry = self._entries.get(playlist_id)
+                if entry and (version is None or entry["version"] == version):
+                    entry["sessions"].add(session_id)
+                    self._entries.move_to_end(playlist_id)
+                    return entry["store"]
+
+                event = self._building.get(playlist_id)
+                is_builder = event is None
+                if is_builder:
+                    event = threading.Event()
+                    self._building[playlist_id] = event
+
+            if not is_builder:
+                # Someone else is building this playlist, use their result
+                event.wait()
+                continue
+
+            store = None
+            try:
+                store = build_fn()
+            finally:
+                with self._lock:
+                    if store is not None:
+                        self._entries[playlist_id] = {
+                            "store": store,
+                            "version": version,
+                            "sessions": {session_id},
+                            "bytes": estimate_store_bytes(store),
+                        }
+                        self._entries.move_to_end(playlist_id)
+                        self._evict()
+                    del self._building[playlist_id]
+                event.set()
+            return store
+
+    def mark_incomplete(self, playlist_id):
+        """Keeps serving a store that is missing songs, but rebuilds it on the next acquire that asks for a version."""
+        with self._lock:
+            entry = self._entries.get(playlist_id)
+            if entry:
+                entry["version"] = None
+
+    def release(self, playlist_id, session_id):
+        """Drops the session's reference so the store becomes evictable."""
+        with self._lock:
+            entry = self._entries.get(playlist_id)
+            if entry:
+                entry["sessions"].discard(session_id)
+                self._evict()
+
+    def stats(self):
+        """Returns a summary of the loaded stores, for display."""
+        with self._lock:
+            return {
+                "stores": {
+                    pid: {"sessions": len(e["sessions"]), "bytes": e["bytes"]}
+                    for pid, e in self._entries.items()
+                },
+                "total_bytes": sum(e["bytes"] for e in self._entries.values()),
+                "max_bytes": self.max_bytes,
+            }
+
+    def _evict(self):
+        """Evicts unreferenced stores, oldest first, until under budget. Caller holds the lock."""
+        self._prune_closed_sessions()
+        total = sum(e["bytes"] for e in self._entries.values())
+        for pid in list(self._entries):
+            if total <= self.max_bytes:
+                break
+            entry = self._entries[pid]
+            if not entry["sessions"]:
+                total -= entry["bytes"]
+                del self._entries[pid]
+                print(f"Evicted vector store for playlist {pid}")
+
+    def _prune_closed_sessions(self):
+        """Drops references held by browser sessions that have since closed."""
+        if not runtime.exists():
+            return
+        rt = runtime.get_instance()
+        for entry in self._entries.values():
+            entry["sessions"] = {sid for sid in entry["sessions"] if rt.is_active_session(sid)}
+
+
+@st.cache_resource
+def get_vector_store_registry():
+    """Returns the vector store registry shared by all sessions in this process."""
+    return VectorStoreRegistry(max_bytes=VECTOR_STORE_BUDGET_MB * 1024 * 1024)
+
 def initialize_connections():
     """
     Initializes all necessary clients and models and loads them into
@@ -50,10 +214,16 @@ def initialize_connections():
     if "embedding_model" not in st.session_state:
         st.session_state["embedding_model"] = load_embedding_model()
 
-    # This will hold our FAISS vector store in memory
+    # This will hold a reference to the shared FAISS vector store for our playlist
     if "vector_store" not in st.session_state:
         st.session_state["vector_store"] = None
 
     # This will track the current playlist ID in memory
     if "current_pid" not in st.session_state:
-        st.session_state["current_pid"] = None
\ No newline at end of file
+        st.session_state["current_pid"] = None
+
+    # Publish the latest (possibly partial) store of a build running in the background
+    job = st.session_state.get("build_job")
+    if job is not None and job.store is not None:
+        st.session_state["vector_store"] = job.store
+        st.session_state["current_pid"] = job.playlist_id
\ No newline at end of file